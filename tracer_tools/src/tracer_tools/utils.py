@@ -3,6 +3,7 @@ from caveclient import CAVEclient
 import pandas as pd
 from nglui.statebuilder import *
 import json
+import base64
 from osteoid import Skeleton
 import numpy as np
 import microviewer
@@ -10,11 +11,53 @@ import time
 import sys
 import plotly.graph_objects as go
 import statistics
+import os
+import pyarrow as pa
+import pyarrow.parquet as pq
+import requests
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+import scipy.sparse
+import scipy.sparse.csgraph
+import scipy.spatial
+import scipy.spatial.distance
+
+# default location and size limit for the on-disk synapse cache #
+SYNAPSE_CACHE_DIR = os.path.join(
+    os.path.expanduser("~"), ".cache", "tracer_tools", "synapses"
+)
+SYNAPSE_CACHE_MAX_BYTES = 5 * 1024**3
+
+# bumped whenever the layout of cached synapse files changes #
+SYNAPSE_CACHE_FORMAT = 2
+
+# most rows asked for in one synapse query, a full page may have been cut off by the server so it is split and queried again #
+SYNAPSE_QUERY_LIMIT = 100000
+
+# running size in bytes of each synapse cache directory, so the cache is only scanned when it may be over its limit #
+_SYNAPSE_CACHE_BYTES = {}
+
+# default location for cached neuroglancer states, which never change once saved #
+STATE_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "tracer_tools", "states")
+
+# longest link, in characters, that is made by embedding the state in the url instead of uploading it #
+RAW_URL_MAX_LENGTH = 2000
+
+# most root IDs selected in a state that has segment properties, the rest can be picked from the segment list #
+SEGMENT_PROPERTIES_MAX_SELECTED = 20
+
+# most voxels in one dense density map written by synapse_density_maps, 64 MB of uint32 counts #
+DENSITY_MAP_MAX_VOXELS = 256**3
+
+# resolution of every mip level, keyed by datastack and layer, so each volume is only read once #
+_MIP_RESOLUTIONS = {}
 
 
 def bbox_corners_from_center(coords, dims):
     """Create an empty link with a bounding box of given dimensions centered on input coords.
 
+    Odd dimensions are rounded up to the next even number so the box is centered on the coords.
+
     Arguments:
     coord -- xyz coords for centerpoint of bounding box in 4x4x40nm resolution (list of ints)
     dims -- xyz dimensions in voxels (list of ints)
@@ -23,20 +66,202 @@ def bbox_corners_from_center(coords, dims):
     coord_list -- coordinates of corner points for bbox (list of lists of ints)
     """
 
-    # ensures starting dims are even numbers #
-    for dim in dims:
-        if dim % 2 != 0:
-            dim += 1
+    corners = bbox_corners_from_centers([coords], dims)[0].tolist()
+
+    return corners
+
+
+def bbox_corners_from_centers(centers, dims, bounds=None):
+    """Find the corners of bounding boxes of given dimensions centered on many points at once.
+
+    Odd dimensions are rounded up to the next even number so every box is centered on its point. If
+    bounds are given, boxes are clipped so they don't extend past the edges of the volume.
+
+    Arguments:
+    centers -- xyz coords for the center of each box (numpy array of shape (N, 3) or list of lists of ints)
+    dims -- xyz dimensions of the boxes in voxels of the same resolution as centers, either one set for all boxes or one per box (list of ints or numpy array of shape (N, 3))
+    bounds -- the min and max xyz coords of the volume to clip boxes to, in the same resolution as centers (list of two lists of ints, default None)
+
+    Returns:
+    corners -- the min and max corner of each box (numpy array of int64 with shape (N, 2, 3))
+    """
+
+    centers = np.floor(np.asarray(centers, dtype=np.float64).reshape(-1, 3)).astype(np.int64)
+    dims = np.ceil(np.asarray(dims, dtype=np.float64)).astype(np.int64)
+    if dims.shape not in [(3,), (len(centers), 3)]:
+        raise ValueError("dims must be one set of xyz dimensions or one set per center.")
+    if (dims < 0).any():
+        raise ValueError("dims must not be negative.")
+
+    # rounds odd dims up to the next even number #
+    half_dims = (dims + dims % 2) // 2
 
-    # creates empty lists #
-    min_coord = [int(coord - dim / 2) for coord, dim in zip(coords, dims)]
-    max_coord = [int(coord + dim / 2) for coord, dim in zip(coords, dims)]
+    corners = np.stack([centers - half_dims, centers + half_dims], axis=1)
 
-    corners = [min_coord, max_coord]
+    # keeps boxes inside the volume #
+    if bounds is not None:
+        bounds = np.asarray(bounds, dtype=np.int64).reshape(2, 3)
+        corners = np.clip(corners, bounds[0], bounds[1])
+        n_empty = int((corners[:, 0] >= corners[:, 1]).any(axis=1).sum())
+        if n_empty > 0:
+            print(f"    {n_empty} boxes lie outside the bounds and were clipped to zero size")
 
     return corners
 
 
+def _volume_bounds(stack_info, viewer_res):
+    """Get the min and max xyz coords of a datastack's segmentation volume in viewer resolution."""
+
+    seg_source = stack_info["segmentation_source"]
+    if seg_source.startswith("graphene://https"):
+        split_url = seg_source.split("https")
+        seg_source = split_url[0] + "middleauth+https" + split_url[1]
+    cv = cloudvolume.CloudVolume(seg_source, use_https=True, progress=False)
+
+    # converts the mip 0 voxel bounds to nm, then to viewer resolution, keeping only whole voxels #
+    mip_bounds = cv.meta.bounds(0)
+    res = np.asarray(cv.meta.resolution(0), dtype=np.float64)
+    viewer_res = np.asarray(viewer_res, dtype=np.float64)
+    bounds = np.stack(
+        [
+            np.ceil(np.asarray(mip_bounds.minpt) * res / viewer_res),
+            np.floor(np.asarray(mip_bounds.maxpt) * res / viewer_res),
+        ]
+    ).astype(np.int64)
+
+    return bounds
+
+
+def build_bbox_links(
+    centers,
+    dims,
+    datastack,
+    root_ids=None,
+    descriptions=None,
+    link_groups=None,
+    clip_to_volume=True,
+    annotation_source=None,
+    upload_state="auto",
+    max_raw_url_length=None,
+    max_workers=8,
+):
+    """Build neuroglancer links showing bounding boxes centered on many coordinates, e.g. for annotation tasks.
+
+    The datastack layers and a template box layer are made once and every box is filled into a copy, so
+    thousands of links are made in one pass. By default each box gets its own link centered on it. Links
+    are made concurrently and only states too big to embed in the url are uploaded.
+
+    Arguments:
+    centers -- xyz coords for the center of each box in viewer resolution (numpy array of shape (N, 3) or list of lists of ints)
+    dims -- xyz dimensions of the boxes in viewer resolution voxels, either one set for all boxes or one per box (list of ints or numpy array of shape (N, 3))
+    datastack -- the name of the datastack the coordinates are from (str)
+    root_ids -- root IDs to select in every link (list of str or int, default None)
+    descriptions -- a description for each box, e.g. a task name (list of str, default None)
+    link_groups -- a group label for each box, boxes with the same label share one link centered on the first of them (list, default None)
+    clip_to_volume -- whether to clip boxes to the bounds of the segmentation volume (bool, default True)
+    annotation_source -- the url of a directory written by export_bbox_annotations, if given every link reads the boxes from it and only its position is set (str, default None)
+    upload_state -- True to upload every state, False to embed every state in its url, or "auto" to embed only states whose url stays under max_raw_url_length (bool or str, default "auto")
+    max_raw_url_length -- the longest url in characters that "auto" will embed a state in (int, default RAW_URL_MAX_LENGTH)
+    max_workers -- the number of states to upload at the same time (int, default 8)
+
+    Returns:
+    url_list -- the url showing each box, in the same order as centers (list of str)
+    """
+
+    # sets one CAVE client and one set of layer configs for every state #
+    client = CAVEclient(datastack_name=datastack)
+    stack_parts = _ng_stack_parts(client, datastack)
+
+    # finds every box at once, clipped to the volume if requested #
+    if clip_to_volume == True:
+        bounds = _volume_bounds(client.info.get_datastack_info(), stack_parts["viewer_res"])
+    else:
+        bounds = None
+    corners = bbox_corners_from_centers(centers, dims, bounds=bounds)
+    positions = np.floor(np.asarray(centers, dtype=np.float64).reshape(-1, 3))
+    if descriptions is not None and len(descriptions) != len(corners):
+        raise ValueError("descriptions must have one entry per center.")
+    if link_groups is None:
+        link_groups = range(len(corners))
+    elif len(link_groups) != len(corners):
+        raise ValueError("link_groups must have one entry per center.")
+
+    # groups boxes by link, keeping the order each link first appears in #
+    group_codes, group_labels = pd.factorize(pd.Series(list(link_groups)))
+    order = np.argsort(group_codes, kind="stable")
+    starts = np.searchsorted(group_codes[order], np.arange(len(group_labels)))
+    ends = np.append(starts[1:], len(order))
+
+    # renders the datastack layers once #
+    root_ids = list(map(int, root_ids)) if root_ids is not None else []
+    base_state = _render_ng_state(root_ids, stack_parts, {})
+
+    # renders the box layer once, to be filled in for each link, or points it at the precomputed boxes #
+    if annotation_source is None:
+        box_layer = AnnotationLayerConfig(
+            name="Bounding Boxes",
+            mapping_rules=BoundingBoxMapper(point_column_a="point_a", point_column_b="point_b"),
+        )
+        box_layer = json.loads(
+            StateBuilder([box_layer], resolution=stack_parts["viewer_res"]).render_state(
+                pd.DataFrame({"point_a": [[0, 0, 0]], "point_b": [[1, 1, 1]]}),
+                return_as="json",
+                target_site=stack_parts["target_site_name"],
+            )
+        )["layers"][0]
+        box_template = box_layer.pop("annotations")[0]
+    else:
+        if not annotation_source.startswith("precomputed://"):
+            annotation_source = "precomputed://" + annotation_source
+        box_layer = {"type": "annotation", "source": annotation_source, "name": "Bounding Boxes"}
+
+    print(f"  Building {len(group_labels)} states for {len(corners)} boxes...")
+    state_jsons = []
+    for start, end in zip(starts, ends):
+        rows = order[start:end]
+        layer = dict(box_layer)
+        if annotation_source is None:
+            layer["annotations"] = []
+            for row in rows.tolist():
+                annotation = dict(
+                    box_template,
+                    pointA=corners[row, 0].tolist(),
+                    pointB=corners[row, 1].tolist(),
+                    id=format(row, "040x"),
+                )
+                if descriptions is not None and descriptions[row] is not None:
+                    annotation["description"] = str(descriptions[row])
+                layer["annotations"].append(annotation)
+
+        # centers the view on the first box of the link #
+        state_json = dict(base_state, layers=base_state["layers"] + [layer])
+        position = positions[rows[0]].tolist()
+        if "navigation" in state_json:
+            state_json["navigation"] = json.loads(json.dumps(state_json["navigation"]))
+            state_json["navigation"]["pose"]["position"]["voxelCoordinates"] = position
+        else:
+            state_json["position"] = position
+        state_jsons.append(state_json)
+
+    # makes links concurrently, only states too big to embed in the url are uploaded #
+    def make_url(state_json):
+        return _ng_state_url(
+            client,
+            state_json,
+            stack_parts["base_url"],
+            upload_state=upload_state,
+            max_raw_url_length=max_raw_url_length,
+        )
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        group_urls = list(executor.map(make_url, state_jsons))
+
+    # returns the link of each box in input order #
+    url_list = [group_urls[group_code] for group_code in group_codes]
+
+    return url_list
+
+
 ### !!!!!!! PROTOTYPE, CURRENTLY ONLY WORKS WITH FLYWIRE PRODUCTION and BANC !!!!!!! ###
 from caveclient import CAVEclient
 import pandas as pd
@@ -52,6 +277,14 @@ def build_ng_link(
     cleft_thresh=0.0,
     white=False,
     custom_colors=False,
+    materialization_version=None,
+    upload_state="auto",
+    max_raw_url_length=None,
+    annotation_source=None,
+    max_annotations=None,
+    thin_method="sample",
+    segment_properties_source=None,
+    max_selected_segments=None,
 ):
     """Build a neuroglancer state url from a list of root IDs.
 
@@ -62,210 +295,258 @@ def build_ng_link(
     outgoing -- whether to include outgoing synapses (bool, default False)
     cleft_thresh -- the cleft score threshold below which to exclude synapses, currently only works for flywire (float, default 0.0)
     white -- whether or not to make all the segment colors white (bool, default False)
-    custom_colors -- if a list of hex values is passed they will be used to color the neurons in the same order as the root_ids list (list of str, default False)
+    custom_colors -- if a list of hex values is passed they will be used to color the neurons in the same order as the root_ids list, or "spatial" to give neurons that are close together contrasting colors (list of str or str, default False)
+    materialization_version -- the materialization version to pull synapses from, uses the latest version if None (int, default None)
+    upload_state -- True to upload the state to the state server, False to embed it in the url, or "auto" to embed it only if the url stays under max_raw_url_length (bool or str, default "auto")
+    max_raw_url_length -- the longest url in characters that "auto" will embed a state in (int, default RAW_URL_MAX_LENGTH)
+    annotation_source -- the url of a directory written by export_synapse_annotations, if given synapses are read from it instead of being put in the state (str, default None)
+    max_annotations -- the most synapses to show per direction, larger sets are reduced using thin_method (int, default None)
+    thin_method -- "sample" to keep a spatially even subset of synapses or "cluster" to merge nearby synapses into lines labeled with their count (str, default "sample")
+    segment_properties_source -- the url of a directory written by export_segment_properties, if given its labels and tags are added to the segmentation layer (str, default None)
+    max_selected_segments -- when segment_properties_source is given, only the first this many root IDs are selected and colored in the state, the rest can be picked by label or tag from the segment list (int, default SEGMENT_PROPERTIES_MAX_SELECTED)
 
     Returns:
     ng_url -- the url for the constructed neuroglancer state (str)
     """
 
     ### CURRENTLY ASSUMES ROOT COLUMN NAMES ARE "pre/post_pt_root_id" ###
-    ### CURRENTLY ASSUMES COORD COLUMN NAMES ARE "pre/post_pt_position" ###
+    ### CURRENTLY ASSUMES COORD COLUMN NAMES ARE "pre/post_pt_position_x/y/z" ###
 
     ### CURRENTLY ASSUMES CLEFT SCORE COLUMN NAME IS "cleft_score", ONLY WORKS WITH FLYWIRE ###
-    cleft_score_column_name = "cleft_score"
 
     # sets CAVE client object using datastack name #
     client = CAVEclient(datastack_name=datastack)
 
-    # gets metadata for chosen datastack as dict #
-    stack_info = client.info.get_datastack_info()
+    # gets the datastack metadata and layer configs shared by every state #
+    stack_parts = _ng_stack_parts(
+        client, datastack, describe_lines=_ng_describes_lines(max_annotations, thin_method)
+    )
 
-    # gets base url from stack info #
-    base_url = stack_info["viewer_site"]
+    # converts root IDs to integers for passing into query_table method #
+    root_ids = list(map(int, root_ids))
 
-    # gets viewer resolution from stack info #
-    viewer_res = [
-        stack_info["viewer_resolution_x"],
-        stack_info["viewer_resolution_y"],
-        stack_info["viewer_resolution_z"],
+    # colors neurons by where they are, so that neighboring neurons contrast #
+    if custom_colors == "spatial" and white != True:
+        root_coords = _ng_root_coords(root_ids, datastack)
+        custom_colors = generate_spatial_color_list(
+            [root_coords[root_id] for root_id in root_ids], stack_parts["viewer_res"]
+        )
+
+    # points synapse layers at precomputed annotations if given, otherwise queries synapses to put in the state #
+    syn_sources = _ng_syn_sources(annotation_source, incoming, outgoing)
+
+    # queries synapse table for each requested direction, removing synapses with cleft scores below threshold #
+    syn_coords_dfs = {}
+    syn_counts = {}
+    for direction in _ng_syn_directions(incoming, outgoing) if annotation_source is None else []:
+        syn_df = query_synapses(
+            root_ids,
+            datastack,
+            direction=direction,
+            cleft_thresh=cleft_thresh,
+            materialization_version=materialization_version,
+            client=client,
+        )
+        syn_counts[direction] = len(syn_df)
+        syn_coords_dfs[direction] = _ng_syn_coords(
+            syn_df,
+            stack_parts["viewer_res"],
+            max_annotations=max_annotations,
+            thin_method=thin_method,
+        )
+
+    # converts the state into a JSON while feeding in synapse coordinates #
+    state_json = _render_ng_state(
+        root_ids,
+        stack_parts,
+        syn_coords_dfs,
+        white=white,
+        custom_colors=custom_colors,
+        syn_sources=syn_sources,
+        segment_properties_source=segment_properties_source,
+        max_selected_segments=max_selected_segments,
+    )
+
+    # embeds the state in the url or uploads it to the state server #
+    url = _ng_state_url(
+        client,
+        state_json,
+        stack_parts["base_url"],
+        upload_state=upload_state,
+        max_raw_url_length=max_raw_url_length,
+    )
+
+    for direction, syn_count in syn_counts.items():
+        print(direction.capitalize() + " Synapses:", syn_count)
+        if len(syn_coords_dfs[direction]) < syn_count:
+            print(f"    Showing {len(syn_coords_dfs[direction])} annotations ({thin_method})")
+    print(url)
+
+    return url
+
+
+def _ng_state_url(client, state_json, base_url, upload_state="auto", max_raw_url_length=None):
+    """Make a link to a state, either by embedding the state in the url fragment or by uploading it to the state server."""
+
+    if upload_state not in [True, False, "auto"]:
+        raise ValueError("upload_state must be True, False or 'auto'.")
+    if max_raw_url_length is None:
+        max_raw_url_length = RAW_URL_MAX_LENGTH
+
+    # minimizes the JSON and percent-encodes it into the url fragment, as neuroglancer does #
+    raw_url = (
+        base_url.rstrip("/")
+        + "/#!"
+        + urllib.parse.quote(json.dumps(state_json, separators=(",", ":")), safe=":,[]")
+    )
+    if upload_state == False or (upload_state == "auto" and len(raw_url) <= max_raw_url_length):
+        return raw_url
+
+    # sends JSON state to remote state server and gets back state ID #
+    new_state_id = client.state.upload_state_json(state_json)
+
+    # builds url using the state ID and the base url for the dataset #
+    url = client.state.build_neuroglancer_url(
+        state_id=new_state_id,
+        ngl_url=base_url,
+    )
+
+    return url
+
+
+def _ng_syn_directions(incoming, outgoing):
+    """List the synapse directions requested by the incoming and outgoing flags, incoming first."""
+
+    return [
+        direction
+        for direction, requested in [("incoming", incoming), ("outgoing", outgoing)]
+        if requested == True
     ]
 
-    # if synapses are requested, sets name of synapse table using metadata #
-    if incoming == True or outgoing == True:
-        synapse_table_name = stack_info["synapse_table"]
-
-    # determines names of synapse table columns and ng tabs based on arguments #
-    # also sets syn_state variable for use later #
-    if incoming == True and outgoing == False:
-        syn_state = "in"
-        syn_col_name_1 = "post_pt_root_id"
-        syn_tab_name_1 = "Incoming Synapses"
-    elif outgoing == True and incoming == False:
-        syn_state = "out"
-        syn_col_name_1 = "pre_pt_root_id"
-        syn_tab_name_1 = "Outgoing Synapses"
-    elif incoming == True and outgoing == True:
-        syn_state = "both"
-        syn_col_name_1 = "post_pt_root_id"
-        syn_tab_name_1 = "Incoming Synapses"
-        syn_col_name_2 = "pre_pt_root_id"
-        syn_tab_name_2 = "Outgoing Synapses"
-    else:
-        syn_state = "none"
 
-    # converts root IDs to integers for passing into query_table method #
-    root_ids = list(map(int, root_ids))
+def _ng_describes_lines(max_annotations, thin_method):
+    """Whether synapse lines get a description, which only happens when nearby synapses are merged into counted lines."""
 
-    # queries synapse table based on arguments #
-    if syn_state != "none":
-        syn_df_1 = client.materialize.query_table(
-            synapse_table_name,
-            filter_in_dict={syn_col_name_1: root_ids},
-        )
+    return max_annotations is not None and thin_method == "cluster"
 
-        # removes synapses with cleft scores below threshold #
-        if cleft_thresh > 0.0:
-            syn_df_1 = syn_df_1[
-                syn_df_1[cleft_score_column_name] >= float(cleft_thresh)
-            ].reset_index(drop=True)
-        # makes df of just the coordinates converted into viewer resolution #
-        syn_coords_df_1 = pd.DataFrame(
-            {
-                "pre": [
-                    [coord / res for coord, res in zip(point, viewer_res)]
-                    for point in syn_df_1["pre_pt_position"]
-                ],
-                "post": [
-                    [coord / res for coord, res in zip(point, viewer_res)]
-                    for point in syn_df_1["post_pt_position"]
-                ],
-            }
+
+def _ng_syn_coords(syn_df, viewer_res, max_annotations=None, thin_method="sample"):
+    """Make the pre/post coordinate dataframe, in viewer resolution, that the synapse line layers read, thinned to max_annotations rows if given.
+
+    A "description" column is added only when thin_method is "cluster", to match the line mapper from _ng_stack_parts.
+    """
+
+    pre_coords = synapse_positions(syn_df, "pre", viewer_res)
+    post_coords = synapse_positions(syn_df, "post", viewer_res)
+    descriptions = [None] * len(pre_coords)
+
+    if max_annotations is not None and len(pre_coords) > max_annotations:
+        pre_coords, post_coords, descriptions = _thin_synapse_lines(
+            pre_coords, post_coords, viewer_res, max_annotations, thin_method
         )
-        # adds df of synapse coords to list for passing into statebuilder #
-        syn_df_list = [syn_coords_df_1]
-        # gets count of number of synapses #
-        syn_count_1 = len(syn_coords_df_1)
 
-        # repeats the process for the second direction if both incoming and outgoing are requested #
-        if syn_state == "both":
-            syn_df_2 = client.materialize.query_table(
-                synapse_table_name,
-                filter_in_dict={syn_col_name_2: root_ids},
-            )
-            if cleft_thresh > 0.0:
-                syn_df_2 = syn_df_2[
-                    syn_df_2[cleft_score_column_name] >= float(cleft_thresh)
-                ].reset_index(drop=True)
-            syn_coords_df_2 = pd.DataFrame(
-                {
-                    "pre": [
-                        [coord / res for coord, res in zip(point, viewer_res)]
-                        for point in syn_df_2["pre_pt_position"]
-                    ],
-                    "post": [
-                        [coord / res for coord, res in zip(point, viewer_res)]
-                        for point in syn_df_2["post_pt_position"]
-                    ],
-                }
-            )
-            syn_df_list.append(syn_coords_df_2)
-            syn_count_2 = len(syn_coords_df_2)
+    coords_df = pd.DataFrame({"pre": pre_coords.tolist(), "post": post_coords.tolist()})
+    if _ng_describes_lines(max_annotations, thin_method):
+        coords_df["description"] = descriptions
+
+    return coords_df
 
-    # makes empty list to fill with layers #
-    layer_list = []
 
-    # sets configuration for EM layer #
-    img = ImageLayerConfig(
-        name="EM",
-        source=client.info.image_source(),
+def _thin_synapse_lines(pre_coords, post_coords, resolution, max_annotations, method="sample"):
+    """Reduce synapse lines to at most max_annotations using a spatial grid.
+
+    The grid is made as fine as possible while still having no more occupied cells than the budget,
+    by shrinking the cells in small steps until the next step would go over. "sample" then keeps synapses from
+    every cell in turn, so dense and sparse regions both stay visible, and "cluster" replaces each
+    cell's synapses with one line between their mean pre and post points, described by its count.
+
+    Arguments:
+    pre_coords -- the presynaptic point of each synapse (numpy array of shape (N, 3))
+    post_coords -- the postsynaptic point of each synapse (numpy array of shape (N, 3))
+    resolution -- the xyz size of one coordinate unit in nm, used to make grid cells cubic (list of ints)
+    max_annotations -- the most lines to return (int)
+    method -- "sample" or "cluster" (str, default "sample")
+
+    Returns:
+    pre_coords -- the presynaptic points of the kept or merged lines (numpy array)
+    post_coords -- the postsynaptic points of the kept or merged lines (numpy array)
+    descriptions -- the synapse count of each merged line, or None for sampled lines (list)
+    """
+
+    if method not in ["sample", "cluster"]:
+        raise ValueError("thin_method must be 'sample' or 'cluster'.")
+
+    # bins presynaptic points in nm at successively finer grids, roughly doubling the cell count each step #
+    coords_nm = pre_coords * np.asarray(resolution, dtype=np.float64)
+    coords_nm = coords_nm - coords_nm.min(axis=0)
+    extent = max(float(coords_nm.max()), 1.0)
+    cell_keys = np.zeros(len(coords_nm), dtype=np.int64)
+    for grid_size in np.unique(np.round(2 ** (np.arange(3, 61) / 3)).astype(np.int64)):
+        cells = np.minimum(np.floor(coords_nm / (extent / grid_size)), grid_size - 1).astype(np.int64)
+        finer_keys = np.ravel_multi_index(tuple(cells.T), (int(grid_size),) * 3)
+        if len(np.unique(finer_keys)) > max_annotations:
+            break
+        cell_keys = finer_keys
+
+    # numbers each synapse within its cell #
+    order = np.argsort(cell_keys, kind="stable")
+    sorted_keys = cell_keys[order]
+    unique_keys, cell_starts, cell_codes = np.unique(
+        sorted_keys, return_index=True, return_inverse=True
+    )
+
+    if method == "sample":
+        # takes the first synapse of every cell, then the second, and so on until the budget is used #
+        ranks = np.arange(len(order)) - cell_starts[cell_codes]
+        kept = np.sort(order[np.lexsort((sorted_keys, ranks))[:max_annotations]])
+        return pre_coords[kept], post_coords[kept], [None] * len(kept)
+
+    # averages each cell's synapses into one weighted line #
+    counts = np.bincount(cell_codes)
+    cell_pre = np.column_stack(
+        [np.bincount(cell_codes, weights=pre_coords[order, axis]) / counts for axis in range(3)]
     )
+    cell_post = np.column_stack(
+        [np.bincount(cell_codes, weights=post_coords[order, axis]) / counts for axis in range(3)]
+    )
+    descriptions = [f"{count} synapses" for count in counts.tolist()]
+
+    return cell_pre, cell_post, descriptions
+
+
+def _ng_stack_parts(client, datastack, describe_lines=False):
+    """Gather the datastack metadata and layer configs that are the same for every state of a datastack.
+
+    Synapse lines read a "description" column only if describe_lines is True.
+    """
 
-    # adds EM layer to list #
-    layer_list.append(img)
+    # gets metadata for chosen datastack as dict #
+    stack_info = client.info.get_datastack_info()
 
     seg_source = client.info.segmentation_source()
     if datastack == "brain_and_nerve_cord":
         split_url = seg_source.split("https")
         seg_source = split_url[0] + "middleauth+https" + split_url[1]
 
-    # determines color scheme for segmentation #
-    if white == True:
-        color_list = ["#ffffff" for x in root_ids]
-    elif custom_colors != False:
-        color_list = custom_colors
+    # defines configuration for line annotations, labeling them only when merged lines carry counts #
+    if describe_lines:
+        lines = LineMapper(
+            point_column_a="pre",
+            point_column_b="post",
+            description_column="description",
+        )
     else:
-        color_list = generate_color_list(len(root_ids), alternate_brightness=0.3)
-
-    # defines segmentation layer config #
-    seg = SegmentationLayerConfig(
-        name="Segmentation",
-        source=seg_source,
-        fixed_ids=root_ids,
-        fixed_id_colors=color_list,
-    )
-
-    # adds segmentation layer to list #
-    layer_list.append(seg)
-
-    # defines synapse layer config(s) if requested #
-    if syn_state != "none":
-        # defines configuration for line annotations #
         lines = LineMapper(
             point_column_a="pre",
             point_column_b="post",
         )
 
-        if datastack == "flywire_fafb_production":
-            in_syn_color = "#FFFF00"
-            out_syn_color = "#0000FF"
-        else:
-            in_syn_color = "#FF6E4A"
-            out_syn_color = "#3D81FF"
-
-        # ensures consistent color coding for incoming and outgoing synapses #
-        if syn_state == "out":
-            syn_1 = AnnotationLayerConfig(
-                name=syn_tab_name_1,
-                mapping_rules=lines,
-                color=out_syn_color,
-            )
-        else:
-            syn_1 = AnnotationLayerConfig(
-                name=syn_tab_name_1,
-                mapping_rules=lines,
-                color=in_syn_color,
-            )
-        layer_list.append(syn_1)
-        # repeats process if in and output synapses requested #
-        if syn_state == "both":
-            syn_2 = AnnotationLayerConfig(
-                name=syn_tab_name_2,
-                mapping_rules=lines,
-                color=out_syn_color,
-            )
-
-    # VIEW SET, CURRENTLY NONFUNCTIONAL #
     if datastack == "flywire_fafb_production":
-        view_options = {
-            "position": [130900, 57662, 3052],
-            "zoom_3d": 6.64,
-        }
-    elif datastack == "brain_and_nerve_cord":
-        view_options = {
-            "position": [
-                127339,
-                142245,
-                3041,
-            ],
-            # "zoom_3d": 6.64,
-        }
-
-    # defines state builder by passing in rules for img, seg, and anno layers #
-    sb_1 = StateBuilder(
-        layer_list,
-        resolution=viewer_res,
-        # view_kws=view_options,
-    )
+        in_syn_color = "#FFFF00"
+        out_syn_color = "#0000FF"
+    else:
+        in_syn_color = "#FF6E4A"
+        out_syn_color = "#3D81FF"
 
     # chooses target site name based on datastack to handle pre-spelunker datasets #
     if datastack == "flywire_fafb_production":
@@ -273,104 +554,1261 @@ def build_ng_link(
     else:
         target_site_name = "spelunker"
 
-    # converts the state into a JSON while feeding in synapse coordinates #
-    if syn_state != "none":
-        if syn_state == "both":
-            # creates second statebuilder to handle second annotation layer #
-            sb_2 = StateBuilder([syn_2])
-            # chains statebuilders together #
-            # this method will likely be deprecated in the near future #
-            chained_sb = ChainedStateBuilder([sb_1, sb_2])
-            # create a state json using the render_state method of the StateBuilder object(s) #
-            state_json = json.loads(
-                chained_sb.render_state(
-                    [syn_coords_df_1, syn_coords_df_2],
-                    return_as="json",
-                    target_site=target_site_name,
-                )
-            )
-        else:
-            state_json = json.loads(
-                sb_1.render_state(
-                    syn_coords_df_1, return_as="json", target_site=target_site_name
-                )
-            )
-    else:
-        state_json = json.loads(
-            sb_1.render_state(return_as="json", target_site=target_site_name)
-        )
-
     if datastack == "flywire_fafb_production":
-        state_json["perspectiveOrientation"] = [
+        perspective_orientation = [
             -0.029998891055583954,
             -0.008902468718588352,
             -0.02068145014345646,
             -0.9992963075637817,
         ]
     elif datastack == "brain_and_nerve_cord":
-        state_json["perspectiveOrientation"] = [
+        perspective_orientation = [
             -0.006392207462340593,
             -0.9995864033699036,
             -0.0023922761902213097,
             -0.02793547324836254,
         ]
+    else:
+        perspective_orientation = None
 
-    # sends JSON state to remote state server and gets back state ID #
-    new_state_id = client.state.upload_state_json(state_json)
+    stack_parts = {
+        # gets base url from stack info #
+        "base_url": stack_info["viewer_site"],
+        # gets viewer resolution from stack info #
+        "viewer_res": [
+            stack_info["viewer_resolution_x"],
+            stack_info["viewer_resolution_y"],
+            stack_info["viewer_resolution_z"],
+        ],
+        # sets configuration for EM layer #
+        "img": ImageLayerConfig(
+            name="EM",
+            source=client.info.image_source(),
+        ),
+        "seg_source": seg_source,
+        # ensures consistent color coding for incoming and outgoing synapses #
+        "syn_layers": {
+            "incoming": AnnotationLayerConfig(
+                name="Incoming Synapses",
+                mapping_rules=lines,
+                color=in_syn_color,
+            ),
+            "outgoing": AnnotationLayerConfig(
+                name="Outgoing Synapses",
+                mapping_rules=lines,
+                color=out_syn_color,
+            ),
+        },
+        "syn_colors": {"incoming": in_syn_color, "outgoing": out_syn_color},
+        "target_site_name": target_site_name,
+        "perspective_orientation": perspective_orientation,
+    }
 
-    # builds url using the state ID and the base url for the dataset #
-    url = client.state.build_neuroglancer_url(
-        state_id=new_state_id,
-        ngl_url=base_url,
+    return stack_parts
+
+
+def _render_ng_state(
+    root_ids,
+    stack_parts,
+    syn_coords_dfs,
+    white=False,
+    custom_colors=False,
+    syn_sources=None,
+    segment_properties_source=None,
+    max_selected_segments=None,
+):
+    """Render the state JSON for a group of root IDs, with synapses given as coordinates or as precomputed annotation sources for each requested direction."""
+
+    if syn_sources is None:
+        syn_sources = {}
+
+    # determines color scheme for segmentation #
+    if white == True:
+        color_list = ["#ffffff" for x in root_ids]
+    elif custom_colors != False:
+        color_list = custom_colors
+    elif len(root_ids) == 0:
+        color_list = []
+    else:
+        color_list = generate_color_list(len(root_ids), alternate_brightness=0.3)
+
+    # selects only a few segments when the rest can be found through their segment properties #
+    if segment_properties_source is not None:
+        if max_selected_segments is None:
+            max_selected_segments = SEGMENT_PROPERTIES_MAX_SELECTED
+        root_ids = root_ids[:max_selected_segments]
+        color_list = color_list[:max_selected_segments]
+
+    # defines segmentation layer config #
+    seg = SegmentationLayerConfig(
+        name="Segmentation",
+        source=stack_parts["seg_source"],
+        fixed_ids=root_ids,
+        fixed_id_colors=color_list,
     )
 
-    if syn_state == "in":
-        print("Incoming Synapses:", syn_count_1)
-    elif syn_state == "out":
-        print("Outgoing Synapses:", syn_count_1)
-    elif syn_state == "both":
-        print("Incoming Synapses:", syn_count_1)
-        print("Outgoing Synapses:", syn_count_2)
-    print(url)
+    # adds EM, segmentation and the first synapse layer, if requested, to list #
+    layer_list = [stack_parts["img"], seg]
+    directions = list(syn_coords_dfs)
+    if len(directions) > 0:
+        layer_list.append(stack_parts["syn_layers"][directions[0]])
 
-def calc_distance(point_a, point_b, xyz_resolution):
-    """Calculate distance in 3D between two points in nanometers based on the viewer resolution.
-    
-    Arguments:
-    point_a -- xyz coordinates of first point (list of ints)
-    point_b -- xyz coordinates of second point (list of ints)
-    xyz_resolution -- the nanometers per voxel in the x, y, and z directions (list of ints)
+    # defines state builder by passing in rules for img, seg, and anno layers #
+    sb_1 = StateBuilder(
+        layer_list,
+        resolution=stack_parts["viewer_res"],
+    )
 
-    Returns:
-    dist -- the 3D distance in nanometers between points a and b"""
+    if len(directions) == 2:
+        # creates second statebuilder to handle second annotation layer #
+        sb_2 = StateBuilder([stack_parts["syn_layers"][directions[1]]])
+        # chains statebuilders together #
+        # this method will likely be deprecated in the near future #
+        chained_sb = ChainedStateBuilder([sb_1, sb_2])
+        # create a state json using the render_state method of the StateBuilder object(s) #
+        state_json = json.loads(
+            chained_sb.render_state(
+                [syn_coords_dfs[direction] for direction in directions],
+                return_as="json",
+                target_site=stack_parts["target_site_name"],
+            )
+        )
+    elif len(directions) == 1:
+        state_json = json.loads(
+            sb_1.render_state(
+                syn_coords_dfs[directions[0]],
+                return_as="json",
+                target_site=stack_parts["target_site_name"],
+            )
+        )
+    else:
+        state_json = json.loads(
+            sb_1.render_state(return_as="json", target_site=stack_parts["target_site_name"])
+        )
 
-    # calculates distance in x, y, and z dimensions #
-    xdist = (xyz_resolution[0] * point_a[0]) - (xyz_resolution[0] * point_b[0])
-    ydist = (xyz_resolution[1] * point_a[1]) - (xyz_resolution[1] * point_b[1])
-    zdist = (xyz_resolution[2] * point_a[2]) - (xyz_resolution[2] * point_b[2])
+    if stack_parts["perspective_orientation"] is not None:
+        state_json["perspectiveOrientation"] = stack_parts["perspective_orientation"]
+
+    # adds segment properties as a second source of the segmentation layer #
+    if segment_properties_source is not None:
+        if not segment_properties_source.startswith("precomputed://"):
+            segment_properties_source = "precomputed://" + segment_properties_source
+        for layer in state_json["layers"]:
+            if layer["name"] == "Segmentation":
+                layer["source"] = [layer["source"], segment_properties_source]
+
+    # adds synapse layers that read from precomputed annotation sources, showing only the selected segments' synapses #
+    for direction, syn_source in syn_sources.items():
+        state_json["layers"].append(
+            {
+                "type": "annotation",
+                "source": syn_source,
+                "name": direction.capitalize() + " Synapses",
+                "annotationColor": stack_parts["syn_colors"][direction],
+                "linkedSegmentationLayer": {
+                    "pre_segment": "Segmentation",
+                    "post_segment": "Segmentation",
+                },
+                "filterBySegmentation": [
+                    "post_segment" if direction == "incoming" else "pre_segment"
+                ],
+            }
+        )
+
+    return state_json
+
+
+def _ng_syn_sources(annotation_source, incoming, outgoing):
+    """Point each requested synapse direction at its directory under an export_synapse_annotations url."""
+
+    if annotation_source is None:
+        return {}
+    if not annotation_source.startswith("precomputed://"):
+        annotation_source = "precomputed://" + annotation_source
+
+    return {
+        direction: annotation_source.rstrip("/") + "/" + direction
+        for direction in _ng_syn_directions(incoming, outgoing)
+    }
+
+
+def _ng_root_coords(root_ids, datastack, client=None):
+    """Get a representative coordinate in viewer resolution for each root ID, NaN where none is found."""
+
+    summary_df = get_neuron_summary(root_ids, datastack, metrics=["coords"], client=client)
+    coords = summary_df[["x", "y", "z"]].to_numpy(dtype=np.float64, na_value=np.nan)
+
+    return dict(zip(map(int, summary_df["root_id"].tolist()), coords))
+
+
+def build_ng_links(
+    list_of_id_groups,
+    datastack,
+    incoming=False,
+    outgoing=False,
+    cleft_thresh=0.0,
+    white=False,
+    custom_colors=False,
+    materialization_version=None,
+    upload_state="auto",
+    max_raw_url_length=None,
+    annotation_source=None,
+    max_annotations=None,
+    thin_method="sample",
+    segment_properties_source=None,
+    max_selected_segments=None,
+    max_workers=8,
+    client=None,
+):
+    """Build a neuroglancer state url for each of many groups of root IDs.
+
+    Makes the same links as calling build_ng_link once per group, but shares one client, the datastack
+    metadata and the layer configs between all states, pulls synapses once for all groups together,
+    builds repeated groups only once and uploads states concurrently.
+
+    Arguments:
+    list_of_id_groups -- the groups of root IDs to make links for, one link per group (list of lists of str or int)
+    datastack -- the name of the datastack the root IDs belong to (str)
+    incoming -- whether to include incoming synapses (bool, default False)
+    outgoing -- whether to include outgoing synapses (bool, default False)
+    cleft_thresh -- the cleft score threshold below which to exclude synapses, currently only works for flywire (float, default 0.0)
+    white -- whether or not to make all the segment colors white (bool, default False)
+    custom_colors -- if a list with one list of hex values per group is passed they will be used to color each group's neurons, or "spatial" to give neurons that are close together contrasting colors in every group (list of lists of str or str, default False)
+    materialization_version -- the materialization version to pull synapses from, uses the latest version if None (int, default None)
+    upload_state -- True to upload every state, False to embed every state in its url, or "auto" to embed only states whose url stays under max_raw_url_length (bool or str, default "auto")
+    max_raw_url_length -- the longest url in characters that "auto" will embed a state in (int, default RAW_URL_MAX_LENGTH)
+    annotation_source -- the url of a directory written by export_synapse_annotations, if given synapses are read from it instead of being put in the states (str, default None)
+    max_annotations -- the most synapses to show per direction in each state, larger sets are reduced using thin_method (int, default None)
+    thin_method -- "sample" to keep a spatially even subset of synapses or "cluster" to merge nearby synapses into lines labeled with their count (str, default "sample")
+    segment_properties_source -- the url of a directory written by export_segment_properties, if given its labels and tags are added to the segmentation layer (str, default None)
+    max_selected_segments -- when segment_properties_source is given, only the first this many root IDs of each group are selected and colored in its state, the rest can be picked by label or tag from the segment list (int, default SEGMENT_PROPERTIES_MAX_SELECTED)
+    max_workers -- the number of states to upload at the same time (int, default 8)
+    client -- an existing CAVEclient for the datastack to reuse instead of creating a new one (CAVEclient, default None)
+
+    Returns:
+    url_list -- the url for each group, in the same order as list_of_id_groups (list of str)
+    """
+
+    # sets one CAVE client, unless one was passed in, and one set of layer configs for every state #
+    if client is None:
+        client = CAVEclient(datastack_name=datastack)
+    stack_parts = _ng_stack_parts(
+        client, datastack, describe_lines=_ng_describes_lines(max_annotations, thin_method)
+    )
+
+    # converts root IDs to integers and finds the distinct requests #
+    groups = [list(map(int, id_group)) for id_group in list_of_id_groups]
+    spatial_colors = custom_colors == "spatial" and white != True
+    group_keys = [
+        (
+            tuple(group),
+            tuple(custom_colors[i]) if custom_colors not in [False, "spatial"] else None,
+        )
+        for i, group in enumerate(groups)
+    ]
+    unique_keys = list(dict.fromkeys(group_keys))
+
+    # points synapse layers at precomputed annotations if given, otherwise queries synapses once for the roots of all groups together #
+    syn_sources = _ng_syn_sources(annotation_source, incoming, outgoing)
+    all_root_ids = list(dict.fromkeys(root_id for group in groups for root_id in group))
+
+    # finds every root's position once if neurons are colored by where they are #
+    if spatial_colors:
+        root_coords = _ng_root_coords(all_root_ids, datastack, client=client)
+    all_syn_dfs = {}
+    for direction in _ng_syn_directions(incoming, outgoing) if annotation_source is None else []:
+        all_syn_dfs[direction] = query_synapses(
+            all_root_ids,
+            datastack,
+            direction=direction,
+            cleft_thresh=cleft_thresh,
+            materialization_version=materialization_version,
+            client=client,
+        )
+
+    # finds each root's synapse rows in one pass, so each group only gathers its own roots' rows #
+    root_rows = {}
+    for direction, syn_df in all_syn_dfs.items():
+        root_col_name = "post_pt_root_id" if direction == "incoming" else "pre_pt_root_id"
+        root_rows[direction] = {
+            int(root_id): rows
+            for root_id, rows in syn_df.groupby(root_col_name, sort=False).indices.items()
+        }
+
+    # renders one state per distinct request, using each group's share of the synapses #
+    print(f"  Building {len(unique_keys)} states for {len(groups)} groups...")
+    state_jsons = []
+    for root_ids, colors in unique_keys:
+        if spatial_colors:
+            colors = generate_spatial_color_list(
+                [root_coords[root_id] for root_id in root_ids], stack_parts["viewer_res"]
+            )
+        syn_coords_dfs = {}
+        for direction, syn_df in all_syn_dfs.items():
+            # keeps the rows in their original order #
+            group_rows = [
+                root_rows[direction][root_id]
+                for root_id in set(root_ids)
+                if root_id in root_rows[direction]
+            ]
+            group_rows = np.sort(np.concatenate(group_rows)) if len(group_rows) > 0 else []
+            syn_coords_dfs[direction] = _ng_syn_coords(
+                syn_df.iloc[group_rows],
+                stack_parts["viewer_res"],
+                max_annotations=max_annotations,
+                thin_method=thin_method,
+            )
+        state_jsons.append(
+            _render_ng_state(
+                list(root_ids),
+                stack_parts,
+                syn_coords_dfs,
+                white=white,
+                custom_colors=list(colors) if colors is not None else False,
+                syn_sources=syn_sources,
+                segment_properties_source=segment_properties_source,
+                max_selected_segments=max_selected_segments,
+            )
+        )
+
+    # makes links concurrently, only states too big to embed in the url are uploaded #
+    def make_url(state_json):
+        return _ng_state_url(
+            client,
+            state_json,
+            stack_parts["base_url"],
+            upload_state=upload_state,
+            max_raw_url_length=max_raw_url_length,
+        )
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        unique_urls = dict(zip(unique_keys, executor.map(make_url, state_jsons)))
+
+    # returns urls in input order, reusing urls for repeated requests #
+    url_list = [unique_urls[group_key] for group_key in group_keys]
+
+    return url_list
+
+
+def build_point_tree(coords, xyz_resolution=[1, 1, 1]):
+    """Build a KD-tree over points in nanometers that find_nearest_points and find_points_in_radius can reuse.
+
+    Arguments:
+    coords -- xyz coordinates of the points (numpy array of shape (N, 3) or list of lists of ints)
+    xyz_resolution -- the nanometers per voxel in the x, y, and z directions (list of ints, default [1, 1, 1])
+
+    Returns:
+    tree -- a KD-tree over the points in nm, row i of coords is point i of the tree (scipy.spatial.cKDTree)
+    """
+
+    coords_nm = np.asarray(coords, dtype=np.float64).reshape(-1, 3) * np.asarray(
+        xyz_resolution, dtype=np.float64
+    )
+    tree = scipy.spatial.cKDTree(coords_nm)
+
+    return tree
+
+
+def build_synapse_snapshot(
+    datastack,
+    snapshot_dir,
+    materialization_version=None,
+    export_dir=None,
+    chunk_size=100000,
+    max_workers=4,
+):
+    """Download a datastack's synapse table and index it on disk for fast local lookups.
+
+    The table is streamed to a parquet dataset (see get_table) and then rewritten as one .npy array
+    per numeric column, sorted by pre_pt_root_id, along with a permutation sorting the rows by
+    post_pt_root_id and offset indexes for both. Load the result with load_synapse_snapshot and pass
+    it as the snapshot argument of query_synapses, get_synapse_counts, get_nt or get_partners to
+    answer those queries without contacting the materialize service.
+
+    Arguments:
+    datastack -- the name of the datastack to snapshot (str)
+    snapshot_dir -- the directory to write the snapshot into (str)
+    materialization_version -- the materialization version to snapshot, uses the latest version if None (int, default None)
+    export_dir -- where to keep the intermediate parquet export (str, default snapshot_dir/_export)
+    chunk_size -- the width of each window of annotation IDs when downloading (int, default 100000)
+    max_workers -- the number of windows to download at the same time (int, default 4)
+
+    Returns:
+    snapshot_dir -- the directory holding the finished snapshot (str)
+    """
+
+    # sets CAVE client object using datastack name #
+    client = CAVEclient(datastack_name=datastack)
+
+    # gets name of synapse table and pins the version #
+    synapse_table_name = client.info.get_datastack_info()["synapse_table"]
+    if materialization_version is None:
+        materialization_version = client.materialize.version
+
+    # streams the synapse table to disk, resuming any earlier partial download #
+    if export_dir is None:
+        export_dir = os.path.join(snapshot_dir, "_export")
+    _stream_table_to_parquet(
+        client,
+        synapse_table_name,
+        export_dir,
+        materialization_version,
+        chunk_size,
+        max_workers,
+        split_positions=True,
+    )
+
+    def read_column(col_name):
+        # reads one column at a time to keep memory bounded, converting it to its lean dtype #
+        values = pq.read_table(export_dir, columns=[col_name]).column(0).to_numpy()
+        return lean_synapse_df(pd.DataFrame({col_name: values}))[col_name].to_numpy()
+
+    # sorts rows by presynaptic root, then finds the order of those rows by postsynaptic root #
+    pre_ids = read_column("pre_pt_root_id")
+    pre_order = np.argsort(pre_ids, kind="stable")
+    pre_ids = pre_ids[pre_order]
+    post_ids = read_column("post_pt_root_id")[pre_order]
+    post_order = np.argsort(post_ids, kind="stable")
+    post_ids = post_ids[post_order]
+
+    # builds offset indexes, rows for root pre_roots[i] are pre_offsets[i] to pre_offsets[i + 1] #
+    pre_roots, pre_starts = np.unique(pre_ids, return_index=True)
+    post_roots, post_starts = np.unique(post_ids, return_index=True)
+    index = {
+        "pre_roots": pre_roots,
+        "pre_offsets": np.append(pre_starts, len(pre_ids)),
+        "post_roots": post_roots,
+        "post_offsets": np.append(post_starts, len(post_ids)),
+        "post_order": post_order,
+    }
+    del pre_ids, post_ids
+
+    # writes index arrays #
+    os.makedirs(os.path.join(snapshot_dir, "index"), exist_ok=True)
+    for name, array in index.items():
+        np.save(os.path.join(snapshot_dir, "index", name + ".npy"), array)
+
+    # writes each numeric column in presynaptic order, skipping text and timestamp columns #
+    os.makedirs(os.path.join(snapshot_dir, "columns"), exist_ok=True)
+    column_names = []
+    for col_name in pq.ParquetDataset(export_dir).schema.names:
+        values = read_column(col_name)
+        if values.dtype.kind not in "biuf":
+            continue
+        np.save(os.path.join(snapshot_dir, "columns", col_name + ".npy"), values[pre_order])
+        column_names.append(col_name)
+
+    # writes metadata last so an unfinished snapshot can't be loaded #
+    with open(os.path.join(snapshot_dir, "snapshot.json"), "w") as f:
+        json.dump(
+            {
+                "datastack": datastack,
+                "synapse_table": synapse_table_name,
+                "materialization_version": materialization_version,
+                "row_count": int(len(pre_order)),
+                "columns": column_names,
+            },
+            f,
+        )
+
+    return snapshot_dir
+
+
+def calc_distance(point_a, point_b, xyz_resolution):
+    """Calculate distance in 3D between two points in nanometers based on the viewer resolution.
+    
+    Arguments:
+    point_a -- xyz coordinates of first point (list of ints)
+    point_b -- xyz coordinates of second point (list of ints)
+    xyz_resolution -- the nanometers per voxel in the x, y, and z directions (list of ints)
+
+    Returns:
+    dist -- the 3D distance in nanometers between points a and b"""
+
+    # calculates distance in x, y, and z dimensions #
+    xdist = (xyz_resolution[0] * point_a[0]) - (xyz_resolution[0] * point_b[0])
+    ydist = (xyz_resolution[1] * point_a[1]) - (xyz_resolution[1] * point_b[1])
+    zdist = (xyz_resolution[2] * point_a[2]) - (xyz_resolution[2] * point_b[2])
+
+    # uses distance formula to calculate distance in 3D #
+    dist = ((xdist ** 2) + (ydist ** 2) + (zdist ** 2)) ** 0.5
+
+    return dist
+
+
+def calc_distance_matrix(points_a, points_b=None, xyz_resolution=[1, 1, 1]):
+    """Calculate the distance in nanometers between every point of one set and every point of another.
+
+    The result has one entry per pair of points, so it is meant for sets of up to a few thousand points
+    each. For neighbors in large sets use find_nearest_points or find_points_in_radius.
+
+    Arguments:
+    points_a -- xyz coordinates of the first set of points (numpy array of shape (N, 3) or list of lists of ints)
+    points_b -- xyz coordinates of the second set of points, uses points_a if None (numpy array of shape (M, 3) or list of lists of ints, default None)
+    xyz_resolution -- the nanometers per voxel in the x, y, and z directions (list of ints, default [1, 1, 1])
+
+    Returns:
+    dist_matrix -- the distance in nanometers from each point in points_a (rows) to each point in points_b (columns) (numpy array of shape (N, M))
+    """
+
+    xyz_resolution = np.asarray(xyz_resolution, dtype=np.float64)
+    points_a = np.asarray(points_a, dtype=np.float64).reshape(-1, 3) * xyz_resolution
+    if points_b is None:
+        points_b = points_a
+    else:
+        points_b = np.asarray(points_b, dtype=np.float64).reshape(-1, 3) * xyz_resolution
+
+    dist_matrix = scipy.spatial.distance.cdist(points_a, points_b)
+
+    return dist_matrix
+
+
+def calc_distances(points_a, points_b, xyz_resolution=[1, 1, 1]):
+    """Calculate the distance in nanometers between each pair of points in two equally long sets of points.
+
+    Either set can also be a single point, which gives the distance from every point of the other set to it.
+
+    Arguments:
+    points_a -- xyz coordinates of the first point of each pair (numpy array of shape (N, 3) or list of lists of ints)
+    points_b -- xyz coordinates of the second point of each pair (numpy array of shape (N, 3) or list of lists of ints)
+    xyz_resolution -- the nanometers per voxel in the x, y, and z directions (list of ints, default [1, 1, 1])
+
+    Returns:
+    dists -- the 3D distance in nanometers between the points of each pair (numpy array of shape (N,))
+    """
+
+    xyz_resolution = np.asarray(xyz_resolution, dtype=np.float64)
+    points_a = np.asarray(points_a, dtype=np.float64)
+    points_b = np.asarray(points_b, dtype=np.float64)
+    if points_a.shape[-1] != 3 or points_b.shape[-1] != 3:
+        raise ValueError("points_a and points_b must hold xyz coordinates.")
+
+    # calculates distance in x, y, and z dimensions for every pair at once #
+    axis_dists = points_a * xyz_resolution - points_b * xyz_resolution
+
+    dists = np.sqrt(np.sum(axis_dists**2, axis=-1))
+
+    return dists
+
+
+def cleft_threshold_sweep(
+    root_ids,
+    datastack,
+    thresholds,
+    materialization_version=None,
+    snapshot=None,
+):
+    """Get synapse counts for many root IDs at many cleft score thresholds from a single fetch.
+
+    Each root's synapses are fetched once and sorted by cleft score, and the count at every threshold
+    is read off with a binary search, giving a whole count-vs-threshold curve per neuron.
+
+    Arguments:
+    root_ids -- the root IDs to get synapse counts for (list of int or str, will also accept a single int or str)
+    datastack -- the name of the datastack the IDs are from, currently only works with "flywire_fafb_production" (str)
+    thresholds -- the cleft score thresholds to count at, synapses with scores at or above each threshold are counted (list of float)
+    materialization_version -- the materialization version to count synapses at, uses the latest version if None (int, default None)
+    snapshot -- a local snapshot from load_synapse_snapshot, or its directory, to use instead of the live service (dict or str, default None)
+
+    Returns:
+    sweep_df -- one row per root ID and threshold with columns "root_id", "threshold", "incoming", "outgoing" and "total" (pandas DataFrame)
+    """
+
+    # returns error if cleft thresholding is used with non-flywire datasets #
+    if datastack != "flywire_fafb_production":
+        raise ValueError("Cleft thresholding currently only works for the 'flywire_fafb_production' dataset.")
+
+    # converts single IDs to a list and removes duplicates #
+    if isinstance(root_ids, (int, str)):
+        root_ids = [root_ids]
+    root_index = np.array(
+        list(dict.fromkeys(int(root_id) for root_id in root_ids)), dtype=np.uint64
+    )
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+
+    # loads the snapshot once for both directions #
+    if isinstance(snapshot, str):
+        snapshot = load_synapse_snapshot(snapshot)
+
+    sweep_df = pd.DataFrame(
+        {
+            "root_id": np.repeat(root_index, len(thresholds)),
+            "threshold": np.tile(thresholds, len(root_index)),
+        }
+    )
+
+    for direction, root_col_name in [
+        ("incoming", "post_pt_root_id"),
+        ("outgoing", "pre_pt_root_id"),
+    ]:
+        # fetches all synapses once, with no threshold #
+        syn_df = query_synapses(
+            root_index.tolist(),
+            datastack,
+            direction=direction,
+            materialization_version=materialization_version,
+            snapshot=snapshot,
+        )
+        root_codes = pd.Index(root_index).get_indexer(syn_df[root_col_name].to_numpy())
+        scores = syn_df["cleft_score"].to_numpy(np.float64)
+
+        # sorts synapses by root, then by score, using one combined key #
+        # each root gets its own band of width span, so bands never overlap #
+        low = scores.min() if len(scores) > 0 else 0.0
+        span = (scores.max() - low if len(scores) > 0 else 0.0) + 1.0
+        sorted_keys = np.sort(root_codes * span + (scores - low))
+
+        # finds where each threshold falls within each root's band #
+        # thresholds above the top score land at the start of the next band, giving a count of 0 #
+        band_starts = np.arange(len(root_index)) * span
+        first_kept = np.searchsorted(
+            sorted_keys,
+            band_starts[:, None] + np.clip(thresholds - low, 0.0, span)[None, :],
+            side="left",
+        )
+        band_ends = np.searchsorted(sorted_keys, band_starts + span, side="left")
+
+        sweep_df[direction] = (band_ends[:, None] - first_kept).ravel()
+
+    sweep_df["total"] = sweep_df["incoming"] + sweep_df["outgoing"]
+
+    return sweep_df
+
+
+def clear_synapse_cache(cache_dir=None, datastack=None):
+    """Delete cached synapse query results from disk.
+
+    Arguments:
+    cache_dir -- the cache directory to clear (str, default SYNAPSE_CACHE_DIR)
+    datastack -- if given, only clears cached results for this datastack (str, default None)
+
+    Returns:
+    removed -- the number of cached files deleted (int)
+    """
+
+    # sets cache directory to default if none given #
+    if cache_dir is None:
+        cache_dir = SYNAPSE_CACHE_DIR
+
+    # narrows the search to one datastack if requested #
+    if datastack is not None:
+        cache_dir = os.path.join(cache_dir, datastack)
+
+    # deletes every cached parquet file below the cache directory #
+    # running cache sizes are forgotten so they are measured again on next use #
+    _SYNAPSE_CACHE_BYTES.clear()
+    removed = 0
+    for dirpath, dirnames, filenames in os.walk(cache_dir):
+        for filename in filenames:
+            if filename.endswith(".parquet"):
+                os.remove(os.path.join(dirpath, filename))
+                removed += 1
+
+    return removed
+
+
+def _radius_pairs(coords, radius, group_codes=None):
+    """Find every pair of points within a radius of each other using a spatial hash grid.
+
+    Points are bucketed into cubic cells one radius wide, so each point only has to be compared
+    against the points in its own cell and the neighboring cells, keeping the search linear in the
+    number of points. If group codes are given, only points in the same group are paired.
+
+    Arguments:
+    coords -- point coordinates, in the same units as radius (numpy array of shape (N, 3))
+    radius -- the largest distance between two points that are paired (float)
+    group_codes -- non-negative group numbers, one per point, or None to pair across all points (numpy array, default None)
+
+    Returns:
+    pairs_a -- the first point index of each pair (numpy array)
+    pairs_b -- the second point index of each pair, always larger than pairs_a (numpy array)
+    """
+
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 3)
+    if len(coords) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    if group_codes is None:
+        group_codes = np.zeros(len(coords), dtype=np.int64)
+
+    # bins points into cells, padded by one cell on each side so neighbor offsets stay in bounds #
+    cells = np.floor((coords - coords.min(axis=0)) / radius).astype(np.int64) + 1
+    dims = (int(group_codes.max()) + 1,) + tuple(int(size) for size in cells.max(axis=0) + 2)
+    cell_keys = np.ravel_multi_index((group_codes,) + tuple(cells.T), dims)
+    order = np.argsort(cell_keys, kind="stable")
+    cell_list, point_cells, cell_sizes = np.unique(
+        cell_keys[order], return_inverse=True, return_counts=True
+    )
+    cell_starts = np.cumsum(cell_sizes) - cell_sizes
+    point_cells[order] = point_cells.copy()
+
+    # checks half of the 27 neighboring cells, since the other half gives the same pairs reversed #
+    strides = np.array([dims[2] * dims[3], dims[3], 1], dtype=np.int64)
+    pairs_a = []
+    pairs_b = []
+    for offset in np.ndindex(3, 3, 3):
+        offset = np.array(offset) - 1
+        if tuple(offset) < (0, 0, 0):
+            continue
+        # looks up each occupied cell's neighbor once, rather than once per point #
+        neighbor_keys = cell_list + int(offset @ strides)
+        neighbor_cells = np.minimum(np.searchsorted(cell_list, neighbor_keys), len(cell_list) - 1)
+        neighbor_found = cell_list[neighbor_cells] == neighbor_keys
+
+        # finds the points in the neighboring cell of each point #
+        starts = cell_starts[neighbor_cells][point_cells]
+        ends = np.where(
+            neighbor_found[point_cells], starts + cell_sizes[neighbor_cells][point_cells], starts
+        )
+        candidates_a = np.repeat(np.arange(len(coords)), ends - starts)
+        candidates_b = order[_ranges_to_indices(starts, ends)]
+
+        # keeps each pair once and only if it's within the radius #
+        keep = np.linalg.norm(coords[candidates_a] - coords[candidates_b], axis=1) <= radius
+        if not offset.any():
+            keep &= candidates_a < candidates_b
+        pairs_a.append(candidates_a[keep])
+        pairs_b.append(candidates_b[keep])
+
+    pairs_a = np.concatenate(pairs_a)
+    pairs_b = np.concatenate(pairs_b)
+
+    return np.minimum(pairs_a, pairs_b), np.maximum(pairs_a, pairs_b)
+
+
+def cluster_release_sites(syn_df, xyz_resolution=[1, 1, 1], radius=100):
+    """Group synapses into presynaptic release sites, such as the synapses sharing one T-bar.
+
+    Synapses from the same presynaptic neuron whose presynaptic points are within the radius of each
+    other, directly or through a chain of other synapses, are grouped into one site.
+
+    Arguments:
+    syn_df -- synapse rows as returned by query_synapses (pandas DataFrame)
+    xyz_resolution -- the nm per unit of the synapse positions, which query_synapses returns in nm, so only needed for positions in voxels (list of ints, default [1, 1, 1])
+    radius -- the largest distance in nm between presynaptic points of synapses in the same site (float, default 100)
+
+    Returns:
+    site_df -- one row per site with columns "site_id", "pre_root_id", "n_synapses", "fan_out" (the number of distinct postsynaptic neurons) and the mean presynaptic position as "x", "y" and "z" (pandas DataFrame)
+    syn_df -- a copy of the synapse rows with a "site_id" column added (pandas DataFrame)
+    """
+
+    syn_df = syn_df.reset_index(drop=True)
+
+    # gets presynaptic points in nm and numbers each presynaptic neuron #
+    coords = synapse_positions(syn_df, point="pre")
+    coords_nm = coords * np.asarray(xyz_resolution, dtype=np.float64)
+    pre_codes, pre_roots = pd.factorize(syn_df["pre_pt_root_id"])
+
+    # links nearby synapses and labels each connected group as a site #
+    pairs_a, pairs_b = _radius_pairs(coords_nm, radius, group_codes=pre_codes)
+    adjacency = scipy.sparse.coo_matrix(
+        (np.ones(len(pairs_a), dtype=np.int8), (pairs_a, pairs_b)),
+        shape=(len(syn_df), len(syn_df)),
+    )
+    n_sites, site_ids = scipy.sparse.csgraph.connected_components(adjacency, directed=False)
+    syn_df["site_id"] = site_ids
+
+    # summarizes each site, counting distinct postsynaptic neurons from unique site/partner pairs #
+    site_pre_roots = np.zeros(n_sites, dtype=np.uint64)
+    site_pre_roots[site_ids] = np.asarray(pre_roots, dtype=np.uint64)[pre_codes]
+    post_codes = pd.factorize(syn_df["post_pt_root_id"])[0]
+    unique_pairs = np.unique(np.column_stack([site_ids, post_codes]), axis=0)
+    site_df = pd.DataFrame(
+        {
+            "site_id": np.arange(n_sites),
+            "pre_root_id": site_pre_roots,
+            "n_synapses": np.bincount(site_ids, minlength=n_sites),
+            "fan_out": np.bincount(unique_pairs[:, 0], minlength=n_sites),
+        }
+    )
+    for axis, axis_coords in zip(["x", "y", "z"], coords.T):
+        site_df[axis] = (
+            np.bincount(site_ids, weights=axis_coords, minlength=n_sites) / site_df["n_synapses"]
+        ).astype(np.float32)
+
+    return site_df, syn_df
+
+
+def _supervoxels_to_roots(client, sv_ids, timestamp=None, chunk_size=10000):
+    """Look up the root ID of many supervoxels at once, in chunks, returning roots in input order."""
+
+    # looks up each unique supervoxel once #
+    sv_ids = np.asarray(sv_ids, dtype=np.uint64)
+    unique_svs, inverse = np.unique(sv_ids, return_inverse=True)
+    unique_roots = np.zeros(len(unique_svs), dtype=np.uint64)
+    for i in range(0, len(unique_svs), chunk_size):
+        unique_roots[i : i + chunk_size] = client.chunkedgraph.get_roots(
+            unique_svs[i : i + chunk_size], timestamp=timestamp
+        )
+
+    return unique_roots[inverse]
+
+
+def connectivity_diff(
+    root_ids,
+    datastack,
+    before,
+    after=None,
+    cleft_thresh=0.0,
+    client=None,
+    snapshot=None,
+):
+    """Compare the synapses and partners of neurons between two points in time.
+
+    root_ids should be valid at the later point in time. Their earlier synapses are found through the
+    root IDs they were built from, and both ends of every earlier synapse are mapped by supervoxel to
+    the roots they belong to at the later time. Partners are therefore compared as the same objects,
+    and only synapses that are now part of the requested neurons are counted. Queries go through
+    query_synapses, so results at either time are shared with its cache.
+
+    Arguments:
+    root_ids -- the root IDs to compare, as they exist at the later time (list of int or str, will also accept a single int or str)
+    datastack -- the name of the datastack the root IDs are from (str)
+    before -- the earlier point in time, as a materialization version or a timestamp (int or datetime)
+    after -- the later point in time, as a materialization version or a timestamp, uses the latest version if None (int or datetime, default None)
+    cleft_thresh -- the cleft score below which to exclude synapses, currently only works with flywire (float, default 0.0)
+    client -- an existing CAVEclient for the datastack to reuse instead of creating a new one (CAVEclient, default None)
+    snapshot -- a local snapshot from load_synapse_snapshot, or its directory, to read synapses from at whichever of before and after is its materialization version, root IDs are still looked up with the live service (dict or str, default None)
+
+    Returns:
+    edge_diff_df -- one row per partner edge that was added, removed or changed in strength, with columns "root_id", "direction", "partner_id", "syn_count_before", "syn_count_after" and "change" (pandas DataFrame)
+    synapse_diff_df -- one row per synapse gained or lost, with columns "root_id", "direction", "synapse_id", "partner_id" and "change" (pandas DataFrame)
+    """
+
+    # converts single IDs to a list and removes duplicates #
+    if isinstance(root_ids, (int, str)):
+        root_ids = [root_ids]
+    root_index = np.array(
+        list(dict.fromkeys(int(root_id) for root_id in root_ids)), dtype=np.uint64
+    )
+
+    # sets CAVE client object using datastack name if one wasn't passed in #
+    if client is None:
+        client = CAVEclient(datastack_name=datastack)
+    if isinstance(snapshot, str):
+        snapshot = load_synapse_snapshot(snapshot)
+
+    # resolves each point in time to query arguments and a timestamp #
+    if after is None:
+        after = client.materialize.version
+
+    def resolve(point):
+        if isinstance(point, (int, np.integer)):
+            point_time = client.materialize.get_timestamp(int(point))
+            point_query = {"materialization_version": int(point)}
+            # reads synapses from the snapshot if it was taken at this version #
+            if snapshot is not None and int(point) == snapshot["meta"]["materialization_version"]:
+                point_query["snapshot"] = snapshot
+            return point_query, point_time
+        return {"timestamp": point}, point
+
+    before_query, before_time = resolve(before)
+    after_query, after_time = resolve(after)
+
+    # finds the earlier root IDs that the current roots were built from #
+    past_id_map = client.chunkedgraph.get_past_ids(
+        root_index, timestamp_past=before_time
+    )["past_id_map"]
+    past_ids = list(
+        dict.fromkeys(
+            int(past_id)
+            for root_id in root_index
+            for past_id in past_id_map.get(int(root_id), [root_id])
+        )
+    )
+
+    edge_frames = []
+    synapse_frames = []
+    for direction in ["incoming", "outgoing"]:
+        # names the root and partner sides for this direction #
+        if direction == "incoming":
+            root_side, partner_side = "post", "pre"
+        else:
+            root_side, partner_side = "pre", "post"
+        root_col_name = root_side + "_pt_root_id"
+        partner_col_name = partner_side + "_pt_root_id"
+
+        # gets synapses at both times #
+        before_df = query_synapses(
+            past_ids,
+            datastack,
+            direction=direction,
+            cleft_thresh=cleft_thresh,
+            client=client,
+            **before_query,
+        )
+        after_df = query_synapses(
+            root_index.tolist(),
+            datastack,
+            direction=direction,
+            cleft_thresh=cleft_thresh,
+            client=client,
+            **after_query,
+        )
+
+        # maps earlier synapses onto roots at the later time, keeping only those now on the requested roots #
+        before_roots = _supervoxels_to_roots(
+            client, before_df[root_side + "_pt_supervoxel_id"].to_numpy(), after_time
+        )
+        before_partners = _supervoxels_to_roots(
+            client, before_df[partner_side + "_pt_supervoxel_id"].to_numpy(), after_time
+        )
+        keep = np.isin(before_roots, root_index)
+        before_df = pd.DataFrame(
+            {
+                "id": before_df["id"].to_numpy()[keep],
+                root_col_name: before_roots[keep],
+                partner_col_name: before_partners[keep],
+            }
+        )
+
+        # finds gained and lost synapses by ID #
+        before_ids = before_df["id"].to_numpy()
+        after_ids = after_df["id"].to_numpy()
+        for change, diff_df, other_ids in [
+            ("added", after_df, before_ids),
+            ("removed", before_df, after_ids),
+        ]:
+            is_changed = ~np.isin(diff_df["id"].to_numpy(), other_ids, assume_unique=True)
+            synapse_frames.append(
+                pd.DataFrame(
+                    {
+                        "root_id": diff_df[root_col_name].to_numpy()[is_changed],
+                        "direction": direction,
+                        "synapse_id": diff_df["id"].to_numpy()[is_changed],
+                        "partner_id": diff_df[partner_col_name].to_numpy()[is_changed],
+                        "change": change,
+                    }
+                )
+            )
+
+        # counts synapses per edge at both times and encodes each edge as one integer key #
+        edge_roots = np.concatenate(
+            [before_df[root_col_name].to_numpy(), after_df[root_col_name].to_numpy()]
+        ).astype(np.uint64)
+        edge_partners = np.concatenate(
+            [before_df[partner_col_name].to_numpy(), after_df[partner_col_name].to_numpy()]
+        ).astype(np.uint64)
+        partner_codes, partner_ids = pd.factorize(edge_partners)
+        partner_ids = np.asarray(partner_ids, dtype=np.uint64)
+        n_partners = max(len(partner_ids), 1)
+        root_codes = pd.Index(root_index).get_indexer(edge_roots)
+        keys = root_codes.astype(np.int64) * n_partners + partner_codes
+        before_keys, before_counts = np.unique(keys[: len(before_df)], return_counts=True)
+        after_keys, after_counts = np.unique(keys[len(before_df) :], return_counts=True)
+
+        # compares sorted edge keys to find added, removed and changed edges #
+        added = np.setdiff1d(after_keys, before_keys, assume_unique=True)
+        removed = np.setdiff1d(before_keys, after_keys, assume_unique=True)
+        shared, before_pos, after_pos = np.intersect1d(
+            before_keys, after_keys, assume_unique=True, return_indices=True
+        )
+        changed = before_counts[before_pos] != after_counts[after_pos]
+
+        edge_keys = np.concatenate([added, removed, shared[changed]])
+        count_before = np.concatenate(
+            [
+                np.zeros(len(added), dtype=np.int64),
+                before_counts[np.searchsorted(before_keys, removed)],
+                before_counts[before_pos][changed],
+            ]
+        )
+        count_after = np.concatenate(
+            [
+                after_counts[np.searchsorted(after_keys, added)],
+                np.zeros(len(removed), dtype=np.int64),
+                after_counts[after_pos][changed],
+            ]
+        )
+        edge_frames.append(
+            pd.DataFrame(
+                {
+                    "root_id": root_index[edge_keys // n_partners],
+                    "direction": direction,
+                    "partner_id": partner_ids[edge_keys % n_partners],
+                    "syn_count_before": count_before,
+                    "syn_count_after": count_after,
+                    "change": ["added"] * len(added)
+                    + ["removed"] * len(removed)
+                    + ["changed"] * int(changed.sum()),
+                }
+            )
+        )
+
+    edge_diff_df = pd.concat(edge_frames, ignore_index=True)
+    synapse_diff_df = pd.concat(synapse_frames, ignore_index=True)
+
+    return edge_diff_df, synapse_diff_df
+
+
+def connectivity_matrix(
+    root_ids,
+    datastack,
+    cleft_thresh=0.0,
+    materialization_version=None,
+    snapshot=None,
+):
+    """Build a neuron-by-neuron synapse count matrix for a set of root IDs.
+
+    Arguments:
+    root_ids -- the root IDs to include as rows and columns (list of int or str)
+    datastack -- the name of the datastack the root IDs are from (str)
+    cleft_thresh -- the cleft score below which to exclude synapses, currently only works with flywire (float, default 0.0)
+    materialization_version -- the materialization version to query, uses the latest version if None (int, default None)
+    snapshot -- a local snapshot from load_synapse_snapshot, or its directory, to use instead of the live service (dict or str, default None)
+
+    Returns:
+    matrix -- sparse matrix where matrix[i, j] is the number of synapses from root_index[i] onto root_index[j] (scipy.sparse.csr_matrix)
+    root_index -- the root ID of each row and column, in input order with duplicates removed (numpy array of uint64)
+    """
+
+    # removes duplicate IDs while preserving order #
+    if isinstance(root_ids, (int, str)):
+        root_ids = [root_ids]
+    root_index = np.array(
+        list(dict.fromkeys(int(root_id) for root_id in root_ids)), dtype=np.uint64
+    )
+
+    # gets outgoing synapses for every root in batched queries #
+    syn_df = query_synapses(
+        root_index.tolist(),
+        datastack,
+        direction="outgoing",
+        cleft_thresh=cleft_thresh,
+        materialization_version=materialization_version,
+        snapshot=snapshot,
+    )
+
+    # maps pre and post IDs to matrix positions with a hash lookup, -1 means outside the set #
+    id_lookup = pd.Index(root_index)
+    pre_idx = id_lookup.get_indexer(syn_df["pre_pt_root_id"].to_numpy())
+    post_idx = id_lookup.get_indexer(syn_df["post_pt_root_id"].to_numpy())
+    keep = (pre_idx >= 0) & (post_idx >= 0)
+
+    # builds the matrix, summing one entry per synapse into edge weights #
+    matrix = scipy.sparse.coo_matrix(
+        (np.ones(int(keep.sum()), dtype=np.int32), (pre_idx[keep], post_idx[keep])),
+        shape=(len(root_index), len(root_index)),
+    ).tocsr()
+    matrix.sum_duplicates()
+
+    return matrix, root_index
+
+
+def connectivity_similarity(
+    root_ids,
+    datastack,
+    k=10,
+    metric="cosine",
+    direction="both",
+    cleft_thresh=0.0,
+    materialization_version=None,
+    snapshot=None,
+    block_size=1000,
+):
+    """Find the neurons with the most similar partner lists for each root ID in a set.
+
+    Each neuron is described by a sparse vector of synapse counts per partner (upstream and downstream
+    partners are kept as separate entries when direction is "both"). Similarities are computed with
+    sparse matrix products a block of rows at a time, so the full neuron-by-neuron matrix is never held
+    in memory.
+
+    Arguments:
+    root_ids -- the root IDs to compare against each other (list of int or str)
+    datastack -- the name of the datastack the root IDs are from (str)
+    k -- the number of most similar neurons to return for each root ID (int, default 10)
+    metric -- "cosine" to compare synapse-count vectors or "jaccard" to compare sets of partners (str, default "cosine")
+    direction -- "incoming", "outgoing" or "both" (str, default "both")
+    cleft_thresh -- the cleft score below which to exclude synapses, currently only works with flywire (float, default 0.0)
+    materialization_version -- the materialization version to query, uses the latest version if None (int, default None)
+    snapshot -- a local snapshot from load_synapse_snapshot, or its directory, to use instead of the live service (dict or str, default None)
+    block_size -- the number of root IDs to score at a time (int, default 1000)
+
+    Returns:
+    similar_df -- one row per root ID and similar neuron with columns "root_id", "rank", "similar_id" and "similarity", ordered by input root and rank (pandas DataFrame)
+    """
+
+    # checks arguments #
+    if metric not in ["cosine", "jaccard"]:
+        raise ValueError("metric must be 'cosine' or 'jaccard'.")
+    if direction == "both":
+        directions = ["incoming", "outgoing"]
+    elif direction in ["incoming", "outgoing"]:
+        directions = [direction]
+    else:
+        raise ValueError("direction must be 'incoming', 'outgoing' or 'both'.")
+
+    # removes duplicate IDs while preserving order #
+    if isinstance(root_ids, (int, str)):
+        root_ids = [root_ids]
+    root_index = np.array(
+        list(dict.fromkeys(int(root_id) for root_id in root_ids)), dtype=np.uint64
+    )
+    n = len(root_index)
+
+    # loads the snapshot once for both directions #
+    if isinstance(snapshot, str):
+        snapshot = load_synapse_snapshot(snapshot)
+
+    # builds one sparse root-by-partner block per direction #
+    blocks = []
+    for vector_direction in directions:
+        partner_df = get_partners(
+            root_index.tolist(),
+            datastack,
+            direction=vector_direction,
+            cleft_thresh=cleft_thresh,
+            materialization_version=materialization_version,
+            snapshot=snapshot,
+        )
+        row_idx = pd.Index(root_index).get_indexer(partner_df["root_id"].to_numpy())
+        col_idx, partners = pd.factorize(partner_df["partner_id"])
+        blocks.append(
+            scipy.sparse.csr_matrix(
+                (partner_df["syn_count"].to_numpy(np.float32), (row_idx, col_idx)),
+                shape=(n, len(partners)),
+            )
+        )
+    vectors = scipy.sparse.hstack(blocks, format="csr")
+
+    # prepares vectors so that a matrix product gives the similarity or the overlap #
+    if metric == "cosine":
+        norms = np.sqrt(np.asarray(vectors.multiply(vectors).sum(axis=1)).ravel())
+        norms[norms == 0] = 1
+        vectors = scipy.sparse.diags(1 / norms) @ vectors
+    else:
+        vectors.data[:] = 1
+        sizes = np.asarray(vectors.sum(axis=1)).ravel()
+    vectors_t = vectors.T.tocsr()
+
+    # scores roots block by block and keeps the top k of each row #
+    k = min(k, n - 1)
+    root_frames = []
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        scores = (vectors[start:stop] @ vectors_t).toarray()
+        if metric == "jaccard":
+            union = sizes[start:stop, None] + sizes[None, :] - scores
+            scores = np.divide(scores, union, out=np.zeros_like(scores), where=union > 0)
+
+        # excludes each root's match with itself #
+        scores[np.arange(stop - start), np.arange(start, stop)] = -np.inf
+
+        if k <= 0:
+            continue
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+        root_frames.append(
+            pd.DataFrame(
+                {
+                    "root_id": np.repeat(root_index[start:stop], k),
+                    "rank": np.tile(np.arange(1, k + 1, dtype=np.int16), stop - start),
+                    "similar_id": root_index[top.ravel()],
+                    "similarity": top_scores.ravel().astype(np.float32),
+                }
+            )
+        )
+
+    if len(root_frames) == 0:
+        return pd.DataFrame(columns=["root_id", "rank", "similar_id", "similarity"])
+
+    similar_df = pd.concat(root_frames, ignore_index=True)
+
+    return similar_df
+
+
+def convert_coord_res(coords, res_current=[1, 1, 1], res_desired=[1, 1, 1]):
+    """Convert coordinates between two resolutions.
+
+    Arguments:
+    coords -- x,y,z coordinates in current resolution (list of ints)
+    res_current -- current x,y,z resolution in nm/voxel, e.g. [4, 4, 40] (list of ints, default [1,1,1])
+    res_desired -- desired x,y,z resolution in nm/voxel, e.g. [16, 16, 40] (list of ints, default [1,1,1])
+
+    Returns:
+    converted_coords -- x,y,z coordinates after conversion (list of ints)
+    """
+
+    # converts coordinates using volume resolution #
+    converted_coords = [
+        int(coord / (res_des / res_cur))
+        for coord, res_cur, res_des in zip(coords, res_current, res_desired)
+    ]
+
+    return converted_coords
+
+
+def _mip_resolutions(datastack, mip_layer="segmentation"):
+    """Get the xyz resolution in nm of each mip level of a datastack's image or segmentation volume, reading each volume only once."""
+
+    if mip_layer not in ["image", "segmentation"]:
+        raise ValueError("mip_layer must be 'image' or 'segmentation'.")
+
+    if (datastack, mip_layer) not in _MIP_RESOLUTIONS:
+        client = CAVEclient(datastack_name=datastack)
+        if mip_layer == "image":
+            source = client.info.image_source()
+        else:
+            source = client.info.segmentation_source()
+        if source.startswith("graphene://https"):
+            split_url = source.split("https")
+            source = split_url[0] + "middleauth+https" + split_url[1]
+        cv = cloudvolume.CloudVolume(source, use_https=True, progress=False)
+        _MIP_RESOLUTIONS[(datastack, mip_layer)] = {
+            mip: np.asarray(cv.meta.resolution(mip), dtype=np.float64)
+            for mip in cv.meta.available_mips
+        }
 
-    # uses distance formula to calculate distance in 3D #
-    dist = ((xdist ** 2) + (ydist ** 2) + (zdist ** 2)) ** 0.5
+    return _MIP_RESOLUTIONS[(datastack, mip_layer)]
 
-    return dist
 
-def convert_coord_res(coords, res_current=[1, 1, 1], res_desired=[1, 1, 1]):
-    """Convert coordinates between two resolutions.
+def convert_coords_res(
+    coords,
+    res_current=[1, 1, 1],
+    res_desired=[1, 1, 1],
+    datastack=None,
+    mip_layer="segmentation",
+    as_int=True,
+):
+    """Convert many coordinates between two resolutions at once.
+
+    Either resolution can be given as a mip level of a datastack's volume instead of in nm/voxel. The
+    resolutions of each volume's mip levels are looked up once and reused for later conversions.
 
     Arguments:
-    coords -- x,y,z coordinates in current resolution (list of ints)
-    res_current -- current x,y,z resolution in nm/voxel, e.g. [4, 4, 40] (list of ints, default [1,1,1])
-    res_desired -- desired x,y,z resolution in nm/voxel, e.g. [16, 16, 40] (list of ints, default [1,1,1])
+    coords -- x,y,z coordinates in current resolution (numpy array of shape (N, 3) or (3,), or list of lists of ints)
+    res_current -- current x,y,z resolution in nm/voxel, e.g. [4, 4, 40], or a mip level of datastack's volume (list of ints or int, default [1,1,1])
+    res_desired -- desired x,y,z resolution in nm/voxel, e.g. [16, 16, 40], or a mip level of datastack's volume (list of ints or int, default [1,1,1])
+    datastack -- the name of the datastack whose mip levels are used, only needed when a resolution is a mip level (str, default None)
+    mip_layer -- "segmentation" or "image", the volume whose mip levels are used (str, default "segmentation")
+    as_int -- whether to drop the fraction of each converted coordinate, as convert_coord_res does (bool, default True)
 
     Returns:
-    converted_coords -- x,y,z coordinates after conversion (list of ints)
+    converted_coords -- x,y,z coordinates after conversion, in the same shape as coords (numpy array of int64, or float64 if as_int is False)
     """
 
+    # looks up the nm/voxel of any resolution given as a mip level #
+    resolutions = []
+    for res in [res_current, res_desired]:
+        if isinstance(res, (int, np.integer)):
+            if datastack is None:
+                raise ValueError("datastack is required when a resolution is given as a mip level.")
+            mip_resolutions = _mip_resolutions(datastack, mip_layer)
+            if int(res) not in mip_resolutions:
+                raise ValueError(
+                    f"mip {res} is not available, choose from {sorted(mip_resolutions)}."
+                )
+            res = mip_resolutions[int(res)]
+        resolutions.append(np.asarray(res, dtype=np.float64))
+    res_current, res_desired = resolutions
+
     # converts coordinates using volume resolution #
-    converted_coords = [
-        int(coord / (res_des / res_cur))
-        for coord, res_cur, res_des in zip(coords, res_current, res_desired)
-    ]
+    converted_coords = np.asarray(coords, dtype=np.float64) / (res_desired / res_current)
+    if as_int == True:
+        converted_coords = np.trunc(converted_coords).astype(np.int64)
 
     return converted_coords
 
@@ -437,6 +1875,605 @@ def coords_to_root(coord_list, datastack):
     return root_list
 
 
+def expand_neighborhood(
+    seed_ids,
+    datastack,
+    hops=1,
+    direction="both",
+    min_syn_count=5,
+    max_frontier=None,
+    cleft_thresh=0.0,
+    materialization_version=None,
+    snapshot=None,
+    output_path=None,
+):
+    """Expand seed neurons to their synaptic neighborhood, one hop at a time.
+
+    Each hop queries the synapses of the whole frontier in bulk, keeps partners connected by at least
+    min_syn_count synapses, and makes the partners that haven't been seen yet the next frontier.
+
+    Arguments:
+    seed_ids -- the root IDs to start from (list of int or str, will also accept a single int or str)
+    datastack -- the name of the datastack the root IDs are from (str)
+    hops -- how many hops to expand (int, default 1)
+    direction -- "outgoing" for downstream, "incoming" for upstream or "both" (str, default "both")
+    min_syn_count -- the number of synapses below which a connection is ignored (int, default 5)
+    max_frontier -- if set, only this many of the most strongly connected new roots are expanded at each hop (int, default None)
+    cleft_thresh -- the cleft score below which to exclude synapses, currently only works with flywire (float, default 0.0)
+    materialization_version -- the materialization version to query, uses the latest version if None (int, default None)
+    snapshot -- a local snapshot from load_synapse_snapshot, or its directory, to use instead of the live service (dict or str, default None)
+    output_path -- if given, edges are appended to this csv file after each hop instead of being kept in memory (str, default None)
+
+    Returns:
+    node_df -- every root reached with the hop it was first reached at, seeds are hop 0 (pandas DataFrame)
+    edge_df -- every connection found with columns "hop", "pre_pt_root_id", "post_pt_root_id" and "syn_count" (pandas DataFrame)
+    OR IF output_path is given, output_path (str) in place of edge_df
+    """
+
+    # sets which directions to follow #
+    if direction == "both":
+        directions = ["outgoing", "incoming"]
+    elif direction in ["outgoing", "incoming"]:
+        directions = [direction]
+    else:
+        raise ValueError("direction must be 'outgoing', 'incoming' or 'both'.")
+
+    # converts single IDs to a list and removes duplicates #
+    if isinstance(seed_ids, (int, str)):
+        seed_ids = [seed_ids]
+    frontier = np.array(
+        list(dict.fromkeys(int(seed_id) for seed_id in seed_ids)), dtype=np.uint64
+    )
+
+    # loads the snapshot once for every hop #
+    if isinstance(snapshot, str):
+        snapshot = load_synapse_snapshot(snapshot)
+
+    # starts a new output file #
+    if output_path is not None and os.path.exists(output_path):
+        os.remove(output_path)
+
+    visited = frontier.copy()
+    node_frames = [pd.DataFrame({"root_id": frontier, "hop": 0})]
+    edge_frames = []
+    seen_edges = pd.MultiIndex.from_arrays(
+        [np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.uint64)]
+    )
+
+    for hop in range(1, hops + 1):
+        if len(frontier) == 0:
+            break
+
+        # gets strong enough partners for the whole frontier, one bulk query per direction #
+        hop_frames = []
+        for hop_direction in directions:
+            partner_df = get_partners(
+                frontier.tolist(),
+                datastack,
+                direction=hop_direction,
+                cleft_thresh=cleft_thresh,
+                materialization_version=materialization_version,
+                snapshot=snapshot,
+            )
+            partner_df = partner_df[partner_df["syn_count"] >= min_syn_count]
+            if hop_direction == "outgoing":
+                pre_ids, post_ids = partner_df["root_id"], partner_df["partner_id"]
+            else:
+                pre_ids, post_ids = partner_df["partner_id"], partner_df["root_id"]
+            hop_frames.append(
+                pd.DataFrame(
+                    {
+                        "hop": hop,
+                        "pre_pt_root_id": pre_ids.to_numpy().astype(np.uint64),
+                        "post_pt_root_id": post_ids.to_numpy().astype(np.uint64),
+                        "syn_count": partner_df["syn_count"].to_numpy(),
+                    }
+                )
+            )
+        hop_edge_df = pd.concat(hop_frames, ignore_index=True)
+
+        # drops edges already reported, e.g. found again from the other end #
+        edge_keys = pd.MultiIndex.from_arrays(
+            [hop_edge_df["pre_pt_root_id"], hop_edge_df["post_pt_root_id"]]
+        )
+        is_new = ~edge_keys.isin(seen_edges) & ~edge_keys.duplicated()
+        hop_edge_df = hop_edge_df[is_new].reset_index(drop=True)
+        seen_edges = seen_edges.append(edge_keys[is_new])
+
+        # finds roots reached for the first time, weighted by their synapses with the frontier #
+        reached = pd.concat(
+            [
+                hop_edge_df[["pre_pt_root_id", "syn_count"]].set_axis(["root_id", "syn_count"], axis=1),
+                hop_edge_df[["post_pt_root_id", "syn_count"]].set_axis(["root_id", "syn_count"], axis=1),
+            ]
+        )
+        reached = reached[~np.isin(reached["root_id"].to_numpy(), visited)]
+        reached = reached.groupby("root_id")["syn_count"].sum().sort_values(ascending=False, kind="stable")
+
+        # caps frontier growth by keeping the most strongly connected new roots #
+        if max_frontier is not None:
+            reached = reached.iloc[:max_frontier]
+        frontier = reached.index.to_numpy().astype(np.uint64)
+        visited = np.concatenate([visited, frontier])
+        node_frames.append(pd.DataFrame({"root_id": frontier, "hop": hop}))
+
+        # streams this hop's edges to disk, or keeps them for the return value #
+        if output_path is not None:
+            hop_edge_df.to_csv(
+                output_path, mode="a", header=not os.path.exists(output_path), index=False
+            )
+        else:
+            edge_frames.append(hop_edge_df)
+
+        print(f"    Hop {hop}: {len(hop_edge_df)} edges, {len(frontier)} new roots")
+
+    node_df = pd.concat(node_frames, ignore_index=True)
+
+    if output_path is not None:
+        return node_df, output_path
+
+    if len(edge_frames) > 0:
+        edge_df = pd.concat(edge_frames, ignore_index=True)
+    else:
+        edge_df = pd.DataFrame(
+            columns=["hop", "pre_pt_root_id", "post_pt_root_id", "syn_count"]
+        )
+
+    return node_df, edge_df
+
+
+def export_bbox_annotations(centers, dims, datastack, output_dir, clip_to_volume=True):
+    """Write bounding boxes centered on many coordinates as neuroglancer precomputed box annotations.
+
+    Once output_dir is hosted somewhere neuroglancer can read, e.g. a cloud bucket or a local http server,
+    pass its url to build_bbox_links as annotation_source to make links that read the boxes from it.
+    Box IDs are the positions of their centers in the input.
+
+    Arguments:
+    centers -- xyz coords for the center of each box in viewer resolution (numpy array of shape (N, 3) or list of lists of ints)
+    dims -- xyz dimensions of the boxes in viewer resolution voxels, either one set for all boxes or one per box (list of ints or numpy array of shape (N, 3))
+    datastack -- the name of the datastack the coordinates are from (str)
+    output_dir -- the directory to write the annotations to (str)
+    clip_to_volume -- whether to clip boxes to the bounds of the segmentation volume (bool, default True)
+
+    Returns:
+    corners -- the min and max corner of each box written (numpy array of int64 with shape (N, 2, 3))
+    """
+
+    # sets CAVE client and gets viewer resolution, which annotation coordinates are written in #
+    client = CAVEclient(datastack_name=datastack)
+    stack_info = client.info.get_datastack_info()
+    viewer_res = [
+        stack_info["viewer_resolution_x"],
+        stack_info["viewer_resolution_y"],
+        stack_info["viewer_resolution_z"],
+    ]
+
+    bounds = _volume_bounds(stack_info, viewer_res) if clip_to_volume == True else None
+    corners = bbox_corners_from_centers(centers, dims, bounds=bounds)
+
+    _write_precomputed_annotations(
+        output_dir,
+        corners[:, 0],
+        corners[:, 1],
+        np.arange(len(corners)),
+        viewer_res,
+        annotation_type="AXIS_ALIGNED_BOUNDING_BOX",
+    )
+    print(f"    Wrote {len(corners)} boxes to {output_dir}")
+
+    return corners
+
+
+def export_segment_properties(
+    root_ids,
+    datastack,
+    output_dir,
+    labels=None,
+    metrics=["synapse_counts", "nt", "freshness"],
+    cleft_thresh=0.0,
+    materialization_version=None,
+    snapshot=None,
+):
+    """Write labels and summary data for many root IDs as a neuroglancer segment properties source.
+
+    Synapse counts become numeric properties, and the neurotransmitter and whether the ID is outdated
+    become tags, so segments can be searched and sorted in neuroglancer's segment list. Once output_dir
+    is hosted somewhere neuroglancer can read, pass its url to build_ng_link as segment_properties_source.
+
+    Arguments:
+    root_ids -- the root IDs to describe (list of int or str, will also accept a single int or str)
+    datastack -- the name of the datastack the root IDs are from (str)
+    output_dir -- the directory to write the segment properties info file to (str)
+    labels -- a label for each root ID, in the same order as root_ids, root IDs past the end of the list get an empty label (list of str, default None)
+    metrics -- which of "synapse_counts", "nt" and "freshness" to include, as computed by get_neuron_summary (list of str, default all three)
+    cleft_thresh -- the cleft score below which to exclude synapses, currently only works with flywire (float, default 0.0)
+    materialization_version -- the materialization version to pull synapses from, uses the latest version if None (int, default None)
+    snapshot -- a local snapshot from load_synapse_snapshot, or its directory, to use for synapses instead of the live service (dict or str, default None)
+
+    Returns:
+    info_path -- the path of the info file written (str)
+    """
+
+    # converts single IDs to a list and removes duplicates, keeping the first label for each #
+    if isinstance(root_ids, (int, str)):
+        root_ids = [root_ids]
+    root_ids = [int(root_id) for root_id in root_ids]
+    if labels is not None:
+        labels = dict(reversed(list(zip(root_ids, labels))))
+    root_ids = list(dict.fromkeys(root_ids))
+    if len(root_ids) == 0:
+        raise ValueError("root_ids must contain at least one root ID.")
+
+    # gets every requested value for all root IDs at once #
+    summary_df = get_neuron_summary(
+        root_ids,
+        datastack,
+        metrics=metrics,
+        cleft_thresh=cleft_thresh,
+        materialization_version=materialization_version,
+        snapshot=snapshot,
+    )
+
+    properties = []
+    if labels is not None:
+        properties.append(
+            {
+                "id": "label",
+                "type": "label",
+                "values": [str(labels.get(root_id, "")) for root_id in root_ids],
+            }
+        )
+    for col_name in ["incoming", "outgoing", "total"]:
+        if col_name in summary_df.columns:
+            properties.append(
+                {
+                    "id": col_name + "_synapses",
+                    "type": "number",
+                    "data_type": "uint32",
+                    "values": summary_df[col_name].fillna(0).astype(np.uint32).tolist(),
+                }
+            )
+
+    # turns the neurotransmitter and outdated flag into tag indices for each root #
+    tag_columns = []
+    if "nt" in summary_df.columns:
+        tag_columns.append(summary_df["nt"].fillna("").to_numpy(dtype=object))
+    if "is_latest" in summary_df.columns:
+        tag_columns.append(np.where(summary_df["is_latest"], "", "outdated").astype(object))
+    if len(tag_columns) > 0:
+        tag_table = np.column_stack(tag_columns)
+        tag_names, tag_codes = np.unique(tag_table.astype(str), return_inverse=True)
+        tag_codes = tag_codes.reshape(tag_table.shape)
+        # empty tags sort first, so dropping them shifts the other codes down by one #
+        tags = [tag_name for tag_name in tag_names.tolist() if tag_name != ""]
+        tag_codes = tag_codes - (len(tag_names) > 0 and tag_names[0] == "")
+        properties.append(
+            {
+                "id": "tags",
+                "type": "tags",
+                "tags": tags,
+                "values": [
+                    [code for code in row if code >= 0] for row in tag_codes.tolist()
+                ],
+            }
+        )
+
+    info = {
+        "@type": "neuroglancer_segment_properties",
+        "inline": {
+            "ids": [str(root_id) for root_id in root_ids],
+            "properties": properties,
+        },
+    }
+
+    os.makedirs(output_dir, exist_ok=True)
+    info_path = os.path.join(output_dir, "info")
+    with open(info_path, "w") as f:
+        json.dump(info, f)
+
+    return info_path
+
+
+def _write_precomputed_annotations(
+    path,
+    point_a,
+    point_b,
+    annotation_ids,
+    resolution,
+    annotation_type="LINE",
+    relationships=None,
+    scores=None,
+    chunk_limit=1000,
+    max_levels=8,
+):
+    """Write line or bounding box annotations as a neuroglancer precomputed annotation directory.
+
+    Annotations are written by ID, by their related segment IDs, and into a multi-level spatial
+    index. Each spatial level holds a random sample of up to chunk_limit annotations per chunk, and
+    the remainder is pushed down to the next, twice as fine, level, so the viewer can show an even
+    overview first and fill in detail as it loads.
+
+    Arguments:
+    path -- the directory to write to (str)
+    point_a -- the start point of each line, or the min corner of each box, in resolution units (numpy array of shape (N, 3))
+    point_b -- the end point of each line, or the max corner of each box, in resolution units (numpy array of shape (N, 3))
+    annotation_ids -- a unique ID for each annotation (numpy array of uint64)
+    resolution -- the xyz size of one coordinate unit in nm (list of ints)
+    annotation_type -- "LINE" or "AXIS_ALIGNED_BOUNDING_BOX" (str, default "LINE")
+    relationships -- the segment ID related to each annotation, keyed by relationship name, e.g. "pre_segment" (dict of numpy arrays of uint64, default None)
+    scores -- an optional cleft score to store with each annotation (numpy array, default None)
+    chunk_limit -- the most annotations in one spatial chunk before the rest are moved to a finer level (int, default 1000)
+    max_levels -- the most spatial index levels to write, the last level holds everything left over (int, default 8)
+    """
+
+    if annotation_type not in ["LINE", "AXIS_ALIGNED_BOUNDING_BOX"]:
+        raise ValueError("annotation_type must be 'LINE' or 'AXIS_ALIGNED_BOUNDING_BOX'.")
+    point_a = np.asarray(point_a, dtype=np.float32).reshape(-1, 3)
+    point_b = np.asarray(point_b, dtype=np.float32).reshape(-1, 3)
+    annotation_ids = np.asarray(annotation_ids, dtype=np.uint64)
+    if relationships is None:
+        relationships = {}
+    relationships = {
+        name: np.asarray(segment_ids, dtype=np.uint64) for name, segment_ids in relationships.items()
+    }
+
+    # packs the geometry and properties of every annotation into one little-endian record #
+    # lines and boxes are both stored as two points #
+    fields = [("point_a", "<f4", (3,)), ("point_b", "<f4", (3,))]
+    properties = []
+    if scores is not None:
+        fields.append(("cleft_score", "<f4"))
+        properties.append({"id": "cleft_score", "type": "float32"})
+    records = np.zeros(len(annotation_ids), dtype=np.dtype(fields))
+    records["point_a"] = point_a
+    records["point_b"] = point_b
+    if scores is not None:
+        records["cleft_score"] = scores
+
+    def write_multiple(file_path, rows):
+        # writes the count, then each annotation's record, then each annotation's ID #
+        with open(file_path, "wb") as f:
+            f.write(np.uint64(len(rows)).astype("<u8").tobytes())
+            f.write(records[rows].tobytes())
+            f.write(annotation_ids[rows].astype("<u8").tobytes())
+
+    def write_grouped(dir_path, rows, keys, file_names):
+        # writes one file per distinct key, holding every annotation with that key #
+        os.makedirs(dir_path, exist_ok=True)
+        order = np.argsort(keys, kind="stable")
+        unique_keys, starts = np.unique(keys[order], return_index=True)
+        ends = np.append(starts[1:], len(order))
+        for key, start, end in zip(unique_keys, starts, ends):
+            write_multiple(os.path.join(dir_path, file_names(key)), rows[order[start:end]])
+
+    os.makedirs(path, exist_ok=True)
+
+    # writes each annotation by ID, followed by one segment for each relationship #
+    by_id_fields = [("record", records.dtype)]
+    for name in relationships:
+        by_id_fields += [(name + "_count", "<u4"), (name + "_id", "<u8")]
+    by_id_records = np.zeros(len(annotation_ids), dtype=np.dtype(by_id_fields))
+    by_id_records["record"] = records
+    for name, segment_ids in relationships.items():
+        by_id_records[name + "_count"] = 1
+        by_id_records[name + "_id"] = segment_ids
+    os.makedirs(os.path.join(path, "by_id"), exist_ok=True)
+    for annotation_id, by_id_record in zip(annotation_ids.tolist(), by_id_records):
+        with open(os.path.join(path, "by_id", str(annotation_id)), "wb") as f:
+            f.write(by_id_record.tobytes())
+
+    # writes the annotations related to each segment #
+    all_rows = np.arange(len(annotation_ids))
+    for name, segment_ids in relationships.items():
+        write_grouped(os.path.join(path, "rel_" + name), all_rows, segment_ids, str)
+
+    # sets the bounds of the spatial index #
+    all_coords = np.vstack([point_a, point_b])
+    if len(all_coords) > 0:
+        lower_bound = np.floor(all_coords.min(axis=0))
+        upper_bound = np.floor(all_coords.max(axis=0)) + 1
+    else:
+        lower_bound = np.zeros(3)
+        upper_bound = np.ones(3)
+
+    # fills levels from coarse to fine, keeping a random sample of each chunk at each level #
+    # annotations are placed in the chunk holding their first point #
+    remaining = np.random.default_rng(0).permutation(len(annotation_ids))
+    spatial = []
+    for level in range(max_levels):
+        grid_shape = np.array([2**level] * 3)
+        chunk_size = (upper_bound - lower_bound) / grid_shape
+        cells = np.floor((point_a[remaining] - lower_bound) / chunk_size).astype(np.int64)
+        cells = np.clip(cells, 0, grid_shape - 1)
+        cell_keys = np.ravel_multi_index(tuple(cells.T), tuple(grid_shape))
+
+        # ranks annotations within their chunk, keeping the first chunk_limit unless this is the last level #
+        order = np.argsort(cell_keys, kind="stable")
+        sorted_keys = cell_keys[order]
+        group_starts = np.searchsorted(sorted_keys, sorted_keys, side="left")
+        ranks = np.empty(len(order), dtype=np.int64)
+        ranks[order] = np.arange(len(order)) - group_starts
+        last_level = level == max_levels - 1 or len(remaining) == 0 or ranks.max() < chunk_limit
+        keep = np.ones(len(remaining), dtype=bool) if last_level else ranks < chunk_limit
+
+        key = "spatial" + str(level)
+        kept = remaining[keep]
+        write_grouped(
+            os.path.join(path, key),
+            kept,
+            cell_keys[keep],
+            lambda cell_key: "_".join(str(i) for i in np.unravel_index(cell_key, tuple(grid_shape))),
+        )
+        spatial.append(
+            {
+                "key": key,
+                "grid_shape": grid_shape.tolist(),
+                "chunk_size": chunk_size.tolist(),
+                "limit": int(np.bincount(cell_keys[keep]).max()) if len(kept) > 0 else 1,
+            }
+        )
+        remaining = remaining[~keep]
+        if len(remaining) == 0:
+            break
+
+    info = {
+        "@type": "neuroglancer_annotations_v1",
+        "dimensions": {
+            axis: [float(res) * 1e-9, "m"] for axis, res in zip(["x", "y", "z"], resolution)
+        },
+        "lower_bound": lower_bound.tolist(),
+        "upper_bound": upper_bound.tolist(),
+        "annotation_type": annotation_type,
+        "properties": properties,
+        "relationships": [{"id": name, "key": "rel_" + name} for name in relationships],
+        "by_id": {"key": "by_id"},
+        "spatial": spatial,
+    }
+    with open(os.path.join(path, "info"), "w") as f:
+        json.dump(info, f)
+
+
+def export_synapse_annotations(
+    root_ids,
+    datastack,
+    output_dir,
+    incoming=True,
+    outgoing=True,
+    cleft_thresh=0.0,
+    materialization_version=None,
+    snapshot=None,
+):
+    """Write the synapses of one or more root IDs as neuroglancer precomputed line annotations.
+
+    One annotation directory is written per direction. Once output_dir is hosted somewhere neuroglancer
+    can read, e.g. a cloud bucket or a local http server, pass its url to build_ng_link as
+    annotation_source to show the synapses without putting them in the state.
+
+    Arguments:
+    root_ids -- the root IDs to export synapses for (list of int or str, will also accept a single int or str)
+    datastack -- the name of the datastack the root IDs are from (str)
+    output_dir -- the directory to write the "incoming" and "outgoing" annotation directories to (str)
+    incoming -- whether to export incoming synapses (bool, default True)
+    outgoing -- whether to export outgoing synapses (bool, default True)
+    cleft_thresh -- the cleft score below which to exclude synapses, currently only works with flywire (float, default 0.0)
+    materialization_version -- the materialization version to pull synapses from, uses the latest version if None (int, default None)
+    snapshot -- a local snapshot from load_synapse_snapshot, or its directory, to use instead of the live service (dict or str, default None)
+
+    Returns:
+    paths -- the annotation directory written for each direction (dict)
+    """
+
+    # converts single IDs to a list #
+    if isinstance(root_ids, (int, str)):
+        root_ids = [root_ids]
+    root_ids = [int(root_id) for root_id in root_ids]
+
+    # sets CAVE client and gets viewer resolution, which annotation coordinates are written in #
+    client = CAVEclient(datastack_name=datastack)
+    stack_info = client.info.get_datastack_info()
+    viewer_res = [
+        stack_info["viewer_resolution_x"],
+        stack_info["viewer_resolution_y"],
+        stack_info["viewer_resolution_z"],
+    ]
+    if isinstance(snapshot, str):
+        snapshot = load_synapse_snapshot(snapshot)
+
+    paths = {}
+    for direction in _ng_syn_directions(incoming, outgoing):
+        syn_df = query_synapses(
+            root_ids,
+            datastack,
+            direction=direction,
+            cleft_thresh=cleft_thresh,
+            materialization_version=materialization_version,
+            client=client,
+            snapshot=snapshot,
+        )
+        paths[direction] = os.path.join(output_dir, direction)
+        _write_precomputed_annotations(
+            paths[direction],
+            synapse_positions(syn_df, "pre", viewer_res),
+            synapse_positions(syn_df, "post", viewer_res),
+            syn_df["id"].to_numpy() if "id" in syn_df.columns else np.arange(len(syn_df)),
+            viewer_res,
+            relationships={
+                "pre_segment": syn_df["pre_pt_root_id"].to_numpy(),
+                "post_segment": syn_df["post_pt_root_id"].to_numpy(),
+            },
+            scores=syn_df["cleft_score"].to_numpy() if "cleft_score" in syn_df.columns else None,
+        )
+        print(f"    Wrote {len(syn_df)} {direction} synapses to {paths[direction]}")
+
+    return paths
+
+
+def find_nearest_points(query_coords, coords, k=1, xyz_resolution=[1, 1, 1], max_distance=None):
+    """Find the k nearest points to each of many query points.
+
+    Arguments:
+    query_coords -- xyz coordinates of the points to find neighbors for (numpy array of shape (N, 3) or list of lists of ints)
+    coords -- xyz coordinates of the points to search, or a tree of them from build_point_tree to reuse (numpy array of shape (M, 3), list of lists of ints or scipy.spatial.cKDTree)
+    k -- the number of nearest points to find for each query point (int, default 1)
+    xyz_resolution -- the nanometers per voxel in the x, y, and z directions of query_coords and coords (list of ints, default [1, 1, 1])
+    max_distance -- if given, points further than this many nanometers away are not returned (float, default None)
+
+    Returns:
+    dists -- the distance in nanometers to each nearest point, closest first, inf where fewer than k points were found (numpy array of shape (N,) if k is 1, otherwise (N, k))
+    indices -- the row in coords of each nearest point, -1 where fewer than k points were found (numpy array of shape (N,) if k is 1, otherwise (N, k))
+    """
+
+    tree = coords if isinstance(coords, scipy.spatial.cKDTree) else build_point_tree(coords, xyz_resolution)
+    query_nm = np.asarray(query_coords, dtype=np.float64).reshape(-1, 3) * np.asarray(
+        xyz_resolution, dtype=np.float64
+    )
+
+    dists, indices = tree.query(
+        query_nm,
+        k=k,
+        distance_upper_bound=np.inf if max_distance is None else max_distance,
+    )
+
+    # marks missing neighbors, which the tree reports as one past its last point #
+    indices = np.where(indices >= tree.n, -1, indices)
+
+    return dists, indices
+
+
+def find_points_in_radius(query_coords, coords, radius, xyz_resolution=[1, 1, 1]):
+    """Find every point within a radius of each of many query points.
+
+    Arguments:
+    query_coords -- xyz coordinates of the points to search around (numpy array of shape (N, 3) or list of lists of ints)
+    coords -- xyz coordinates of the points to search, or a tree of them from build_point_tree to reuse (numpy array of shape (M, 3), list of lists of ints or scipy.spatial.cKDTree)
+    radius -- the search radius in nanometers (float)
+    xyz_resolution -- the nanometers per voxel in the x, y, and z directions of query_coords and coords (list of ints, default [1, 1, 1])
+
+    Returns:
+    match_df -- one row per query point and point within radius of it with columns "query_index" (row in query_coords), "point_index" (row in coords) and "distance_nm", sorted by query_index then distance (pandas DataFrame)
+    """
+
+    tree = coords if isinstance(coords, scipy.spatial.cKDTree) else build_point_tree(coords, xyz_resolution)
+    query_tree = build_point_tree(query_coords, xyz_resolution)
+
+    # compares the two trees once instead of searching around each query point separately #
+    matches = query_tree.sparse_distance_matrix(tree, radius, output_type="ndarray")
+
+    match_df = pd.DataFrame(
+        {
+            "query_index": matches["i"].astype(np.int64),
+            "point_index": matches["j"].astype(np.int64),
+            "distance_nm": matches["v"],
+        }
+    )
+    match_df = match_df.sort_values(
+        ["query_index", "distance_nm", "point_index"], kind="stable", ignore_index=True
+    )
+
+    return match_df
+
+
 def generate_color_list(number_of_colors, alternate_brightness=0.0):
     """Generate a list of hex values for coloring neurons as differently as possible based on the number of neurons.
 
@@ -575,29 +2612,458 @@ def generate_color_list(number_of_colors, alternate_brightness=0.0):
             for color in rgb_colors
         ]
 
-    # raises error when users input negative numbers or non-integers #
-    else:
-        raise ValueError("number_of_colors must be a positive integer.")
+    # raises error when users input negative numbers or non-integers #
+    else:
+        raise ValueError("number_of_colors must be a positive integer.")
+
+    return colors
+
+
+def _hex_to_lab(hex_colors):
+    """Convert hex colors to CIELAB, where the distance between two colors tracks how different they look."""
+
+    rgb = (
+        np.array(
+            [[int(hex_color[i : i + 2], 16) for i in (1, 3, 5)] for hex_color in hex_colors],
+            dtype=np.float64,
+        ).reshape(-1, 3)
+        / 255
+    )
+
+    # converts sRGB to linear light, then to XYZ relative to a D65 white point #
+    rgb = np.where(rgb <= 0.04045, rgb / 12.92, ((rgb + 0.055) / 1.055) ** 2.4)
+    xyz = rgb @ np.array(
+        [
+            [0.4124, 0.3576, 0.1805],
+            [0.2126, 0.7152, 0.0722],
+            [0.0193, 0.1192, 0.9505],
+        ]
+    ).T
+    xyz = xyz / np.array([0.95047, 1.0, 1.08883])
+
+    f = np.where(xyz > (6 / 29) ** 3, np.cbrt(xyz), xyz / (3 * (6 / 29) ** 2) + 4 / 29)
+    lab = np.stack([116 * f[:, 1] - 16, 500 * (f[:, 0] - f[:, 1]), 200 * (f[:, 1] - f[:, 2])], axis=1)
+
+    return lab
+
+
+def generate_spatial_color_list(
+    coords, xyz_resolution=[1, 1, 1], n_neighbors=8, max_distance=None, palette=None, seed=0
+):
+    """Generate a hex color for each segment so that segments close together in space look as different as possible.
+
+    Segments are linked to their nearest neighbors by their representative coordinates, then colored
+    greedily in rounds: in each round every segment that outranks its uncolored neighbors takes the
+    palette color that differs most, by perceived color distance, from the colors of its colored
+    neighbors. Each round is one set of array operations, so thousands of segments are colored in a
+    fraction of a second.
+
+    Arguments:
+    coords -- a representative xyz coord for each segment, rows with missing values are colored without neighbors (numpy array of shape (N, 3) or list of lists of numbers)
+    xyz_resolution -- the xyz resolution of coords in nm (list of ints, default [1, 1, 1])
+    n_neighbors -- the number of nearest segments each segment must contrast with (int, default 8)
+    max_distance -- if given, neighbors further than this many nm apart are ignored (float, default None)
+    palette -- the hex values to choose from, uses generate_color_list(20, alternate_brightness=0.3) if None (list of str, default None)
+    seed -- the seed for the random order segments are colored in (int, default 0)
+
+    Returns:
+    colors -- a hex value for each segment, in the same order as coords (list of str)
+    """
+
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 3) * np.asarray(
+        xyz_resolution, dtype=np.float64
+    )
+    n = len(coords)
+    if palette is None:
+        palette = generate_color_list(20, alternate_brightness=0.3)
+    palette = list(palette)
+    if len(palette) == 0:
+        raise ValueError("palette must contain at least one color.")
+    n_colors = len(palette)
+
+    # measures how different every pair of palette colors looks #
+    lab = _hex_to_lab(palette)
+    palette_dist = np.linalg.norm(lab[:, None] - lab[None, :], axis=2)
+
+    # links each segment with coordinates to its nearest neighbors, in both directions #
+    located = np.flatnonzero(np.isfinite(coords).all(axis=1))
+    k = min(n_neighbors, len(located) - 1)
+    if k > 0:
+        tree = scipy.spatial.cKDTree(coords[located])
+        _, neighbors = tree.query(
+            coords[located],
+            k=k + 1,
+            distance_upper_bound=np.inf if max_distance is None else max_distance,
+        )
+        sources = np.repeat(np.arange(len(located)), k + 1)
+        targets = neighbors.ravel()
+        # drops missing neighbors beyond max_distance and each segment's match with itself #
+        valid = (targets < len(located)) & (targets != sources)
+        sources = located[sources[valid]]
+        targets = located[targets[valid]]
+        # sorts edges by source and drops the copies of mutual neighbors #
+        edge_keys = np.sort(np.concatenate([sources * n + targets, targets * n + sources]))
+        is_first = np.ones(len(edge_keys), dtype=bool)
+        is_first[1:] = edge_keys[1:] != edge_keys[:-1]
+        edge_keys = edge_keys[is_first]
+        edges_a, edges_b = edge_keys // n, edge_keys % n
+    else:
+        edges_a = edges_b = np.empty(0, dtype=np.int64)
+
+    # colors segments in rounds, each round coloring segments that outrank all their uncolored neighbors #
+    priority = np.random.default_rng(seed).permutation(n)
+    colors = np.full(n, -1, dtype=np.int64)
+    # rotates the preferred color between segments so segments without colored neighbors use the whole palette #
+    tie_break = ((np.arange(n_colors)[None, :] - np.arange(n_colors)[:, None]) % n_colors) * 1e-6
+    no_neighbor_score = palette_dist.max() + 1
+    b_outranks = priority[edges_b] > priority[edges_a]
+    while (colors < 0).any():
+        uncolored = colors < 0
+
+        # drops edges of colored segments, which keeps the edges sorted by source #
+        open_edges = uncolored[edges_a]
+        edges_a, edges_b, b_outranks = edges_a[open_edges], edges_b[open_edges], b_outranks[open_edges]
+        b_uncolored = uncolored[edges_b]
+
+        ready = uncolored.copy()
+        ready[edges_a[b_uncolored & b_outranks]] = False
+        ready_ids = np.flatnonzero(ready)
+
+        # scores each palette color by its distance to the closest color among colored neighbors #
+        scores = np.full((len(ready_ids), n_colors), no_neighbor_score)
+        colored_edges = ready[edges_a] & ~b_uncolored
+        edge_sources = edges_a[colored_edges]
+        if len(edge_sources) > 0:
+            # edges are sorted by source, so each ready segment's colored neighbors are one run #
+            run_sources, run_starts = np.unique(edge_sources, return_index=True)
+            scores[np.searchsorted(ready_ids, run_sources)] = np.minimum.reduceat(
+                palette_dist[colors[edges_b[colored_edges]]], run_starts, axis=0
+            )
+        colors[ready_ids] = np.argmax(scores - tie_break[ready_ids % n_colors], axis=1)
+
+    color_list = [palette[color] for color in colors.tolist()]
+
+    return color_list
+
+
+def get_all_stacks():
+    """Get a list of all the currently-documented CAVE datastack names.
+
+    Returns:
+    stacks -- a list of all the current datastack names (list of str)"""
+
+    # sets generic cave client #
+    client = CAVEclient()
+
+    # pulls list of all currently-documented datastacks #
+    stacks = client.info.get_datastacks()
+
+    return stacks
+
+
+def get_edge_weights(
+    pre_ids,
+    post_ids,
+    datastack,
+    cleft_thresh=0.0,
+    materialization_version=None,
+    snapshot=None,
+):
+    """Get the number of synapses for arbitrary pairs of presynaptic and postsynaptic root IDs.
+
+    Synapses are fetched from whichever side of the pairs has fewer unique IDs, counted per edge,
+    and matched to the requested pairs with a hash join.
+
+    Arguments:
+    pre_ids -- the presynaptic root ID of each pair (list of int or str)
+    post_ids -- the postsynaptic root ID of each pair, same length as pre_ids (list of int or str)
+    datastack -- the name of the datastack the root IDs are from (str)
+    cleft_thresh -- the cleft score below which to exclude synapses, currently only works with flywire (float, default 0.0)
+    materialization_version -- the materialization version to query, uses the latest version if None (int, default None)
+    snapshot -- a local snapshot from load_synapse_snapshot, or its directory, to use instead of the live service (dict or str, default None)
+
+    Returns:
+    weights -- the synapse count for each pair, 0 where the pair isn't connected (numpy array of int)
+    """
+
+    # rejects pair lists of different lengths #
+    if len(pre_ids) != len(post_ids):
+        raise ValueError("pre_ids and post_ids must be the same length.")
+
+    # makes table of requested pairs #
+    pair_df = pd.DataFrame(
+        {
+            "pre_pt_root_id": np.array([int(x) for x in pre_ids], dtype=np.uint64),
+            "post_pt_root_id": np.array([int(x) for x in post_ids], dtype=np.uint64),
+        }
+    )
+
+    # queries from the side with fewer unique roots #
+    unique_pre = pair_df["pre_pt_root_id"].unique()
+    unique_post = pair_df["post_pt_root_id"].unique()
+    if len(unique_pre) <= len(unique_post):
+        query_ids, direction = unique_pre, "outgoing"
+        other_col_name, other_ids = "post_pt_root_id", unique_post
+    else:
+        query_ids, direction = unique_post, "incoming"
+        other_col_name, other_ids = "pre_pt_root_id", unique_pre
+
+    syn_df = query_synapses(
+        query_ids.tolist(),
+        datastack,
+        direction=direction,
+        cleft_thresh=cleft_thresh,
+        materialization_version=materialization_version,
+        snapshot=snapshot,
+    )
+
+    # counts synapses per edge, keeping only edges that touch the other side's roots #
+    syn_df = syn_df[syn_df[other_col_name].isin(other_ids)]
+    edge_df = (
+        syn_df.groupby(["pre_pt_root_id", "post_pt_root_id"])
+        .size()
+        .reset_index(name="syn_count")
+    )
+
+    # joins edge counts onto the requested pairs #
+    weights = (
+        pair_df.merge(edge_df, on=["pre_pt_root_id", "post_pt_root_id"], how="left")[
+            "syn_count"
+        ]
+        .fillna(0)
+        .to_numpy()
+        .astype(np.int64)
+    )
+
+    return weights
+
+
+def _get_l2_data(client, l2_ids, attributes, chunk_size=1000, max_workers=4):
+    """Fetch l2cache attributes for many L2 IDs in concurrent chunks, returning one dict keyed by L2 ID string."""
+
+    l2_ids = [int(l2_id) for l2_id in l2_ids]
+    chunks = [l2_ids[i : i + chunk_size] for i in range(0, len(l2_ids), chunk_size)]
+
+    def fetch_chunk(chunk):
+        try:
+            return client.l2cache.get_l2data(chunk, attributes=attributes)
+        except Exception as e:
+            print(f"    Warning: Could not fetch {len(chunk)} L2 IDs: {e}")
+            return {}
+
+    l2_data = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for chunk_data in executor.map(fetch_chunk, chunks):
+            l2_data.update(chunk_data)
+
+    return l2_data
+
+
+def get_neuron_summary(
+    root_ids,
+    datastack,
+    metrics=["coords", "volume", "synapse_counts", "nt", "freshness", "link"],
+    cleft_thresh=0.0,
+    materialization_version=None,
+    snapshot=None,
+    client=None,
+):
+    """Get any combination of coordinates, volume, synapse counts, neurotransmitter, freshness and a link for many root IDs.
+
+    Every metric shares one client, and each underlying lookup is made only once for all root IDs:
+    the L2 lists are fetched once for coordinates, volume and freshness, synapses are fetched once
+    per direction for synapse counts and neurotransmitters, and links are built in one batch.
+
+    Arguments:
+    root_ids -- the root IDs to summarize (list of int or str, will also accept a single int or str)
+    datastack -- the name of the datastack the root IDs are from (str)
+    metrics -- which metrics to include, any of "coords", "volume", "synapse_counts", "nt", "freshness" and "link" (list of str, default all)
+    cleft_thresh -- the cleft score below which to exclude synapses, currently only works with flywire (float, default 0.0)
+    materialization_version -- the materialization version to pull synapses from, uses the latest version if None (int, default None)
+    snapshot -- a local snapshot from load_synapse_snapshot, or its directory, to use for synapses instead of the live service (dict or str, default None)
+    client -- an existing CAVEclient for the datastack to reuse instead of creating a new one (CAVEclient, default None)
+
+    Returns:
+    summary_df -- one row per root ID in input order, with a "root_id" column and, depending on metrics, "x", "y", "z" (viewer resolution), "volume_um3", "incoming", "outgoing", "total", "nt", "is_latest", "current_root_id" and "link" columns (pandas DataFrame)
+    """
 
-    return colors
+    # checks requested metrics #
+    all_metrics = ["coords", "volume", "synapse_counts", "nt", "freshness", "link"]
+    unknown_metrics = [metric for metric in metrics if metric not in all_metrics]
+    if len(unknown_metrics) > 0:
+        raise ValueError(f"Unknown metrics {unknown_metrics}, choose from {all_metrics}.")
 
+    # converts single IDs to a list and removes duplicates #
+    if isinstance(root_ids, (int, str)):
+        root_ids = [root_ids]
+    root_ids = [int(root_id) for root_id in root_ids]
+    root_index = np.array(list(dict.fromkeys(root_ids)), dtype=np.uint64)
+    summary_df = pd.DataFrame({"root_id": root_index})
 
-def get_all_stacks():
-    """Get a list of all the currently-documented CAVE datastack names.
+    # sets one CAVE client, unless one was passed in, and its metadata for every metric #
+    if client is None:
+        client = CAVEclient(datastack_name=datastack)
+    stack_info = client.info.get_datastack_info()
+    viewer_res = np.array(
+        [
+            stack_info["viewer_resolution_x"],
+            stack_info["viewer_resolution_y"],
+            stack_info["viewer_resolution_z"],
+        ]
+    )
 
-    Returns:
-    stacks -- a list of all the current datastack names (list of str)"""
+    # fetches the L2 lists once for coordinates, volume and freshness #
+    root_to_l2s = {}
+    if any(metric in metrics for metric in ["coords", "volume", "freshness"]):
+        print(f"  Fetching L2 IDs for {len(root_index)} roots...")
+        for i in range(0, len(root_index), 100):
+            try:
+                leaves = client.chunkedgraph.get_leaves_many(
+                    root_index[i : i + 100].tolist(), stop_layer=2
+                )
+                root_to_l2s.update(
+                    {
+                        int(root_id): np.asarray(l2_ids, dtype=np.uint64)
+                        for root_id, l2_ids in leaves.items()
+                    }
+                )
+            except Exception as e:
+                print(f"    Warning: Could not get L2s for roots {i}-{i + 100}: {e}")
+    first_l2s = [
+        int(root_to_l2s[root_id][0]) if len(root_to_l2s.get(root_id, [])) > 0 else None
+        for root_id in root_index.tolist()
+    ]
 
-    # sets generic cave client #
-    client = CAVEclient()
+    # fetches l2cache data once, for every L2 if volume is needed or just one per root for coordinates #
+    if "coords" in metrics or "volume" in metrics:
+        attributes = []
+        if "coords" in metrics:
+            attributes.append("rep_coord_nm")
+        if "volume" in metrics:
+            attributes.append("size_nm3")
+            # lists every root's L2 IDs in root order so each can be traced back to its root #
+            l2_lists = [
+                root_to_l2s.get(root_id, np.empty(0, dtype=np.uint64))
+                for root_id in root_index.tolist()
+            ]
+            l2_ids = np.concatenate([np.empty(0, dtype=np.uint64)] + l2_lists)
+        else:
+            l2_ids = [l2_id for l2_id in first_l2s if l2_id is not None]
+        print(f"  Fetching l2cache data for {len(l2_ids)} L2 IDs...")
+        l2_data = _get_l2_data(client, l2_ids, attributes)
+
+        if "coords" in metrics:
+            coords = np.array(
+                [
+                    l2_data.get(str(l2_id), {}).get("rep_coord_nm", [np.nan] * 3)
+                    for l2_id in first_l2s
+                ],
+                dtype=np.float64,
+            ).reshape(-1, 3)
+            coords = np.floor(coords / viewer_res)
+            for axis, axis_coords in zip(["x", "y", "z"], coords.T):
+                summary_df[axis] = pd.array(axis_coords, dtype="Int64")
+
+        if "volume" in metrics:
+            # sums the size of every L2 ID per root in one groupby, L2 IDs missing from the l2cache count as 0 #
+            l2_sizes = pd.Series(
+                {int(l2_id): values.get("size_nm3", 0) for l2_id, values in l2_data.items()},
+                dtype=np.float64,
+            )
+            l2_df = pd.DataFrame(
+                {
+                    "root_code": np.repeat(
+                        np.arange(len(root_index)), [len(l2s) for l2s in l2_lists]
+                    ),
+                    "size_nm3": l2_sizes.reindex(l2_ids.astype(np.int64)).fillna(0).to_numpy(),
+                }
+            )
+            volumes = (
+                l2_df.groupby("root_code")["size_nm3"]
+                .sum()
+                .reindex(np.arange(len(root_index)), fill_value=0)
+                .to_numpy()
+            )
+            has_l2s = np.array([root_id in root_to_l2s for root_id in root_index.tolist()])
+            summary_df["volume_um3"] = np.where(has_l2s, volumes / (1000 * 1000 * 1000), np.nan)
+
+    # fetches synapses once per direction for counts and neurotransmitters #
+    if "synapse_counts" in metrics or "nt" in metrics:
+        if isinstance(snapshot, str):
+            snapshot = load_synapse_snapshot(snapshot)
+        directions = ["outgoing"]
+        if "synapse_counts" in metrics:
+            directions.insert(0, "incoming")
+        for direction in directions:
+            root_col_name = "pre_pt_root_id" if direction == "outgoing" else "post_pt_root_id"
+            syn_df = query_synapses(
+                root_index.tolist(),
+                datastack,
+                direction=direction,
+                cleft_thresh=cleft_thresh,
+                materialization_version=materialization_version,
+                client=client,
+                snapshot=snapshot,
+            )
+            codes = pd.Index(root_index).get_indexer(syn_df[root_col_name].to_numpy())
+
+            if "synapse_counts" in metrics:
+                summary_df[direction] = np.bincount(codes, minlength=len(root_index))
+
+            # takes the neurotransmitter with the highest mean score over each root's outgoing synapses #
+            if "nt" in metrics and direction == "outgoing":
+                nt_names = ["gaba", "ach", "glut", "oct", "ser", "da"]
+                nt_means = (
+                    syn_df[nt_names]
+                    .groupby(codes)
+                    .mean()
+                    .reindex(np.arange(len(root_index)))
+                )
+                has_synapses = nt_means.notna().any(axis=1)
+                summary_df["nt"] = (
+                    nt_means[has_synapses].idxmax(axis=1).reindex(nt_means.index).to_numpy()
+                )
+        if "synapse_counts" in metrics:
+            summary_df["total"] = summary_df["incoming"] + summary_df["outgoing"]
 
-    # pulls list of all currently-documented datastacks #
-    stacks = client.info.get_datastacks()
+    # checks freshness in one batch, looking up current roots for outdated IDs from their L2 IDs #
+    if "freshness" in metrics:
+        summary_df["is_latest"] = np.asarray(
+            client.chunkedgraph.is_latest_roots(root_index.tolist()), dtype=bool
+        )
+        summary_df["current_root_id"] = pd.array(root_index, dtype="UInt64")
+        summary_df.loc[~summary_df["is_latest"], "current_root_id"] = pd.NA
+        outdated = [
+            i
+            for i in np.flatnonzero(~summary_df["is_latest"].to_numpy())
+            if first_l2s[i] is not None
+        ]
+        outdated_l2s = [first_l2s[i] for i in outdated]
+        if len(outdated_l2s) > 0:
+            summary_df.loc[outdated, "current_root_id"] = np.asarray(
+                client.chunkedgraph.get_roots(outdated_l2s), dtype=np.uint64
+            )
 
-    return stacks
+    # builds one plain segment link per root #
+    if "link" in metrics:
+        summary_df["link"] = build_ng_links(
+            [[root_id] for root_id in root_index.tolist()], datastack, client=client
+        )
+
+    # restores input order, including repeated IDs #
+    summary_df = summary_df.set_index("root_id").loc[root_ids].reset_index()
 
+    return summary_df
 
-def get_nt(root_ids, datastack, cleft_score_thresh=0, incoming=False):
+
+def get_nt(
+    root_ids,
+    datastack,
+    cleft_score_thresh=0,
+    incoming=False,
+    materialization_version=None,
+    snapshot=None,
+):
     """Get the neurotransmitter data for one or more root IDs.
 
     Arguments:
@@ -605,6 +3071,8 @@ def get_nt(root_ids, datastack, cleft_score_thresh=0, incoming=False):
     datastack -- the name of the datastack the root ID comes from
     cleft_score_thresh -- the cleft score threshold below which to filter out synapses (int, default 0)
     incoming -- whether or not to include detailed info about incoming nts or just the main output (bool, default False)
+    materialization_version -- the materialization version to pull synapses from, uses the latest version if None (int, default None)
+    snapshot -- a local snapshot from load_synapse_snapshot, or its directory, to use instead of the live service (dict or str, default None)
 
     Returns:
     out_max -- the name of the most likely output neurotransmitter (str)
@@ -627,44 +3095,46 @@ def get_nt(root_ids, datastack, cleft_score_thresh=0, incoming=False):
             "If 'incoming' is set to 'True' only 1 root id can be submitted."
         )
 
-    # sets CAVE client object using datastack name #
-    client = CAVEclient(datastack_name=datastack)
-
-    # gets metadata for chosen datastack as dict #
-    stack_info = client.info.get_datastack_info()
+    # sets CAVE client object using datastack name, unless answering from a local snapshot #
+    client = CAVEclient(datastack_name=datastack) if snapshot is None else None
 
-    # sets synapse table name using stack info #
-    synapse_table_name = stack_info["synapse_table"]
+    # loads the snapshot once for both queries #
+    if isinstance(snapshot, str):
+        snapshot = load_synapse_snapshot(snapshot)
 
     # sets column name for outgoing synapses #
     outgoing_col_name = "pre_pt_root_id"
 
+    # queries outgoing synapses for all root ids at once, dropping synapses below cleft threshold #
+    all_outgoing_syn_df = query_synapses(
+        root_ids,
+        datastack,
+        direction="outgoing",
+        cleft_thresh=cleft_score_thresh,
+        materialization_version=materialization_version,
+        client=client,
+        snapshot=snapshot,
+    )
+
     # makes empty list to fill with max nt names #
     out_max_list = []
 
     # iterates over each root id #
     for root_id in root_ids:
 
-        # creates outgoing synapse df by querying CAVE table #
-        outgoing_syn_df = client.materialize.query_table(
-            synapse_table_name,
-            filter_in_dict={outgoing_col_name: [root_id]},
-        )
-
-        # drops synapses with cleft scores below threshold if greater than 0 #
-        if cleft_score_thresh > 0:
-            outgoing_syn_df = outgoing_syn_df[
-                outgoing_syn_df["cleft_score"] >= float(cleft_score_thresh)
-            ].reset_index(drop=True)
+        # selects the outgoing synapses for this root id #
+        outgoing_syn_df = all_outgoing_syn_df[
+            all_outgoing_syn_df[outgoing_col_name] == int(root_id)
+        ]
 
         # calculates averages of all outgoing synapse neurotransmitters #
         out_nt_avg_dict = {
-            "gaba": round(statistics.mean(list(outgoing_syn_df["gaba"])), 2),
-            "ach": round(statistics.mean(list(outgoing_syn_df["ach"])), 2),
-            "glut": round(statistics.mean(list(outgoing_syn_df["glut"])), 2),
-            "oct": round(statistics.mean(list(outgoing_syn_df["oct"])), 2),
-            "ser": round(statistics.mean(list(outgoing_syn_df["ser"])), 2),
-            "da": round(statistics.mean(list(outgoing_syn_df["da"])), 2),
+            "gaba": round(float(statistics.mean(list(outgoing_syn_df["gaba"]))), 2),
+            "ach": round(float(statistics.mean(list(outgoing_syn_df["ach"]))), 2),
+            "glut": round(float(statistics.mean(list(outgoing_syn_df["glut"]))), 2),
+            "oct": round(float(statistics.mean(list(outgoing_syn_df["oct"]))), 2),
+            "ser": round(float(statistics.mean(list(outgoing_syn_df["ser"]))), 2),
+            "da": round(float(statistics.mean(list(outgoing_syn_df["da"]))), 2),
         }
 
         # gets name of nt with highest value in dict #
@@ -688,29 +3158,25 @@ def get_nt(root_ids, datastack, cleft_score_thresh=0, incoming=False):
         out_max = out_max_list[0]
         root_id = root_ids[0]
 
-        # sets column name for incoming synapses #
-        incoming_col_name = "post_pt_root_id"
-
-        # creates incoming synapse df by querying CAVE table #
-        incoming_syn_df = client.materialize.query_table(
-            synapse_table_name,
-            filter_in_dict={incoming_col_name: [root_id]},
+        # creates incoming synapse df, removing synapses below cleft score threshold #
+        incoming_syn_df = query_synapses(
+            root_id,
+            datastack,
+            direction="incoming",
+            cleft_thresh=cleft_score_thresh,
+            materialization_version=materialization_version,
+            client=client,
+            snapshot=snapshot,
         )
 
-        # removes synapses below cleft score threshold if greater than 0 #
-        if cleft_score_thresh > 0:
-            incoming_syn_df = incoming_syn_df[
-                incoming_syn_df["cleft_score"] >= float(cleft_score_thresh)
-            ].reset_index(drop=True)
-
         # makes dict of average nt scores #
         in_nt_avg_dict = {
-            "ach": round(statistics.mean(list(incoming_syn_df["ach"])), 2),
-            "da": round(statistics.mean(list(incoming_syn_df["da"])), 2),
-            "gaba": round(statistics.mean(list(incoming_syn_df["gaba"])), 2),
-            "glut": round(statistics.mean(list(incoming_syn_df["glut"])), 2),
-            "oct": round(statistics.mean(list(incoming_syn_df["oct"])), 2),
-            "ser": round(statistics.mean(list(incoming_syn_df["ser"])), 2),
+            "ach": round(float(statistics.mean(list(incoming_syn_df["ach"]))), 2),
+            "da": round(float(statistics.mean(list(incoming_syn_df["da"]))), 2),
+            "gaba": round(float(statistics.mean(list(incoming_syn_df["gaba"]))), 2),
+            "glut": round(float(statistics.mean(list(incoming_syn_df["glut"]))), 2),
+            "oct": round(float(statistics.mean(list(incoming_syn_df["oct"]))), 2),
+            "ser": round(float(statistics.mean(list(incoming_syn_df["ser"]))), 2),
         }
 
         # defines function for making violin plot of nt values #
@@ -776,178 +3242,1334 @@ def get_nt(root_ids, datastack, cleft_score_thresh=0, incoming=False):
                 height=200,
             )
 
-            return fig
+            return fig
+
+        # makes violin plot for neurotransmitters #
+        in_fig = make_nt_violin_plot(incoming_syn_df)
+
+        return [out_max, in_nt_avg_dict, in_fig]
+
+
+def get_partners(
+    root_ids,
+    datastack,
+    direction="outgoing",
+    cleft_thresh=0.0,
+    materialization_version=None,
+    snapshot=None,
+):
+    """Get the synaptic partners of one or more root IDs along with synapse counts for each partner.
+
+    Arguments:
+    root_ids -- the root IDs to get partners for (list of int or str, will also accept a single int or str)
+    datastack -- the name of the datastack the root IDs are from (str)
+    direction -- "outgoing" for downstream partners or "incoming" for upstream partners (str, default "outgoing")
+    cleft_thresh -- the cleft score below which to exclude synapses, currently only works with flywire (float, default 0.0)
+    materialization_version -- the materialization version to query, uses the latest version if None (int, default None)
+    snapshot -- a local snapshot from load_synapse_snapshot, or its directory, to use instead of the live service (dict or str, default None)
+
+    Returns:
+    partner_df -- one row per root ID and partner with columns "root_id", "partner_id" and "syn_count", strongest partners first for each root ID in input order (pandas DataFrame)
+    """
+
+    # determines which columns hold the queried roots and their partners #
+    if direction == "outgoing":
+        root_col_name, partner_col_name = "pre_pt_root_id", "post_pt_root_id"
+    else:
+        root_col_name, partner_col_name = "post_pt_root_id", "pre_pt_root_id"
+
+    # converts single IDs to a list #
+    if isinstance(root_ids, (int, str)):
+        root_ids = [root_ids]
+    root_ids = [int(root_id) for root_id in root_ids]
+
+    # gets synapses for all root IDs at once #
+    syn_df = query_synapses(
+        root_ids,
+        datastack,
+        direction=direction,
+        cleft_thresh=cleft_thresh,
+        materialization_version=materialization_version,
+        snapshot=snapshot,
+    )
+
+    # counts synapses per root and partner #
+    partner_df = (
+        syn_df.groupby([root_col_name, partner_col_name], sort=False)
+        .size()
+        .reset_index(name="syn_count")
+        .rename(columns={root_col_name: "root_id", partner_col_name: "partner_id"})
+    )
+
+    # orders roots as they were given, then partners from strongest to weakest within each root #
+    root_position = pd.Index(list(dict.fromkeys(root_ids))).get_indexer(
+        partner_df["root_id"].to_numpy()
+    )
+    order = np.lexsort((-partner_df["syn_count"].to_numpy(), root_position))
+    partner_df = partner_df.iloc[order].reset_index(drop=True)
+
+    return partner_df
+
+
+def get_top_partners(
+    root_ids,
+    datastack,
+    k=5,
+    cleft_thresh=0.0,
+    materialization_version=None,
+    snapshot=None,
+):
+    """Get the k strongest upstream and downstream partners of every root ID in one table.
+
+    Arguments:
+    root_ids -- the root IDs to summarize (list of int or str, will also accept a single int or str)
+    datastack -- the name of the datastack the root IDs are from (str)
+    k -- the number of partners to keep per root ID and direction (int, default 5)
+    cleft_thresh -- the cleft score below which to exclude synapses, currently only works with flywire (float, default 0.0)
+    materialization_version -- the materialization version to query, uses the latest version if None (int, default None)
+    snapshot -- a local snapshot from load_synapse_snapshot, or its directory, to use instead of the live service (dict or str, default None)
+
+    Returns:
+    top_df -- one row per kept partner with columns "root_id", "direction" ("incoming" for upstream, "outgoing" for downstream), "rank", "partner_id", "syn_count" and "fraction" (the share of the root's synapses in that direction), ordered by input root, direction and rank (pandas DataFrame)
+    """
+
+    # converts single IDs to a list #
+    if isinstance(root_ids, (int, str)):
+        root_ids = [root_ids]
+    root_ids = [int(root_id) for root_id in root_ids]
+
+    # loads the snapshot once for both directions #
+    if isinstance(snapshot, str):
+        snapshot = load_synapse_snapshot(snapshot)
+
+    direction_frames = []
+    for direction in ["incoming", "outgoing"]:
+        # gets every partner sorted strongest first within each root #
+        partner_df = get_partners(
+            root_ids,
+            datastack,
+            direction=direction,
+            cleft_thresh=cleft_thresh,
+            materialization_version=materialization_version,
+            snapshot=snapshot,
+        )
+
+        # computes each partner's share of the root's synapses before dropping weaker partners #
+        totals = partner_df.groupby("root_id")["syn_count"].transform("sum")
+        partner_df["fraction"] = (partner_df["syn_count"] / totals).astype(np.float32)
+        partner_df["rank"] = partner_df.groupby("root_id").cumcount() + 1
+        partner_df["direction"] = direction
+        direction_frames.append(partner_df[partner_df["rank"] <= k])
+
+    top_df = pd.concat(direction_frames, ignore_index=True)
+
+    # orders rows by input root, then direction, then rank #
+    root_position = pd.Index(list(dict.fromkeys(root_ids))).get_indexer(
+        top_df["root_id"].to_numpy()
+    )
+    order = np.lexsort(
+        (top_df["rank"].to_numpy(), top_df["direction"].to_numpy(), root_position)
+    )
+    top_df = top_df.iloc[order].reset_index(drop=True)
+
+    # stores columns compactly #
+    top_df = top_df.astype(
+        {
+            "root_id": np.uint64,
+            "partner_id": np.uint64,
+            "syn_count": np.int32,
+            "rank": np.int16,
+            "direction": "category",
+        }
+    )[["root_id", "direction", "rank", "partner_id", "syn_count", "fraction"]]
+
+    return top_df
+
+
+def get_stack_data(datastack):
+    """Get all the metadata for a specific CAVE datastack.
+
+    Argument:
+    datastack -- the name of the datastack you want information for, e.g. brain_and_nerve_cord (str)
+
+    Returns:
+    stack_info -- all the metadata on the requested datastack (dict)"""
+
+    # sets client using datastack name #
+    client = CAVEclient(datastack_name=datastack)
+
+    # pulls datastact info dictionary using stack name #
+    stack_info = client.info.get_datastack_info()
+
+    return stack_info
+
+
+def get_stack_tables(datastack):
+    """Get all the currently-listed tables for a specific CAVE datastack.
+
+    Argument:
+    datastack -- the name of the datastack you want information for, e.g. brain_and_nerve_cord (str)
+
+    Returns:
+    stack_tables -- names of all currently-documented tables for the requested datastack (list of str)
+    """
+
+    # sets client using datastack name #
+    client = CAVEclient(datastack_name=datastack)
+
+    # pulls datastact info dictionary using stack name #
+    stack_tables = client.annotation.get_tables()
+
+    return stack_tables
+
+
+def get_state_json_from_url(share_url, datastack):
+    """Derive state JSON from shortened share link url.
+
+    Arguments:
+    share_url -- the shortened NG link you want th JSON for (str)
+    datastack -- the name of the datastack the link is for, e.g. brain_and_nerve_cord (str)
+
+    Returns:
+    state_json -- the state JSON of the shortened link"""
+
+    # retreives JSON through the bulk fetcher, which reads and fills the state cache #
+    state_json = get_state_jsons_from_urls([share_url], datastack, raise_errors=True)[0]
+
+    return state_json
+
+
+def _parse_share_url(share_url):
+    """Read the state embedded in a neuroglancer link, or else the ID of its saved state, raising a ValueError if neither is found."""
+
+    # reads the fragment as a state only if it is a JSON object, other fragments hold a state server url #
+    if "#!" in share_url:
+        fragment = urllib.parse.unquote(share_url.split("#!", 1)[1]).strip()
+        if fragment.startswith("{"):
+            return json.loads(fragment), None
+
+    # gets state ID, which is always last component #
+    state_id = int(share_url.rstrip("/").split("/")[-1])
+
+    return None, state_id
+
+
+def get_state_jsons_from_urls(
+    share_urls, datastack, use_cache=True, cache_dir=None, max_workers=8, raise_errors=False
+):
+    """Get the state JSON for many neuroglancer links at once, such as a whole column of a review sheet.
+
+    States are fetched concurrently through one client, and each state is saved on disk by its state ID,
+    since a saved state never changes, so later calls for the same links don't contact the state server.
+    Links with the state embedded in the url are decoded directly, and any other link, including
+    spelunker links to a state server url, is read by the state ID at the end of it.
+
+    Arguments:
+    share_urls -- the links to get states for, empty or missing entries are allowed (list of str or pandas Series)
+    datastack -- the name of the datastack the links are for, e.g. brain_and_nerve_cord (str)
+    use_cache -- whether to read from and write to the local state cache (bool, default True)
+    cache_dir -- the directory to store cached states in (str, default STATE_CACHE_DIR)
+    max_workers -- the number of states to fetch at the same time (int, default 8)
+    raise_errors -- whether to raise an error for a link that can't be read instead of returning None for it (bool, default False)
+
+    Returns:
+    state_jsons -- the state JSON for each link in the same order as share_urls, or None where a link was empty or couldn't be read (list of dict)
+    """
+
+    if cache_dir is None:
+        cache_dir = STATE_CACHE_DIR
+    cache_dir = os.path.join(cache_dir, datastack)
+
+    # reads embedded states and state IDs from each link #
+    share_urls = list(share_urls)
+    state_jsons = [None] * len(share_urls)
+    state_ids = [None] * len(share_urls)
+    for i, share_url in enumerate(share_urls):
+        if not isinstance(share_url, str) or share_url.strip() == "":
+            if raise_errors:
+                raise ValueError(f"{share_url!r} is not a link.")
+            continue
+        try:
+            state_jsons[i], state_ids[i] = _parse_share_url(share_url.strip())
+        except ValueError as e:
+            if raise_errors:
+                raise
+            print(f"    Warning: Could not read a state from {share_url}: {e}")
+
+    # loads cached states, and lists the rest to fetch once each #
+    fetched = {}
+    for state_id in dict.fromkeys(state_id for state_id in state_ids if state_id is not None):
+        cache_path = os.path.join(cache_dir, str(state_id) + ".json")
+        if use_cache and os.path.exists(cache_path):
+            with open(cache_path) as f:
+                fetched[state_id] = json.load(f)
+    missing_ids = [
+        state_id
+        for state_id in dict.fromkeys(state_ids)
+        if state_id is not None and state_id not in fetched
+    ]
+
+    # fetches missing states concurrently through one client #
+    if len(missing_ids) > 0:
+        print(f"  Fetching {len(missing_ids)} states ({len(fetched)} cached)...")
+        client = CAVEclient(datastack)
+
+        def fetch_state(state_id):
+            try:
+                return client.state.get_state_json(state_id)
+            except Exception as e:
+                if raise_errors:
+                    raise
+                print(f"    Warning: Could not fetch state {state_id}: {e}")
+                return None
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for state_id, state_json in zip(missing_ids, executor.map(fetch_state, missing_ids)):
+                if state_json is None:
+                    continue
+                fetched[state_id] = state_json
+
+                # saves the state by writing a temporary file then renaming it, so readers never see partial files #
+                if use_cache:
+                    os.makedirs(cache_dir, exist_ok=True)
+                    cache_path = os.path.join(cache_dir, str(state_id) + ".json")
+                    with open(cache_path + ".tmp", "w") as f:
+                        json.dump(state_json, f)
+                    os.replace(cache_path + ".tmp", cache_path)
+
+    # returns states in input order #
+    for i, state_id in enumerate(state_ids):
+        if state_id is not None:
+            state_jsons[i] = fetched.get(state_id)
+
+    return state_jsons
+
+def get_synapse_counts(
+    root_ids,
+    datastack,
+    cleft_thresh=0,
+    materialization_version=None,
+    snapshot=None,
+):
+    """Get synapse counts for a list of root IDs.
+    
+    Arguments:
+    root_ids -- a list of root IDs to get synapse counts for (list of int or str, will also accept a single int or str)
+    datastack -- the name of the datastack the IDs are from (str)
+    cleft_thresh -- the cleft score bleow which to exclude synapses, currently only works with "flywire_fafb_production" datastack (int, default 0)
+    materialization_version -- the materialization version to count synapses at, uses the latest version if None (int, default None)
+    snapshot -- a local snapshot from load_synapse_snapshot, or its directory, to use instead of the live service (dict or str, default None)
+    
+    Returns:
+    synapse_dict -- a dictionary containing the requested synapse counts
+    """
+
+    # returns error if cleft thresholding is used with non-flywire datasets #
+    if datastack != "flywire_fafb_production" and cleft_thresh != 0:
+        raise ValueError("Cleft thresholding currently only works for the 'flywire_fafb_production' dataset.")
+
+    ### CURRENTLY ASSUMES CLEFT SCORE COLUMN NAME IS "cleft_score", ONLY WORKS WITH FLYWIRE ###
+
+    # sets CAVE client object using datastack name, unless answering from a local snapshot #
+    client = CAVEclient(datastack_name=datastack) if snapshot is None else None
+
+    # loads the snapshot once for both queries #
+    if isinstance(snapshot, str):
+        snapshot = load_synapse_snapshot(snapshot)
+
+    # converts root IDs to list of integers for passing into query_table method #
+    if isinstance(root_ids, (int, str)):
+        root_ids = [root_ids]
+    root_ids = list(map(int, root_ids))
+
+    # queries incoming and outgoing synapses for all root IDs at once, dropping synapses if asked #
+    in_df = query_synapses(
+        root_ids,
+        datastack,
+        direction="incoming",
+        cleft_thresh=cleft_thresh,
+        materialization_version=materialization_version,
+        client=client,
+        snapshot=snapshot,
+    )
+    out_df = query_synapses(
+        root_ids,
+        datastack,
+        direction="outgoing",
+        cleft_thresh=cleft_thresh,
+        materialization_version=materialization_version,
+        client=client,
+        snapshot=snapshot,
+    )
+
+    # counts synapses per root ID #
+    in_counts = in_df["post_pt_root_id"].value_counts() if len(in_df) > 0 else {}
+    out_counts = out_df["pre_pt_root_id"].value_counts() if len(out_df) > 0 else {}
+
+    # creates empty synapse dict to fill with counts #
+    synapse_dict = {}
+
+    # iterates over root IDs to collect synapse counts #
+    for root_id in root_ids:
+        incoming = int(in_counts.get(root_id, 0))
+        outgoing = int(out_counts.get(root_id, 0))
+
+        # adds values to synapse dict #
+        synapse_dict[str(root_id)] = {
+            "incoming" : incoming,
+            "outgoing" : outgoing,
+            "total" : incoming + outgoing,
+        }
+    
+    return synapse_dict
+
+def _query_table(client, table_name, arrow=False, split_positions=True, **query_kwargs):
+    """Query a materialized table, falling back to the default query if the server refuses split positions.
+
+    Asking for split positions avoids rebuilding one Python list per point after decoding, and
+    arrow=True converts the result to Arrow-backed columns.
+    """
+
+    # requests split position columns, falling back to the default query if the server refuses them #
+    if split_positions:
+        try:
+            table_df = client.materialize.query_table(
+                table_name, split_positions=True, **query_kwargs
+            )
+        except (requests.HTTPError, ValueError) as e:
+            print(f"    Warning: split positions unavailable for {table_name}, retrying: {e}")
+            table_df = client.materialize.query_table(table_name, **query_kwargs)
+    else:
+        table_df = client.materialize.query_table(table_name, **query_kwargs)
+
+    # drops query metadata, which isn't needed and can't always be serialized #
+    table_df.attrs.clear()
+
+    # converts columns to Arrow-backed dtypes #
+    if arrow:
+        table_df = table_df.convert_dtypes(dtype_backend="pyarrow")
+
+    return table_df
+
+
+def _table_id_range(client, table_name, materialization_version):
+    """Find the smallest and largest annotation ID of a table with one-row queries, or None if the table is empty."""
+
+    def any_id(**filters):
+        probe_df = client.materialize.query_table(
+            table_name,
+            limit=1,
+            materialization_version=materialization_version,
+            **filters,
+        )
+        return int(probe_df["id"].iloc[0]) if len(probe_df) > 0 else None
+
+    first_id = any_id()
+    if first_id is None:
+        return None
+
+    # narrows down the smallest ID, jumping to any smaller ID a query returns #
+    low, high = 0, first_id
+    while low < high:
+        mid = (low + high) // 2
+        found = any_id(filter_less_dict={"id": mid + 1})
+        if found is None:
+            low = mid + 1
+        else:
+            high = found
+    min_id = low
+
+    # finds an upper bound for the largest ID by doubling steps, then narrows it down #
+    low, step = first_id, 1
+    while True:
+        found = any_id(filter_greater_equal_dict={"id": low + step})
+        if found is None:
+            break
+        low = found
+        step *= 2
+    high = low + step - 1
+    while low < high:
+        mid = (low + high + 1) // 2
+        found = any_id(filter_greater_equal_dict={"id": mid})
+        if found is None:
+            high = mid - 1
+        else:
+            low = found
+    max_id = low
+
+    return min_id, max_id
+
+
+def _stream_table_to_parquet(
+    client,
+    table_name,
+    output_dir,
+    materialization_version,
+    chunk_size,
+    max_workers,
+    split_positions,
+):
+    """Download a table in windows of annotation IDs and write each window to its own parquet file.
+
+    The windows cover the table's IDs from smallest to largest and are all written with one schema, so
+    the files read back as a single dataset. Finished windows are recorded in a manifest inside
+    output_dir, so rerunning with the same arguments only fetches the windows that are still missing.
+    """
+
+    # loads the manifest from a previous run, reusing its version if none was given #
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, "_manifest.json")
+    manifest = None
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if materialization_version is None:
+            materialization_version = manifest["materialization_version"]
+
+    # pins the export to one version so every window comes from the same snapshot #
+    if materialization_version is None:
+        materialization_version = client.materialize.version
+
+    if manifest is not None:
+        if (
+            manifest["table_name"] != table_name
+            or manifest["materialization_version"] != materialization_version
+            or manifest["chunk_size"] != chunk_size
+        ):
+            raise ValueError(
+                f"{output_dir} holds a different export ({manifest['table_name']}, "
+                f"version {manifest['materialization_version']}, chunk_size {manifest['chunk_size']})."
+            )
+    else:
+        manifest = {
+            "table_name": table_name,
+            "materialization_version": materialization_version,
+            "chunk_size": chunk_size,
+            "total_rows": int(
+                client.materialize.get_annotation_count(
+                    table_name, version=materialization_version
+                )
+            ),
+            "windows": {},
+            "complete": False,
+        }
+
+    def save_manifest():
+        tmp_path = manifest_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, manifest_path)
+
+    # looks up the range of IDs to cover once, and keeps it for later runs #
+    if "id_range" not in manifest:
+        manifest["id_range"] = _table_id_range(client, table_name, materialization_version)
+        save_manifest()
+    if manifest["id_range"] is None:
+        window_count = 0
+    else:
+        min_id, max_id = manifest["id_range"]
+        window_count = (max_id - min_id) // chunk_size + 1
+
+    def fetch_window(window):
+        # gets all rows with IDs in [min_id + window * chunk_size, min_id + (window + 1) * chunk_size) #
+        return _query_table(
+            client,
+            table_name,
+            split_positions=split_positions,
+            filter_greater_equal_dict={"id": min_id + window * chunk_size},
+            filter_less_dict={"id": min_id + (window + 1) * chunk_size},
+            materialization_version=materialization_version,
+        )
 
-        # makes violin plot for neurotransmitters #
-        in_fig = make_nt_violin_plot(incoming_syn_df)
+    # loads the schema every window is written with, which is taken from the first window written #
+    schema = None
+    if manifest.get("schema") is not None:
+        schema = pa.ipc.read_schema(pa.py_buffer(base64.b64decode(manifest["schema"])))
 
-        return [out_max, in_nt_avg_dict, in_fig]
+    def write_window(window, window_df):
+        nonlocal schema
+        window_schema = pa.Schema.from_pandas(window_df, preserve_index=False).remove_metadata()
+        if schema is None:
+            schema = window_schema
+        else:
+            # takes the type of columns that were empty in every earlier window from this one #
+            filled_fields = [
+                field
+                for field in window_schema
+                if schema.get_field_index(field.name) >= 0
+                and pa.types.is_null(schema.field(field.name).type)
+                and not pa.types.is_null(field.type)
+            ]
+            for field in filled_fields:
+                schema = schema.set(schema.get_field_index(field.name), field)
+
+            # rewrites earlier windows with the filled in types so every file has the same schema #
+            if len(filled_fields) > 0:
+                for file_name in sorted(os.listdir(output_dir)):
+                    if file_name.startswith("part-") and file_name.endswith(".parquet"):
+                        part_path = os.path.join(output_dir, file_name)
+                        pq.write_table(pq.read_table(part_path).cast(schema), part_path + ".tmp")
+                        os.replace(part_path + ".tmp", part_path)
+        manifest["schema"] = base64.b64encode(schema.serialize().to_pybytes()).decode()
+
+        # writes the window to a temporary file, then moves it into place #
+        part_path = os.path.join(output_dir, f"part-{window:08d}.parquet")
+        pq.write_table(
+            pa.Table.from_pandas(window_df, schema=schema, preserve_index=False),
+            part_path + ".tmp",
+        )
+        os.replace(part_path + ".tmp", part_path)
+
+    # writes an empty table as one empty file, so the dataset still has the table's columns #
+    if window_count == 0 and schema is None:
+        empty_df = _query_table(
+            client,
+            table_name,
+            split_positions=split_positions,
+            limit=1,
+            materialization_version=materialization_version,
+        )
+        write_window(0, empty_df.iloc[0:0])
+        save_manifest()
+
+    rows_done = sum(manifest["windows"].values())
+    missing = [window for window in range(window_count) if str(window) not in manifest["windows"]]
+
+    # fetches windows concurrently in waves, writing each non-empty one, until every window is done #
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for start in range(0, len(missing), max_workers):
+            wave = missing[start : start + max_workers]
+            for window, window_df in zip(wave, executor.map(fetch_window, wave)):
+                if len(window_df) > 0:
+                    write_window(window, window_df)
+                manifest["windows"][str(window)] = len(window_df)
+                rows_done += len(window_df)
+            save_manifest()
+
+            print(f"    Progress: {rows_done}/{manifest['total_rows']} rows...")
+
+    # only marks the export complete once every counted row has been written #
+    if rows_done == manifest["total_rows"]:
+        manifest["complete"] = True
+    else:
+        print(
+            f"    Warning: wrote {rows_done} of {manifest['total_rows']} rows of {table_name}, "
+            f"the export in {output_dir} is not marked complete."
+        )
+    save_manifest()
 
+    return output_dir
 
-def get_stack_data(datastack):
-    """Get all the metadata for a specific CAVE datastack.
 
-    Argument:
+def get_table(
+    table_name,
+    datastack,
+    arrow=False,
+    split_positions=False,
+    materialization_version=None,
+    output_dir=None,
+    chunk_size=100000,
+    max_workers=4,
+):
+    """Get the data as a pandas dataframe for a specific table in a specific CAVE datastack.
+
+    For tables too large to pull in one request, pass output_dir to stream the table to disk instead.
+    The table is fetched in windows of chunk_size annotation IDs, max_workers windows at a time, and
+    each window is written as one file of a parquet dataset. An interrupted export picks up where it
+    left off when called again with the same output_dir. The dataset can be read back with
+    pd.read_parquet(output_dir).
+
+    Arguments:
+    table_name -- the name of the table to request data for, e.g. cell_ids (str)
     datastack -- the name of the datastack you want information for, e.g. brain_and_nerve_cord (str)
+    arrow -- whether to return Arrow-backed columns instead of numpy and object columns (bool, default False)
+    split_positions -- whether to return positions as separate x, y and z columns instead of one list per row (bool, default False)
+    materialization_version -- the materialization version to query, uses the latest version if None (int, default None)
+    output_dir -- if given, the directory to stream the table into as a parquet dataset (str, default None)
+    chunk_size -- the width of each window of annotation IDs when streaming (int, default 100000)
+    max_workers -- the number of windows to fetch at the same time when streaming (int, default 4)
 
     Returns:
-    stack_info -- all the metadata on the requested datastack (dict)"""
+    table_df -- the data for the requested table (pandas DataFrame)
+    OR IF output_dir is given:
+    output_dir -- the directory holding the parquet dataset (str)"""
 
     # sets client using datastack name #
     client = CAVEclient(datastack_name=datastack)
 
-    # pulls datastact info dictionary using stack name #
-    stack_info = client.info.get_datastack_info()
+    # streams the table to disk if requested #
+    if output_dir is not None:
+        return _stream_table_to_parquet(
+            client,
+            table_name,
+            output_dir,
+            materialization_version,
+            chunk_size,
+            max_workers,
+            split_positions,
+        )
 
-    return stack_info
+    # pulls the table, as Arrow-backed columns if requested #
+    table_df = _query_table(
+        client,
+        table_name,
+        arrow=arrow,
+        split_positions=split_positions,
+        materialization_version=materialization_version,
+    )
 
+    return table_df
 
-def get_stack_tables(datastack):
-    """Get all the currently-listed tables for a specific CAVE datastack.
 
-    Argument:
+def get_table_data(table_name, datastack):
+    """Get the metadata for a specific table in a specific CAVE datastack.
+
+    Arguments:
+    table_name -- the name of the table to request metadata for, e.g. cell_ids (str)
     datastack -- the name of the datastack you want information for, e.g. brain_and_nerve_cord (str)
 
     Returns:
-    stack_tables -- names of all currently-documented tables for the requested datastack (list of str)
-    """
+    table_data -- all the metadata on the requested table (dict)"""
 
     # sets client using datastack name #
     client = CAVEclient(datastack_name=datastack)
 
     # pulls datastact info dictionary using stack name #
-    stack_tables = client.annotation.get_tables()
+    table_data = client.materialize.get_table_metadata(table_name)
 
-    return stack_tables
+    return table_data
 
 
-def get_state_json_from_url(share_url, datastack):
-    """Derive state JSON from shortened share link url.
+def lean_synapse_df(syn_df):
+    """Convert a synapse table DataFrame to compact dtypes with split x, y and z coordinate columns.
+
+    ID columns become uint64, score columns (cleft, connection and neurotransmitter scores) become float32,
+    other integer columns are downcast to the smallest type that fits them, and position columns
+    holding one list per row are split into int32 "_x", "_y" and "_z" columns. Positions are in nm, as
+    the materialize service returns them, and the rest of this module treats them as nm as well.
 
     Arguments:
-    share_url -- the shortened NG link you want th JSON for (str)
-    datastack -- the name of the datastack the link is for, e.g. brain_and_nerve_cord (str)
+    syn_df -- synapse rows as returned by client.materialize.query_table (pandas DataFrame)
 
     Returns:
-    state_json -- the state JSON of the shortened link"""
+    lean_df -- the same rows and columns in compact form (pandas DataFrame)
+    """
 
-    # sets client using datastack name #
-    client = CAVEclient(datastack)
+    # builds the new columns in their original order #
+    lean_cols = {}
+    for col_name in syn_df.columns:
+        values = syn_df[col_name]
+
+        # splits list-style position columns into one int32 column per axis #
+        if col_name.endswith("_position") and values.dtype == object:
+            points = np.array(values.tolist(), dtype=np.int64).reshape(-1, 3)
+            for i, axis in enumerate(["x", "y", "z"]):
+                lean_cols[col_name + "_" + axis] = points[:, i].astype(np.int32)
+        elif col_name.endswith(("_position_x", "_position_y", "_position_z")):
+            lean_cols[col_name] = values.to_numpy().astype(np.int32)
+
+        # stores segment and synapse IDs as unsigned 64-bit integers #
+        elif (col_name == "id" or col_name.endswith("_id")) and pd.api.types.is_integer_dtype(values):
+            lean_cols[col_name] = values.to_numpy().astype(np.uint64)
+
+        # shrinks scores and other numbers #
+        elif pd.api.types.is_float_dtype(values) or col_name.endswith("_score"):
+            lean_cols[col_name] = values.to_numpy().astype(np.float32)
+        elif pd.api.types.is_integer_dtype(values) and not pd.api.types.is_bool_dtype(values):
+            lean_cols[col_name] = pd.to_numeric(values, downcast="integer").to_numpy()
+
+        # leaves anything else, like timestamps, unchanged #
+        else:
+            lean_cols[col_name] = values.to_numpy()
 
-    # splits share url into components between slashes #
-    split_url = share_url.split("/")
+    lean_df = pd.DataFrame(lean_cols)
 
-    # gets state ID, which is always last component #
-    state_id = int(split_url[-1])
+    return lean_df
 
-    # retreives JSON from state server using state ID #
-    state_json = client.state.get_state_json(state_id)
 
-    return state_json
+def load_synapse_snapshot(snapshot_dir):
+    """Open a synapse snapshot made by build_synapse_snapshot.
+
+    Arrays are memory-mapped, so loading is instant and only the rows that are looked up get read from disk.
 
-def get_synapse_counts(root_ids, datastack, cleft_thresh=0):
-    """Get synapse counts for a list of root IDs.
-    
     Arguments:
-    root_ids -- a list of root IDs to get synapse counts for (list of int or str, will also accept a single int or str)
-    datastack -- the name of the datastack the IDs are from (str)
-    cleft_thresh -- the cleft score bleow which to exclude synapses, currently only works with "flywire_fafb_production" datastack (int, default 0)
-    
+    snapshot_dir -- the directory the snapshot was written to (str)
+
     Returns:
-    synapse_dict -- a dictionary containing the requested synapse counts
+    snapshot -- the snapshot metadata, index arrays and column arrays (dict)
     """
 
-    # returns error if cleft thresholding is used with non-flywire datasets #
-    if datastack != "flywire_fafb_production" and cleft_thresh != 0:
-        raise ValueError("Cleft thresholding currently only works for the 'flywire_fafb_production' dataset.")
+    # reads metadata #
+    with open(os.path.join(snapshot_dir, "snapshot.json")) as f:
+        meta = json.load(f)
 
-    ### CURRENTLY ASSUMES CLEFT SCORE COLUMN NAME IS "cleft_score", ONLY WORKS WITH FLYWIRE ###
-    cleft_score_column_name = "cleft_score"
+    # memory-maps index and column arrays #
+    snapshot = {"meta": meta}
+    for name in ["pre_roots", "pre_offsets", "post_roots", "post_offsets", "post_order"]:
+        snapshot[name] = np.load(
+            os.path.join(snapshot_dir, "index", name + ".npy"), mmap_mode="r"
+        )
+    snapshot["columns"] = {
+        col_name: np.load(
+            os.path.join(snapshot_dir, "columns", col_name + ".npy"), mmap_mode="r"
+        )
+        for col_name in meta["columns"]
+    }
 
-    # sets CAVE client object using datastack name #
-    client = CAVEclient(datastack_name=datastack)
+    return snapshot
 
-    # gets metadata for chosen datastack as dict #
-    stack_info = client.info.get_datastack_info()
 
-    # gets name of synapse table using stack_info #
-    synapse_table_name = stack_info["synapse_table"]
+def _ranges_to_indices(starts, ends):
+    """Concatenate the integer ranges [starts[i], ends[i]) into one index array without a Python loop."""
 
-    # converts root IDs to list of integers for passing into query_table method #
-    root_ids = list(map(int, root_ids))
+    lengths = ends - starts
+    total = int(lengths.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64)
 
-    # creates empty synapse dict to fill with counts #
-    synapse_dict = {}
+    # shifts a running count so each range begins at its own start #
+    out_starts = np.cumsum(lengths) - lengths
+    indices = np.arange(total, dtype=np.int64) - np.repeat(out_starts - starts, lengths)
 
-    # iterates over root IDs to get synapse counts #
-    for root_id in root_ids:
-        in_df = client.materialize.query_table(
-                synapse_table_name,
-                filter_in_dict={"post_pt_root_id": [root_id]},
+    return indices
+
+
+def _snapshot_synapses(snapshot, root_ids, direction):
+    """Get the synapse rows for root IDs from a loaded snapshot using binary search over its index."""
+
+    # picks the index for the requested direction #
+    side = "post" if direction == "incoming" else "pre"
+    roots = snapshot[side + "_roots"]
+    offsets = snapshot[side + "_offsets"]
+
+    # an empty snapshot has no rows for any root #
+    if len(roots) == 0:
+        return pd.DataFrame(
+            {col_name: values[:0] for col_name, values in snapshot["columns"].items()}
+        )
+
+    # finds each root in the sorted root list, roots that aren't present get empty ranges #
+    root_ids = np.asarray(root_ids, dtype=np.uint64)
+    positions = np.searchsorted(roots, root_ids)
+    found = positions < len(roots)
+    found[found] = roots[positions[found]] == root_ids[found]
+    starts = np.where(found, offsets[np.minimum(positions, len(roots) - 1)], 0)
+    ends = np.where(found, offsets[np.minimum(positions, len(roots) - 1) + 1], 0)
+
+    # converts ranges into row numbers, which for incoming synapses point into the postsynaptic order #
+    rows = _ranges_to_indices(starts.astype(np.int64), ends.astype(np.int64))
+    if side == "post":
+        rows = snapshot["post_order"][rows]
+
+    syn_df = pd.DataFrame(
+        {col_name: values[rows] for col_name, values in snapshot["columns"].items()}
+    )
+
+    return syn_df
+
+
+def _query_synapse_rows(client, table_name, root_col_name, root_ids, query_point, id_range=None):
+    """Query the synapse rows of root IDs, splitting any query whose result may have been cut off at SYNAPSE_QUERY_LIMIT rows.
+
+    A full page is split in two and both halves are queried again, first by root ID and, once a single
+    root is left, by synapse ID range. Returns the rows and whether they are known to be complete.
+    """
+
+    id_filters = {}
+    if id_range is not None:
+        id_filters = {
+            "filter_greater_equal_dict": {"id": id_range[0]},
+            "filter_less_dict": {"id": id_range[1]},
+        }
+    chunk_df = _query_table(
+        client,
+        table_name,
+        filter_in_dict={root_col_name: list(root_ids)},
+        limit=SYNAPSE_QUERY_LIMIT,
+        **id_filters,
+        **query_point,
+    )
+    if len(chunk_df) < SYNAPSE_QUERY_LIMIT:
+        return chunk_df, True
+
+    # splits by root while there are several, otherwise at the middle synapse ID of the page #
+    if len(root_ids) > 1:
+        half = len(root_ids) // 2
+        parts = [(root_ids[:half], id_range), (root_ids[half:], id_range)]
+    else:
+        low, high = id_range if id_range is not None else (0, 2**63 - 1)
+        if high - low < 2:
+            print(f"    Warning: could not split a full page of synapses for {root_ids[0]}")
+            return chunk_df, False
+        split_id = min(max(int(np.median(chunk_df["id"].to_numpy())), low + 1), high - 1)
+        parts = [(root_ids, (low, split_id)), (root_ids, (split_id, high))]
+
+    part_results = [
+        _query_synapse_rows(client, table_name, root_col_name, part_ids, query_point, part_range)
+        for part_ids, part_range in parts
+    ]
+    syn_df = pd.concat([part_df for part_df, _ in part_results], ignore_index=True)
+
+    return syn_df, all(complete for _, complete in part_results)
+
+
+def _evict_synapse_cache(cache_dir, max_bytes, added_bytes=0):
+    """Delete the least recently used cached synapse files until the cache fits within max_bytes.
+
+    The size of the cache is kept as a running total that added_bytes is added to, and the cache is only
+    scanned the first time it is seen and when the total passes max_bytes.
+    """
+
+    # adds newly written files to the running total, scanning only if it may be over the limit #
+    size_key = os.path.abspath(cache_dir)
+    if size_key in _SYNAPSE_CACHE_BYTES:
+        _SYNAPSE_CACHE_BYTES[size_key] += added_bytes
+        if _SYNAPSE_CACHE_BYTES[size_key] <= max_bytes:
+            return
+
+    # collects modification time, size and path of every cached file #
+    cached_files = []
+    total_bytes = 0
+    for dirpath, dirnames, filenames in os.walk(cache_dir):
+        for filename in filenames:
+            if filename.endswith(".parquet"):
+                path = os.path.join(dirpath, filename)
+                stat = os.stat(path)
+                cached_files.append((stat.st_mtime, stat.st_size, path))
+                total_bytes += stat.st_size
+
+    # removes oldest files first, cache hits refresh modification times #
+    cached_files.sort()
+    for mtime, size, path in cached_files:
+        if total_bytes <= max_bytes:
+            break
+        os.remove(path)
+        total_bytes -= size
+
+    _SYNAPSE_CACHE_BYTES[size_key] = total_bytes
+
+
+def query_synapses(
+    root_ids,
+    datastack,
+    direction="incoming",
+    cleft_thresh=0.0,
+    materialization_version=None,
+    client=None,
+    use_cache=True,
+    cache_dir=None,
+    max_cache_bytes=None,
+    chunk_size=50,
+    snapshot=None,
+    timestamp=None,
+):
+    """Get the synapse table rows for one or more root IDs, reading from a local disk cache where possible.
+
+    Results are stored as one parquet file per root ID, keyed by datastack, synapse table, materialization
+    version and direction. A materialization version never changes once published, so repeated lookups at
+    the same version are served from disk without contacting the materialize service. Rows are returned in
+    the compact form produced by lean_synapse_df, with split x, y and z position columns.
+
+    Arguments:
+    root_ids -- the root IDs to get synapses for (list of int or str, will also accept a single int or str)
+    datastack -- the name of the datastack the root IDs are from (str)
+    direction -- "incoming" for synapses onto the root IDs or "outgoing" for synapses from them (str, default "incoming")
+    cleft_thresh -- the cleft score below which to exclude synapses, currently only works with flywire (float, default 0.0)
+    materialization_version -- the materialization version to query, uses the latest version if None (int, default None)
+    client -- an existing CAVEclient for the datastack to reuse instead of creating a new one (CAVEclient, default None)
+    use_cache -- whether to read from and write to the local synapse cache (bool, default True)
+    cache_dir -- the directory to store cached results in (str, default SYNAPSE_CACHE_DIR)
+    max_cache_bytes -- the size in bytes above which least recently used files are evicted (int, default SYNAPSE_CACHE_MAX_BYTES)
+    chunk_size -- the number of uncached root IDs to request per query (int, default 50)
+    snapshot -- a local snapshot from load_synapse_snapshot, or its directory, to use instead of the live service (dict or str, default None)
+    timestamp -- if given, queries the live segmentation at this past time instead of a materialization version (datetime, default None)
+
+    Returns:
+    syn_df -- the synapse rows for all requested root IDs, in the same order as the input (pandas DataFrame)
+    """
+
+    # determines which synapse table column to filter on #
+    if direction == "incoming":
+        root_col_name = "post_pt_root_id"
+    elif direction == "outgoing":
+        root_col_name = "pre_pt_root_id"
+    else:
+        raise ValueError("direction must be either 'incoming' or 'outgoing'.")
+
+    # converts single IDs to a list and removes duplicates while preserving order #
+    if isinstance(root_ids, (int, str)):
+        root_ids = [root_ids]
+    root_ids = list(dict.fromkeys(int(root_id) for root_id in root_ids))
+
+    # rejects conflicting points in time #
+    if timestamp is not None and (
+        materialization_version is not None or snapshot is not None
+    ):
+        raise ValueError(
+            "timestamp can't be combined with materialization_version or snapshot."
+        )
+
+    # answers the query from a local snapshot if one is given #
+    if snapshot is not None:
+        if isinstance(snapshot, str):
+            snapshot = load_synapse_snapshot(snapshot)
+        meta = snapshot["meta"]
+        if meta["datastack"] != datastack:
+            raise ValueError(f"Snapshot is for {meta['datastack']}, not {datastack}.")
+        if materialization_version not in (None, meta["materialization_version"]):
+            raise ValueError(
+                f"Snapshot is at version {meta['materialization_version']}, not {materialization_version}."
             )
-        out_df = client.materialize.query_table(
-                synapse_table_name,
-                filter_in_dict={"pre_pt_root_id": [root_id]},
+        syn_df = _snapshot_synapses(snapshot, root_ids, direction)
+        if cleft_thresh > 0.0:
+            syn_df = syn_df[syn_df["cleft_score"] >= float(cleft_thresh)].reset_index(
+                drop=True
             )
-        
-        # drops synapses if asked #
-        if cleft_thresh > 0:
-            in_df = in_df[
-                in_df[cleft_score_column_name] >= float(cleft_thresh)
-            ].reset_index(drop=True)
-            out_df = out_df[
-                out_df[cleft_score_column_name] >= float(cleft_thresh)
-            ].reset_index(drop=True)
-
-        # gets synapse counts by counting length of dfs #
-        incoming = len(in_df)
-        outgoing = len(out_df)
+        return syn_df
 
-        # adds values to synapse dict #
-        synapse_dict[str(root_id)] = {
-            "incoming" : incoming,
-            "outgoing" : outgoing,
-            "total" : incoming + outgoing,
-        }
-    
-    return synapse_dict
+    # sets default cache location and size #
+    if cache_dir is None:
+        cache_dir = SYNAPSE_CACHE_DIR
+    if max_cache_bytes is None:
+        max_cache_bytes = SYNAPSE_CACHE_MAX_BYTES
 
-def get_table(table_name, datastack):
-    """Get the data as a pandas dataframe for a specific table in a specific CAVE datastack.
+    # sets CAVE client object using datastack name if one wasn't passed in #
+    if client is None:
+        client = CAVEclient(datastack_name=datastack)
+
+    # gets name of synapse table from stack info #
+    synapse_table_name = client.info.get_datastack_info()["synapse_table"]
+
+    # pins the query to a version or timestamp so cached results stay valid #
+    if timestamp is not None:
+        version_key = "t" + timestamp.strftime("%Y%m%dT%H%M%S%f")
+        query_point = {"timestamp": timestamp}
+    else:
+        if materialization_version is None:
+            materialization_version = client.materialize.version
+        version_key = "v" + str(materialization_version)
+        query_point = {"materialization_version": materialization_version}
+
+    # keeps the table's columns and dtypes when there are no root IDs, using a one-row query #
+    if len(root_ids) == 0:
+        probe_df = _query_table(client, synapse_table_name, limit=1, **query_point)
+        return lean_synapse_df(probe_df).iloc[0:0].reset_index(drop=True)
+
+    # sets the directory holding cached files for this table, version and direction #
+    version_dir = os.path.join(
+        cache_dir,
+        datastack,
+        synapse_table_name,
+        version_key,
+        direction,
+    )
+
+    def cache_path(root_id):
+        return os.path.join(
+            version_dir, str(root_id) + "_f" + str(SYNAPSE_CACHE_FORMAT) + ".parquet"
+        )
+
+    # reads cached roots from disk and collects the rest for querying #
+    root_frames = {}
+    missing_ids = []
+    for root_id in root_ids:
+        path = cache_path(root_id)
+        if use_cache and os.path.exists(path):
+            root_frames[root_id] = pd.read_parquet(path)
+            # marks the file as recently used for eviction #
+            os.utime(path)
+        else:
+            missing_ids.append(root_id)
+
+    # queries uncached roots in chunks and splits results back out by root #
+    if len(missing_ids) > 0:
+        if use_cache:
+            os.makedirs(version_dir, exist_ok=True)
+        written_bytes = 0
+
+        for i in range(0, len(missing_ids), chunk_size):
+            chunk = missing_ids[i : i + chunk_size]
+            chunk_df, complete = _query_synapse_rows(
+                client, synapse_table_name, root_col_name, chunk, query_point
+            )
+            # shrinks dtypes so cached files and returned frames stay small #
+            chunk_df = lean_synapse_df(chunk_df)
+
+            grouped = {
+                int(root_id): root_df.reset_index(drop=True)
+                for root_id, root_df in chunk_df.groupby(root_col_name)
+            }
+            for root_id in chunk:
+                # roots without synapses are stored as empty frames so they are cached too #
+                root_df = grouped.get(root_id, chunk_df.iloc[0:0])
+                root_frames[root_id] = root_df
+                # only complete results are cached, since cached versions are never fetched again #
+                if use_cache and complete:
+                    root_df.to_parquet(cache_path(root_id), index=False)
+                    written_bytes += os.path.getsize(cache_path(root_id))
+
+        # keeps the cache within its size limit #
+        if use_cache:
+            _evict_synapse_cache(cache_dir, max_cache_bytes, added_bytes=written_bytes)
+
+    # combines per-root results in input order #
+    syn_df = pd.concat([root_frames[root_id] for root_id in root_ids], ignore_index=True)
+
+    # removes synapses with cleft scores below threshold #
+    if cleft_thresh > 0.0:
+        syn_df = syn_df[syn_df["cleft_score"] >= float(cleft_thresh)].reset_index(
+            drop=True
+        )
+
+    return syn_df
+
+
+def _segmentation_layers(state_json):
+    """List the segmentation layers of a state, handling both list and older dict-style layer entries."""
+
+    layers = state_json.get("layers", [])
+    if isinstance(layers, dict):
+        layers = list(layers.values())
+
+    return [layer for layer in layers if "segmentation" in str(layer.get("type", ""))]
+
+
+def refresh_state_segments(
+    share_urls, datastack, rewrite=False, upload_state="auto", max_workers=8
+):
+    """Update the segment IDs in many neuroglancer links to their current versions.
+
+    Segment IDs are collected from every segmentation layer of every state, deduplicated, and updated
+    with a single update_root_ids call. Optionally each state is rewritten with the current IDs and
+    given a new link.
 
     Arguments:
-    table_name -- the name of the table to request data for, e.g. cell_ids (str)
-    datastack -- the name of the datastack you want information for, e.g. brain_and_nerve_cord (str)
+    share_urls -- the links to refresh, empty or missing entries are allowed (list of str or pandas Series)
+    datastack -- the name of the datastack the links are for (str)
+    rewrite -- whether to also make updated states and links (bool, default False)
+    upload_state -- how new links are made, True to upload, False to embed the state in the url, or "auto" to embed only small states (bool or str, default "auto")
+    max_workers -- the number of states to fetch or upload at the same time (int, default 8)
 
     Returns:
-    table_df -- the data for the requested table (pandas DataFrame)"""
+    id_df -- one row per distinct segment ID with columns "old_id", "new_id", "changed" and "n_states" (pandas DataFrame)
+    AND IF "rewrite=True":
+    link_df -- one row per link with columns "share_url", "n_segments", "n_changed", "new_url" and "state_json" (pandas DataFrame)
+    """
 
-    # sets client using datastack name #
+    # fetches all states at once #
+    share_urls = list(share_urls)
+    state_jsons = get_state_jsons_from_urls(share_urls, datastack, max_workers=max_workers)
+
+    # collects the segment IDs of each state, including hidden segments and colored segments #
+    state_segment_ids = []
+    for state_json in state_jsons:
+        segment_ids = []
+        for layer in _segmentation_layers(state_json) if state_json is not None else []:
+            segments = layer.get("segments", []) + layer.get("hiddenSegments", [])
+            segment_ids += [int(str(segment).lstrip("!")) for segment in segments]
+            segment_ids += [int(segment) for segment in layer.get("segmentColors", {})]
+        state_segment_ids.append(list(dict.fromkeys(segment_ids)))
+
+    # updates every distinct ID in one pass #
+    all_ids = list(
+        dict.fromkeys(segment_id for segment_ids in state_segment_ids for segment_id in segment_ids)
+    )
+    id_df = pd.DataFrame(
+        update_root_ids(all_ids, datastack) if len(all_ids) > 0 else [],
+        columns=["old_id", "new_id", "changed"],
+    )
+    id_df["n_states"] = (
+        pd.Series([segment_id for segment_ids in state_segment_ids for segment_id in segment_ids])
+        .astype(str)
+        .value_counts()
+        .reindex(id_df["old_id"], fill_value=0)
+        .to_numpy()
+    )
+
+    if rewrite == False:
+        return id_df
+
+    # rewrites states with the current IDs, keeping IDs that couldn't be updated #
+    new_ids = {
+        old_id: new_id
+        for old_id, new_id in zip(id_df["old_id"], id_df["new_id"])
+        if new_id is not None
+    }
+
+    def update_segment(segment):
+        segment = str(segment)
+        prefix = "!" if segment.startswith("!") else ""
+        return prefix + new_ids.get(segment.lstrip("!"), segment.lstrip("!"))
+
+    new_states = []
+    for state_json in state_jsons:
+        if state_json is None:
+            new_states.append(None)
+            continue
+        state_json = json.loads(json.dumps(state_json))
+        for layer in _segmentation_layers(state_json):
+            for key in ["segments", "hiddenSegments"]:
+                if key in layer:
+                    layer[key] = list(dict.fromkeys(update_segment(segment) for segment in layer[key]))
+            if "segmentColors" in layer:
+                layer["segmentColors"] = {
+                    update_segment(segment): color
+                    for segment, color in layer["segmentColors"].items()
+                }
+        new_states.append(state_json)
+
+    # makes new links for the states, concurrently #
     client = CAVEclient(datastack_name=datastack)
+    base_url = client.info.get_datastack_info()["viewer_site"]
+
+    def make_url(state_json):
+        if state_json is None:
+            return None
+        return _ng_state_url(client, state_json, base_url, upload_state=upload_state)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        new_urls = list(executor.map(make_url, new_states))
+
+    changed_ids = set(id_df.loc[id_df["changed"] == True, "old_id"].astype(int))
+    link_df = pd.DataFrame(
+        {
+            "share_url": share_urls,
+            "n_segments": [len(segment_ids) for segment_ids in state_segment_ids],
+            "n_changed": [
+                len(changed_ids.intersection(segment_ids)) for segment_ids in state_segment_ids
+            ],
+            "new_url": new_urls,
+            "state_json": new_states,
+        }
+    )
 
-    # pulls datastact info dictionary using stack name #
-    table_df = client.materialize.query_table(table_name)
+    return id_df, link_df
 
-    return table_df
 
+def _state_resolution(state_json, default_res):
+    """Get the nm size of one coordinate unit in a state, from its dimensions or older voxelSize entry."""
 
-def get_table_data(table_name, datastack):
-    """Get the metadata for a specific table in a specific CAVE datastack.
+    dimensions = state_json.get("dimensions")
+    if isinstance(dimensions, dict) and all(axis in dimensions for axis in ["x", "y", "z"]):
+        scales = {"m": 1e9, "um": 1e3, "nm": 1}
+        return [
+            dimensions[axis][0] * scales.get(dimensions[axis][1], 1e9) for axis in ["x", "y", "z"]
+        ]
+
+    voxel_size = state_json.get("navigation", {}).get("pose", {}).get("position", {}).get("voxelSize")
+    if voxel_size is not None:
+        return list(voxel_size)
+
+    return list(default_res)
+
+
+def resolve_state_points(share_urls, datastack, layer_names=None, timestamp=None):
+    """Find the root ID under every point annotation in many neuroglancer links.
+
+    Points from all states are converted to segmentation voxels together, the supervoxel under each
+    distinct point is read in one request, and all supervoxels are mapped to roots in one batched lookup.
 
     Arguments:
-    table_name -- the name of the table to request metadata for, e.g. cell_ids (str)
-    datastack -- the name of the datastack you want information for, e.g. brain_and_nerve_cord (str)
+    share_urls -- the links to read points from, empty or missing entries are allowed (list of str or pandas Series)
+    datastack -- the name of the datastack the links are for (str)
+    layer_names -- if given, only points in annotation layers with these names are used (list of str, default None)
+    timestamp -- the time to look up roots at, uses the current time if None (datetime, default None)
 
     Returns:
-    table_data -- all the metadata on the requested table (dict)"""
+    point_df -- one row per point with columns "share_url", "layer", "x", "y", "z" (viewer resolution), "description", "linked_root_id" (the first segment linked to the annotation in the state, if any) and "root_id" (pandas DataFrame)
+    """
+
+    # fetches all states at once #
+    share_urls = list(share_urls)
+    state_jsons = get_state_jsons_from_urls(share_urls, datastack)
 
-    # sets client using datastack name #
     client = CAVEclient(datastack_name=datastack)
+    stack_info = client.info.get_datastack_info()
+    viewer_res = [
+        stack_info["viewer_resolution_x"],
+        stack_info["viewer_resolution_y"],
+        stack_info["viewer_resolution_z"],
+    ]
 
-    # pulls datastact info dictionary using stack name #
-    table_data = client.materialize.get_table_metadata(table_name)
+    # collects point annotations and the nm size of their state's coordinates #
+    rows = []
+    point_res = []
+    for share_url, state_json in zip(share_urls, state_jsons):
+        if state_json is None:
+            continue
+        state_res = _state_resolution(state_json, viewer_res)
+        layers = state_json.get("layers", [])
+        if isinstance(layers, dict):
+            layers = [dict(layer, name=name) for name, layer in layers.items()]
+        for layer in layers:
+            if layer_names is not None and layer.get("name") not in layer_names:
+                continue
+            for annotation in layer.get("annotations", []):
+                if annotation.get("type") != "point":
+                    continue
+                linked_segments = annotation.get("segments", [])
+                if len(linked_segments) > 0 and isinstance(linked_segments[0], list):
+                    linked_segments = linked_segments[0]
+                rows.append(
+                    {
+                        "share_url": share_url,
+                        "layer": layer.get("name"),
+                        "point": annotation["point"][:3],
+                        "description": annotation.get("description"),
+                        "linked_root_id": int(linked_segments[0]) if len(linked_segments) > 0 else None,
+                    }
+                )
+                point_res.append(state_res)
 
-    return table_data
+    point_df = pd.DataFrame(
+        rows, columns=["share_url", "layer", "point", "description", "linked_root_id"]
+    )
+    point_df["linked_root_id"] = pd.array(point_df["linked_root_id"], dtype="UInt64")
+    output_columns = [
+        "share_url",
+        "layer",
+        "x",
+        "y",
+        "z",
+        "description",
+        "linked_root_id",
+        "root_id",
+    ]
+    if len(point_df) == 0:
+        return point_df.assign(
+            x=pd.Series(dtype=np.int64),
+            y=pd.Series(dtype=np.int64),
+            z=pd.Series(dtype=np.int64),
+            root_id=pd.Series(dtype=np.uint64),
+        )[output_columns]
+
+    # converts all points to nm at once, then to viewer resolution for output #
+    points_nm = np.array(point_df["point"].tolist(), dtype=np.float64) * np.array(point_res)
+    viewer_coords = np.floor(points_nm / np.asarray(viewer_res)).astype(np.int64)
+    for axis, axis_coords in zip(["x", "y", "z"], viewer_coords.T):
+        point_df[axis] = axis_coords
+
+    # reads the supervoxel under each distinct point in one request #
+    seg_source = stack_info["segmentation_source"]
+    if seg_source.startswith("graphene://https"):
+        split_url = seg_source.split("https")
+        seg_source = split_url[0] + "middleauth+https" + split_url[1]
+    cv = cloudvolume.CloudVolume(seg_source, use_https=True, progress=False)
+    voxels = np.floor(points_nm / np.asarray(cv.meta.resolution(0), dtype=np.float64)).astype(np.int64)
+    unique_voxels, inverse = np.unique(voxels, axis=0, return_inverse=True)
+    sv_lookup = cv.scattered_points([tuple(voxel) for voxel in unique_voxels.tolist()], mip=0)
+    unique_svs = np.array(
+        [int(sv_lookup.get(tuple(voxel), 0)) for voxel in unique_voxels.tolist()], dtype=np.uint64
+    )
+
+    # maps all supervoxels to roots in one batched lookup, leaving points over background as 0 #
+    unique_roots = np.zeros(len(unique_svs), dtype=np.uint64)
+    found = unique_svs != 0
+    if found.any():
+        unique_roots[found] = _supervoxels_to_roots(client, unique_svs[found], timestamp=timestamp)
+    point_df["root_id"] = unique_roots[inverse.ravel()]
+
+    return point_df[output_columns]
 
 
 def roots_to_nt_link(root_ids, datastack):
@@ -1069,6 +4691,199 @@ def sv_to_root(sv, datastack):
     return root_id
 
 
+def synapse_density_maps(
+    root_ids,
+    datastack,
+    voxel_size=[1000, 1000, 1000],
+    direction="both",
+    cleft_thresh=0.0,
+    materialization_version=None,
+    snapshot=None,
+    output_dir=None,
+    output_format="numpy",
+):
+    """Bin the synapses of many root IDs into sparse 3D histograms.
+
+    Synapses are placed at the point on each neuron, the postsynaptic point for incoming synapses and
+    the presynaptic point for outgoing synapses, and counted in voxels of the given size. Only voxels
+    containing synapses are returned. Dense maps saved to output_dir span each neuron's occupied
+    voxels, and a ValueError is raised before anything is written if any would hold more than
+    DENSITY_MAP_MAX_VOXELS voxels.
+
+    Arguments:
+    root_ids -- the root IDs to make density maps for (list of int or str, will also accept a single int or str)
+    datastack -- the name of the datastack the root IDs are from (str)
+    voxel_size -- the xyz size of each histogram voxel in nm (list of ints, default [1000, 1000, 1000])
+    direction -- "incoming", "outgoing" or "both" to choose which synapses are binned (str, default "both")
+    cleft_thresh -- the cleft score below which to exclude synapses, currently only works with flywire (float, default 0.0)
+    materialization_version -- the materialization version to pull synapses from, uses the latest version if None (int, default None)
+    snapshot -- a local snapshot from load_synapse_snapshot, or its directory, to use instead of the live service (dict or str, default None)
+    output_dir -- if given, a dense map for each root ID is also saved in this directory (str, default None)
+    output_format -- "numpy" to save each map as "<root_id>.npz" with "counts", "offset" and "voxel_size" arrays, or "precomputed" to save each map as a neuroglancer precomputed volume in "<root_id>/" (str, default "numpy")
+
+    Returns:
+    density_df -- one row per occupied voxel with columns "root_id", "x", "y", "z" (voxel indices, i.e. nm divided by voxel_size) and "count" (pandas DataFrame)
+    """
+
+    if direction not in ["incoming", "outgoing", "both"]:
+        raise ValueError("direction must be 'incoming', 'outgoing' or 'both'.")
+    if output_format not in ["numpy", "precomputed"]:
+        raise ValueError("output_format must be 'numpy' or 'precomputed'.")
+
+    # converts single IDs to a list and removes duplicates #
+    if isinstance(root_ids, (int, str)):
+        root_ids = [root_ids]
+    root_index = np.array(
+        list(dict.fromkeys(int(root_id) for root_id in root_ids)), dtype=np.uint64
+    )
+
+    # shares one client and one snapshot between directions #
+    client = CAVEclient(datastack_name=datastack) if snapshot is None else None
+    if isinstance(snapshot, str):
+        snapshot = load_synapse_snapshot(snapshot)
+
+    # gets each synapse's root ID and its position on that root #
+    codes = []
+    coords = []
+    for syn_direction, root_col_name, point in [
+        ("incoming", "post_pt_root_id", "post"),
+        ("outgoing", "pre_pt_root_id", "pre"),
+    ]:
+        if direction not in [syn_direction, "both"]:
+            continue
+        syn_df = query_synapses(
+            root_index.tolist(),
+            datastack,
+            direction=syn_direction,
+            cleft_thresh=cleft_thresh,
+            materialization_version=materialization_version,
+            client=client,
+            snapshot=snapshot,
+        )
+        codes.append(pd.Index(root_index).get_indexer(syn_df[root_col_name].to_numpy()))
+        coords.append(synapse_positions(syn_df, point=point).reshape(-1, 3))
+    codes = np.concatenate(codes)
+    coords = np.concatenate(coords)
+
+    density_df = pd.DataFrame(
+        {
+            "root_id": np.empty(0, dtype=np.uint64),
+            "x": np.empty(0, dtype=np.int64),
+            "y": np.empty(0, dtype=np.int64),
+            "z": np.empty(0, dtype=np.int64),
+            "count": np.empty(0, dtype=np.uint32),
+        }
+    )
+    if len(codes) > 0:
+        # bins all points at once, counting each distinct root and voxel pair, sorted by root then voxel #
+        # positions are in nm, like voxel_size #
+        voxels = np.floor(coords / np.asarray(voxel_size, dtype=np.float64)).astype(np.int64)
+        unique_rows, counts = np.unique(
+            np.column_stack([codes, voxels]), axis=0, return_counts=True
+        )
+
+        density_df = pd.DataFrame(
+            {
+                "root_id": root_index[unique_rows[:, 0]],
+                "x": unique_rows[:, 1],
+                "y": unique_rows[:, 2],
+                "z": unique_rows[:, 3],
+                "count": counts.astype(np.uint32),
+            }
+        )
+
+    # saves a dense map per root, rows are already grouped by root since keys are sorted #
+    if output_dir is not None:
+        # checks the size of every dense map before allocating any of them #
+        extents = density_df.groupby("root_id", sort=False)[["x", "y", "z"]].agg(["min", "max"])
+        map_sizes = np.prod(
+            [extents[(axis, "max")] - extents[(axis, "min")] + 1 for axis in ["x", "y", "z"]],
+            axis=0,
+        )
+        if len(map_sizes) > 0 and map_sizes.max() > DENSITY_MAP_MAX_VOXELS:
+            raise ValueError(
+                f"The dense map of {extents.index[np.argmax(map_sizes)]} would hold {int(map_sizes.max())} voxels, "
+                f"more than DENSITY_MAP_MAX_VOXELS ({DENSITY_MAP_MAX_VOXELS}), use a larger voxel_size or leave out output_dir."
+            )
+
+        os.makedirs(output_dir, exist_ok=True)
+        root_bounds = np.searchsorted(
+            pd.Index(root_index).get_indexer(density_df["root_id"].to_numpy()),
+            np.arange(len(root_index) + 1),
+        )
+        voxels = density_df[["x", "y", "z"]].to_numpy()
+        counts = density_df["count"].to_numpy()
+        for code, root_id in enumerate(root_index):
+            if root_bounds[code] == root_bounds[code + 1]:
+                continue
+            rows = slice(root_bounds[code], root_bounds[code + 1])
+            offset = voxels[rows].min(axis=0)
+            dense = np.zeros(voxels[rows].max(axis=0) - offset + 1, dtype=np.uint32)
+            dense[tuple((voxels[rows] - offset).T)] = counts[rows]
+
+            if output_format == "numpy":
+                np.savez_compressed(
+                    os.path.join(output_dir, str(root_id) + ".npz"),
+                    counts=dense,
+                    offset=offset,
+                    voxel_size=np.asarray(voxel_size),
+                )
+            else:
+                info = cloudvolume.CloudVolume.create_new_info(
+                    num_channels=1,
+                    layer_type="image",
+                    data_type="uint32",
+                    encoding="raw",
+                    resolution=list(voxel_size),
+                    voxel_offset=offset.tolist(),
+                    volume_size=list(dense.shape),
+                    chunk_size=[64, 64, 64],
+                )
+                cv = cloudvolume.CloudVolume(
+                    "file://" + os.path.abspath(os.path.join(output_dir, str(root_id))),
+                    info=info,
+                    progress=False,
+                )
+                cv.commit_info()
+                cv[
+                    offset[0] : offset[0] + dense.shape[0],
+                    offset[1] : offset[1] + dense.shape[1],
+                    offset[2] : offset[2] + dense.shape[2],
+                ] = dense
+
+    return density_df
+
+
+def synapse_positions(syn_df, point="pre", resolution=None):
+    """Get the coordinates of one end of each synapse as an (N, 3) array.
+
+    Arguments:
+    syn_df -- synapse rows with either split "_x/_y/_z" or list-style position columns (pandas DataFrame)
+    point -- which position to get, "pre", "post" or "ctr" (str, default "pre")
+    resolution -- xyz values to divide coordinates by, e.g. the viewer resolution (list of ints, default None)
+
+    Returns:
+    coords -- one row of xyz coordinates per synapse, in nm unless a resolution is given (numpy array)
+    """
+
+    # sets position column name #
+    col_name = point + "_pt_position"
+
+    # stacks split columns, or unpacks list-style columns from unconverted frames #
+    if col_name + "_x" in syn_df.columns:
+        coords = np.column_stack(
+            [syn_df[col_name + "_" + axis].to_numpy() for axis in ["x", "y", "z"]]
+        )
+    else:
+        coords = np.array(syn_df[col_name].tolist()).reshape(-1, 3)
+
+    # converts resolution for all points at once #
+    if resolution is not None:
+        coords = coords / np.asarray(resolution, dtype=np.float64)
+
+    return coords
+
+
 def visualize_skeletons(root_list, datastack="brain_and_nerve_cord"):
     """Generate a microviewer window using the submitted root IDs.
 
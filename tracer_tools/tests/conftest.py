@@ -0,0 +1,111 @@
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import tracer_tools  # noqa: F401
+
+# the package star-imports utils, so the module itself is looked up by name #
+utils = sys.modules["tracer_tools.utils"]
+
+DATASTACK = "flywire_fafb_production"
+
+# a tiny synapse table, small enough to count every answer by hand #
+SYNAPSES = pd.DataFrame(
+    {
+        "id": [1, 2, 3, 4, 5, 6, 7],
+        "pre_pt_root_id": [1, 1, 1, 1, 2, 2, 3],
+        "post_pt_root_id": [2, 2, 2, 3, 1, 1, 2],
+        "cleft_score": [10, 60, 120, 200, 5, 80, 150],
+        "pre_pt_position_x": [100, 102, 400, 800, 50, 52, 900],
+        "pre_pt_position_y": [100, 101, 400, 800, 50, 50, 900],
+        "pre_pt_position_z": [10, 10, 40, 80, 5, 5, 90],
+        "post_pt_position_x": [104, 106, 404, 804, 54, 56, 904],
+        "post_pt_position_y": [104, 105, 404, 804, 54, 54, 904],
+        "post_pt_position_z": [10, 10, 40, 80, 5, 5, 90],
+    }
+)
+
+
+class FakeMaterialize:
+    """Serves one table from a DataFrame, applying the filters the module queries with."""
+
+    def __init__(self, table_df, version=1):
+        self.table_df = table_df
+        self.version = version
+        self.queries = []
+
+    def query_table(
+        self,
+        table,
+        filter_in_dict=None,
+        filter_equal_dict=None,
+        filter_greater_equal_dict=None,
+        filter_less_dict=None,
+        limit=None,
+        **kwargs,
+    ):
+        self.queries.append(dict(kwargs, table=table))
+        table_df = self.table_df
+        mask = np.ones(len(table_df), dtype=bool)
+        for col_name, values in (filter_in_dict or {}).items():
+            mask &= table_df[col_name].isin(values).to_numpy()
+        for col_name, value in (filter_equal_dict or {}).items():
+            mask &= (table_df[col_name] == value).to_numpy()
+        for col_name, value in (filter_greater_equal_dict or {}).items():
+            mask &= (table_df[col_name] >= value).to_numpy()
+        for col_name, value in (filter_less_dict or {}).items():
+            mask &= (table_df[col_name] < value).to_numpy()
+        table_df = table_df[mask]
+        if limit is not None:
+            table_df = table_df.head(limit)
+        return table_df.reset_index(drop=True).copy()
+
+    def get_annotation_count(self, table, version=None):
+        return len(self.table_df)
+
+
+class FakeInfo:
+    def get_datastack_info(self):
+        return {
+            "synapse_table": "synapses",
+            "viewer_resolution_x": 4,
+            "viewer_resolution_y": 4,
+            "viewer_resolution_z": 40,
+        }
+
+
+class FakeClient:
+    """A stand-in for CAVEclient that answers materialize queries from a DataFrame."""
+
+    def __init__(self, table_df, version=1):
+        self.materialize = FakeMaterialize(table_df, version=version)
+        self.info = FakeInfo()
+
+
+def build_snapshot(syn_df, snapshot_dir, monkeypatch):
+    """Build a snapshot of a synapse table with build_synapse_snapshot, serving the table from a fake client."""
+
+    client = FakeClient(syn_df)
+    monkeypatch.setattr(utils, "CAVEclient", lambda *args, **kwargs: client)
+
+    return utils.build_synapse_snapshot(DATASTACK, snapshot_dir, chunk_size=3)
+
+
+@pytest.fixture(autouse=True)
+def synapse_cache_dir(tmp_path, monkeypatch):
+    # keeps live queries from the fake clients out of the real synapse cache #
+    cache_dir = str(tmp_path / "synapse_cache")
+    monkeypatch.setattr(utils, "SYNAPSE_CACHE_DIR", cache_dir)
+    return cache_dir
+
+
+@pytest.fixture
+def snapshot_dir(tmp_path, monkeypatch):
+    return build_snapshot(SYNAPSES, str(tmp_path / "snapshot"), monkeypatch)
+
+
+@pytest.fixture
+def snapshot(snapshot_dir):
+    return utils.load_synapse_snapshot(snapshot_dir)
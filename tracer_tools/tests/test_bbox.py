@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+from conftest import utils
+
+
+def test_corners_from_centers():
+    corners = utils.bbox_corners_from_centers([[10, 10, 10], [0.7, 5.2, 3]], [4, 5, 2])
+
+    # odd dims round up so boxes stay centered, and centers are floored to whole voxels #
+    assert corners.dtype == np.int64
+    assert corners.tolist() == [[[8, 7, 9], [12, 13, 11]], [[-2, 2, 2], [2, 8, 4]]]
+
+
+def test_corners_with_dims_per_box():
+    corners = utils.bbox_corners_from_centers([[10, 10, 10], [20, 20, 20]], [[2, 2, 2], [0, 10, 4]])
+
+    assert corners.tolist() == [[[9, 9, 9], [11, 11, 11]], [[20, 15, 18], [20, 25, 22]]]
+
+    with pytest.raises(ValueError, match="one set per center"):
+        utils.bbox_corners_from_centers([[0, 0, 0]] * 3, [[2, 2, 2], [2, 2, 2]])
+    with pytest.raises(ValueError, match="negative"):
+        utils.bbox_corners_from_centers([[0, 0, 0]], [2, -2, 2])
+
+
+def test_corners_clipped_to_bounds(capsys):
+    corners = utils.bbox_corners_from_centers(
+        [[10, 10, 10], [0, 50, 50], [500, 50, 50]], [4, 4, 4], bounds=[[0, 0, 0], [11, 100, 100]]
+    )
+
+    assert corners.tolist() == [
+        [[8, 8, 8], [11, 12, 12]],
+        [[0, 48, 48], [2, 52, 52]],
+        [[11, 48, 48], [11, 52, 52]],
+    ]
+    assert "1 boxes lie outside the bounds" in capsys.readouterr().out
+
+
+class FakeCloudVolume:
+    """A volume from voxel (1, 1, 1) to (10, 10, 8) at 18 x 16 x 45 nm."""
+
+    paths = []
+
+    def __init__(self, cloudpath, **kwargs):
+        FakeCloudVolume.paths.append(cloudpath)
+        bounds = type("Bbox", (), {"minpt": [1, 1, 1], "maxpt": [10, 10, 8]})()
+        self.meta = type(
+            "Meta",
+            (),
+            {
+                "bounds": staticmethod(lambda mip: bounds),
+                "resolution": staticmethod(lambda mip: [18, 16, 45]),
+            },
+        )()
+
+
+def test_volume_bounds(monkeypatch):
+    monkeypatch.setattr(utils.cloudvolume, "CloudVolume", FakeCloudVolume)
+    FakeCloudVolume.paths = []
+
+    bounds = utils._volume_bounds(
+        {"segmentation_source": "graphene://https://example.org/segmentation"}, [4, 4, 40]
+    )
+
+    # only whole viewer voxels inside the volume are kept, rounding the min up and the max down #
+    assert bounds.tolist() == [[5, 4, 2], [45, 40, 9]]
+    assert FakeCloudVolume.paths == ["graphene://middleauth+https://example.org/segmentation"]
@@ -0,0 +1,41 @@
+import pytest
+
+from conftest import DATASTACK, utils
+
+
+def test_cleft_threshold_sweep(snapshot):
+    sweep_df = utils.cleft_threshold_sweep([2, 1], DATASTACK, [0, 60, 100, 200, 500], snapshot=snapshot)
+
+    assert sweep_df["root_id"].tolist() == [2] * 5 + [1] * 5
+    assert sweep_df["incoming"].tolist() == [4, 3, 2, 0, 0] + [2, 1, 0, 0, 0]
+    assert sweep_df["outgoing"].tolist() == [2, 1, 0, 0, 0] + [4, 3, 2, 1, 0]
+    assert sweep_df["total"].tolist() == [6, 4, 2, 0, 0] + [6, 4, 2, 1, 0]
+
+
+def test_cleft_threshold_sweep_matches_synapse_counts(snapshot):
+    sweep_df = utils.cleft_threshold_sweep([1, 2, 3, 4], DATASTACK, [60], snapshot=snapshot)
+    counts = utils.get_synapse_counts([1, 2, 3, 4], DATASTACK, cleft_thresh=60, snapshot=snapshot)
+
+    for row in sweep_df.itertuples():
+        assert counts[str(row.root_id)] == {
+            "incoming": row.incoming,
+            "outgoing": row.outgoing,
+            "total": row.total,
+        }
+
+
+def test_cleft_threshold_sweep_edge_cases(snapshot):
+    # thresholds keep their given order, a score equal to the threshold is counted, and unknown roots get zeros #
+    sweep_df = utils.cleft_threshold_sweep(
+        ["3", 99, 3], DATASTACK, [150, 0, 150.5], snapshot=snapshot
+    )
+
+    assert sweep_df["root_id"].tolist() == [3] * 3 + [99] * 3
+    assert sweep_df["threshold"].tolist() == [150.0, 0.0, 150.5] * 2
+    assert sweep_df["incoming"].tolist() == [1, 1, 1, 0, 0, 0]
+    assert sweep_df["outgoing"].tolist() == [1, 1, 0, 0, 0, 0]
+
+
+def test_cleft_threshold_sweep_other_datastack(snapshot):
+    with pytest.raises(ValueError, match="flywire_fafb_production"):
+        utils.cleft_threshold_sweep([1], "brain_and_nerve_cord", [0], snapshot=snapshot)
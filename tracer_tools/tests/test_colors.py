@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from conftest import utils
+
+PALETTE = ["#ff0000", "#00ff00", "#0000ff", "#ffff00"]
+
+
+def test_hex_to_lab():
+    lab = utils._hex_to_lab(["#000000", "#ffffff"])
+
+    assert np.allclose(lab, [[0, 0, 0], [100, 0, 0]], atol=0.1)
+
+
+def test_close_segments_get_different_colors():
+    # ten tight groups of four segments, each group far from the others #
+    offsets = np.array([[0, 0, 0], [1, 0, 0], [0, 1, 0], [0, 0, 1]])
+    coords = np.vstack([offsets + [1000 * i, 0, 0] for i in range(10)])
+
+    colors = utils.generate_spatial_color_list(coords, n_neighbors=3, palette=PALETTE)
+
+    assert len(colors) == 40
+    for i in range(10):
+        assert sorted(colors[4 * i : 4 * i + 4]) == sorted(PALETTE)
+
+
+def test_neighbors_get_most_different_colors():
+    colors = utils.generate_spatial_color_list(
+        [[0, 0, 0], [1, 0, 0]], palette=["#000000", "#ffffff", "#808080"]
+    )
+
+    assert sorted(colors) == ["#000000", "#ffffff"]
+
+
+def test_missing_coords_and_seed():
+    coords = [[0, 0, 0], [np.nan, np.nan, np.nan], [1, 0, 0], [5, 5, 5]]
+
+    colors = utils.generate_spatial_color_list(coords, palette=PALETTE, seed=3)
+
+    assert len(colors) == 4
+    assert set(colors) <= set(PALETTE)
+    assert colors[0] != colors[2]
+    assert colors == utils.generate_spatial_color_list(coords, palette=PALETTE, seed=3)
+
+
+def test_resolution_and_max_distance():
+    # segments 0 and 2 are one voxel apart in z, which is 1 nm or 40 nm depending on the resolution #
+    coords = [[0, 0, 0], [1000, 0, 0], [0, 0, 1]]
+    palette = ["#000000", "#ffffff"]
+
+    near = utils.generate_spatial_color_list(coords, n_neighbors=1, max_distance=20, palette=palette)
+    far = utils.generate_spatial_color_list(
+        coords, xyz_resolution=[1, 1, 40], n_neighbors=1, max_distance=20, palette=palette
+    )
+
+    assert near[0] != near[2]
+    # without neighbors, segments cycle through the palette by position #
+    assert far == ["#000000", "#ffffff", "#000000"]
+
+
+def test_empty_and_single_segment():
+    assert utils.generate_spatial_color_list(np.empty((0, 3)), palette=PALETTE) == []
+    assert utils.generate_spatial_color_list([[1, 2, 3]], palette=PALETTE) == ["#ff0000"]
+
+    with pytest.raises(ValueError, match="palette"):
+        utils.generate_spatial_color_list([[1, 2, 3]], palette=[])
@@ -0,0 +1,28 @@
+from conftest import DATASTACK, utils
+
+
+def test_connectivity_matrix(snapshot):
+    matrix, root_index = utils.connectivity_matrix([2, 1, 3, 2], DATASTACK, snapshot=snapshot)
+
+    assert root_index.tolist() == [2, 1, 3]
+    assert matrix.toarray().tolist() == [
+        [0, 2, 0],
+        [3, 0, 1],
+        [1, 0, 0],
+    ]
+
+
+def test_connectivity_matrix_cleft_thresh(snapshot):
+    matrix, root_index = utils.connectivity_matrix([1, 2, 3], DATASTACK, cleft_thresh=100, snapshot=snapshot)
+
+    assert matrix.toarray().tolist() == [
+        [0, 1, 1],
+        [0, 0, 0],
+        [0, 1, 0],
+    ]
+
+
+def test_get_edge_weights(snapshot):
+    weights = utils.get_edge_weights([1, 1, 2, 3, 4], [2, 3, 1, 1, 1], DATASTACK, snapshot=snapshot)
+
+    assert list(weights) == [3, 1, 2, 0, 0]
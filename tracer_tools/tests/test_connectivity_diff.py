@@ -0,0 +1,70 @@
+import datetime
+
+import pandas as pd
+from conftest import DATASTACK, SYNAPSES, FakeClient, build_snapshot, utils
+
+# each supervoxel ID is its root ID times 100 plus a small number #
+BEFORE = SYNAPSES.assign(
+    pre_pt_supervoxel_id=SYNAPSES["pre_pt_root_id"] * 100 + 1,
+    post_pt_supervoxel_id=SYNAPSES["post_pt_root_id"] * 100 + 2,
+)
+
+# synapse 2 from root 1 onto root 2 is gone, and synapse 8 from root 1 onto root 3 is new #
+AFTER = pd.concat(
+    [
+        BEFORE[BEFORE["id"] != 2],
+        BEFORE[BEFORE["id"] == 4].assign(id=8),
+    ],
+    ignore_index=True,
+)
+
+
+class FakeChunkedgraph:
+    def get_past_ids(self, root_ids, timestamp_past=None):
+        return {"past_id_map": {}}
+
+    def get_roots(self, sv_ids, timestamp=None):
+        return sv_ids // 100
+
+
+def diff_client():
+    client = FakeClient(AFTER, version=2)
+    client.chunkedgraph = FakeChunkedgraph()
+    client.materialize.get_timestamp = lambda version: datetime.datetime(2024, 1, version)
+    return client
+
+
+def test_connectivity_diff_with_snapshot(tmp_path, monkeypatch):
+    snapshot = utils.load_synapse_snapshot(build_snapshot(BEFORE, str(tmp_path / "v1"), monkeypatch))
+    client = diff_client()
+
+    edge_diff_df, synapse_diff_df = utils.connectivity_diff(
+        [1], DATASTACK, before=1, client=client, snapshot=snapshot
+    )
+
+    # root 1 now sends 2 synapses to each of roots 2 and 3, where it used to send 3 and 1 #
+    assert edge_diff_df.sort_values("partner_id")[
+        ["direction", "partner_id", "syn_count_before", "syn_count_after", "change"]
+    ].values.tolist() == [
+        ["outgoing", 2, 3, 2, "changed"],
+        ["outgoing", 3, 1, 2, "changed"],
+    ]
+    assert synapse_diff_df[["direction", "synapse_id", "partner_id", "change"]].values.tolist() == [
+        ["outgoing", 8, 3, "added"],
+        ["outgoing", 2, 2, "removed"],
+    ]
+
+    # only the later version was queried live, the earlier one came from the snapshot #
+    versions = {query.get("materialization_version") for query in client.materialize.queries}
+    assert versions == {2}
+
+
+def test_connectivity_diff_no_changes(tmp_path, monkeypatch):
+    snapshot = utils.load_synapse_snapshot(build_snapshot(BEFORE, str(tmp_path / "v1"), monkeypatch))
+
+    edge_diff_df, synapse_diff_df = utils.connectivity_diff(
+        [3], DATASTACK, before=1, after=1, client=diff_client(), snapshot=snapshot
+    )
+
+    assert len(edge_diff_df) == 0
+    assert len(synapse_diff_df) == 0
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+from conftest import DATASTACK, utils
+
+
+def test_counts_synapses_per_voxel(snapshot):
+    density_df = utils.synapse_density_maps(
+        [1], DATASTACK, voxel_size=[100, 100, 100], direction="outgoing", snapshot=snapshot
+    )
+
+    # root 1's presynaptic points fall in voxels (1, 1, 0) twice, (4, 4, 0) and (8, 8, 0) #
+    assert density_df["root_id"].tolist() == [1, 1, 1]
+    assert density_df[["x", "y", "z"]].to_numpy().tolist() == [[1, 1, 0], [4, 4, 0], [8, 8, 0]]
+    assert density_df["count"].tolist() == [2, 1, 1]
+
+
+def test_groups_rows_by_root_then_voxel(snapshot):
+    density_df = utils.synapse_density_maps(
+        [2, 1], DATASTACK, voxel_size=[1000, 1000, 1000], direction="incoming", snapshot=snapshot
+    )
+
+    # root 2 receives synapses 1, 2, 3 and 7, root 1 receives synapses 5 and 6, all inside the first voxel #
+    assert density_df["root_id"].tolist() == [2, 1]
+    assert density_df["count"].tolist() == [4, 2]
+
+
+def test_saves_dense_map(snapshot, tmp_path):
+    utils.synapse_density_maps(
+        [1], DATASTACK, voxel_size=[100, 100, 100], direction="outgoing",
+        snapshot=snapshot, output_dir=str(tmp_path),
+    )
+
+    saved = np.load(tmp_path / "1.npz")
+    assert saved["offset"].tolist() == [1, 1, 0]
+    assert saved["counts"].shape == (8, 8, 1)
+    assert saved["counts"].sum() == 4
+    assert saved["counts"][0, 0, 0] == 2
+
+
+def test_refuses_oversized_dense_map(snapshot, tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "DENSITY_MAP_MAX_VOXELS", 10)
+
+    with pytest.raises(ValueError, match="DENSITY_MAP_MAX_VOXELS"):
+        utils.synapse_density_maps(
+            [1], DATASTACK, voxel_size=[100, 100, 100], direction="outgoing",
+            snapshot=snapshot, output_dir=str(tmp_path / "maps"),
+        )
+    assert not (tmp_path / "maps").exists()
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+from conftest import utils
+
+RESOLUTION = [4, 4, 40]
+POINTS_A = np.array([[0, 0, 0], [10, 0, 1], [-3, 7, 2]])
+POINTS_B = np.array([[3, 4, 0], [10, 0, 0], [5, 5, 5]])
+
+
+def test_convert_coords_res_matches_scalar_version():
+    coords = np.array([[101, 203, 7], [-5, -9, 3], [0, 1, 2]])
+
+    converted = utils.convert_coords_res(coords, [4, 4, 40], [16, 16, 40])
+
+    # fractions are dropped toward zero for negative coordinates too, like int() #
+    assert converted.dtype == np.int64
+    assert converted.tolist() == [utils.convert_coord_res(row, [4, 4, 40], [16, 16, 40]) for row in coords.tolist()]
+    assert utils.convert_coords_res([101, 203, 7], [4, 4, 40], [16, 16, 40]).tolist() == [25, 50, 7]
+    assert utils.convert_coords_res([10, 10, 1], [4, 4, 40], [16, 16, 40], as_int=False).tolist() == [2.5, 2.5, 1.0]
+
+
+def test_convert_coords_res_mip_levels(monkeypatch):
+    monkeypatch.setitem(
+        utils._MIP_RESOLUTIONS,
+        ("ds", "segmentation"),
+        {0: np.array([8.0, 8.0, 40.0]), 1: np.array([16.0, 16.0, 40.0])},
+    )
+
+    assert utils.convert_coords_res([[32, 32, 3]], [4, 4, 40], 1, datastack="ds").tolist() == [[8, 8, 3]]
+    assert utils.convert_coords_res([[4, 4, 3]], 1, 0, datastack="ds").tolist() == [[8, 8, 3]]
+
+    with pytest.raises(ValueError, match="mip 2 is not available"):
+        utils.convert_coords_res([[0, 0, 0]], 2, [1, 1, 1], datastack="ds")
+    with pytest.raises(ValueError, match="datastack is required"):
+        utils.convert_coords_res([[0, 0, 0]], 1, [1, 1, 1])
+
+
+def test_calc_distances_matches_scalar_version():
+    dists = utils.calc_distances(POINTS_A, POINTS_B, RESOLUTION)
+
+    expected = [utils.calc_distance(a, b, RESOLUTION) for a, b in zip(POINTS_A.tolist(), POINTS_B.tolist())]
+    assert np.allclose(dists, expected)
+
+    # a single point is compared with every point of the other set #
+    assert np.allclose(utils.calc_distances(POINTS_A, [0, 0, 0]), np.linalg.norm(POINTS_A, axis=1))
+
+    with pytest.raises(ValueError, match="xyz"):
+        utils.calc_distances([[0, 0]], [[1, 1]])
+
+
+def test_calc_distance_matrix():
+    dist_matrix = utils.calc_distance_matrix(POINTS_A, POINTS_B, RESOLUTION)
+
+    assert dist_matrix.shape == (3, 3)
+    assert np.allclose(np.diag(dist_matrix), utils.calc_distances(POINTS_A, POINTS_B, RESOLUTION))
+    assert np.allclose(dist_matrix[0, 2], utils.calc_distance([0, 0, 0], [5, 5, 5], RESOLUTION))
+
+    self_matrix = utils.calc_distance_matrix(POINTS_A)
+    assert np.allclose(self_matrix, self_matrix.T)
+    assert np.allclose(np.diag(self_matrix), 0)
+
+
+def test_find_nearest_points():
+    query = [[0, 0, 0], [10, 0, 1]]
+
+    dists, indices = utils.find_nearest_points(query, POINTS_B, xyz_resolution=RESOLUTION)
+    assert indices.tolist() == [0, 1]
+    assert np.allclose(dists, [20, 40])
+
+    # a reused tree gives the same answer, and neighbors past max_distance are reported as missing #
+    tree = utils.build_point_tree(POINTS_B, RESOLUTION)
+    dists, indices = utils.find_nearest_points(query, tree, k=2, xyz_resolution=RESOLUTION, max_distance=100)
+    assert indices.tolist() == [[0, 1], [1, 0]]
+    dists, indices = utils.find_nearest_points(query, tree, k=2, xyz_resolution=RESOLUTION, max_distance=30)
+    assert indices.tolist() == [[0, -1], [-1, -1]]
+    assert np.isinf(dists[1]).all()
+
+
+def test_find_points_in_radius():
+    match_df = utils.find_points_in_radius([[0, 0, 0], [100, 100, 100]], POINTS_B, 45, RESOLUTION)
+
+    # only the first query point has neighbors, sorted by distance #
+    assert match_df["query_index"].tolist() == [0, 0]
+    assert match_df["point_index"].tolist() == [0, 1]
+    assert np.allclose(match_df["distance_nm"], [20, 40])
@@ -0,0 +1,47 @@
+import pandas as pd
+import pytest
+from conftest import DATASTACK, utils
+
+# the synthetic table's edges, as (pre, post): syn_count, are 1 -> 2: 3, 1 -> 3: 1, 2 -> 1: 2 and 3 -> 2: 1 #
+
+
+def test_expand_both_directions(snapshot):
+    node_df, edge_df = utils.expand_neighborhood(3, DATASTACK, hops=2, min_syn_count=1, snapshot=snapshot)
+
+    assert node_df.values.tolist() == [[3, 0], [1, 1], [2, 1]]
+    # edges found at hop 1 aren't reported again when hop 2 reaches them from the other end #
+    assert edge_df.values.tolist() == [[1, 3, 2, 1], [1, 1, 3, 1], [2, 1, 2, 3], [2, 2, 1, 2]]
+
+
+def test_expand_with_min_syn_count(snapshot):
+    node_df, edge_df = utils.expand_neighborhood(
+        [1], DATASTACK, hops=3, direction="outgoing", min_syn_count=2, snapshot=snapshot
+    )
+
+    # 1 -> 3 is too weak, and the expansion stops once 2 only leads back to 1 #
+    assert node_df.values.tolist() == [[1, 0], [2, 1]]
+    assert edge_df.values.tolist() == [[1, 1, 2, 3], [2, 2, 1, 2]]
+
+
+def test_expand_max_frontier_and_output_path(snapshot, tmp_path):
+    output_path = str(tmp_path / "edges.csv")
+
+    node_df, path = utils.expand_neighborhood(
+        3, DATASTACK, hops=1, min_syn_count=1, max_frontier=1, snapshot=snapshot, output_path=output_path
+    )
+
+    # roots 1 and 2 tie for strength, so only the first is kept #
+    assert node_df.values.tolist() == [[3, 0], [1, 1]]
+    assert path == output_path
+    assert pd.read_csv(output_path).values.tolist() == [[1, 3, 2, 1], [1, 1, 3, 1]]
+
+
+def test_expand_nothing_reached(snapshot):
+    node_df, edge_df = utils.expand_neighborhood([99], DATASTACK, hops=2, snapshot=snapshot)
+
+    assert node_df.values.tolist() == [[99, 0]]
+    assert len(edge_df) == 0
+    assert edge_df.columns.tolist() == ["hop", "pre_pt_root_id", "post_pt_root_id", "syn_count"]
+
+    with pytest.raises(ValueError, match="direction"):
+        utils.expand_neighborhood([1], DATASTACK, direction="sideways", snapshot=snapshot)
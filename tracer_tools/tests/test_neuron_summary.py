@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+from conftest import DATASTACK, SYNAPSES, FakeClient, utils
+
+
+class FakeChunkedgraph:
+    """Gives root r the L2 IDs 10r, 10r + 1 and 10r + 2, except root 9 whose lookup returns nothing."""
+
+    def get_leaves_many(self, root_ids, stop_layer=None):
+        return {
+            str(root_id): np.arange(3) + int(root_id) * 10 for root_id in root_ids if int(root_id) != 9
+        }
+
+    def is_latest_roots(self, root_ids):
+        return np.array([int(root_id) != 2 for root_id in root_ids])
+
+    def get_roots(self, sv_ids, timestamp=None):
+        return np.asarray(sv_ids, dtype=np.uint64) // 10 + 100
+
+
+class FakeL2cache:
+    """Serves each L2 ID's size as the ID in um3, leaving out L2 ID 31."""
+
+    def __init__(self):
+        self.requests = []
+
+    def get_l2data(self, l2_ids, attributes=None):
+        self.requests.append(list(l2_ids))
+        return {
+            str(l2_id): {"rep_coord_nm": [l2_id * 4, 8, 80], "size_nm3": l2_id * 1e9}
+            for l2_id in l2_ids
+            if l2_id != 31
+        }
+
+
+def summary_client():
+    client = FakeClient(SYNAPSES)
+    client.chunkedgraph = FakeChunkedgraph()
+    client.l2cache = FakeL2cache()
+    return client
+
+
+def test_volume_sums_every_l2():
+    client = summary_client()
+
+    summary_df = utils.get_neuron_summary(
+        [3, 1, 9, 3], DATASTACK, metrics=["volume"], client=client
+    )
+
+    # root 1 has L2s 10 to 12, root 3 has 30 to 32 with 31 missing from the l2cache, root 9 has none #
+    assert summary_df["root_id"].tolist() == [3, 1, 9, 3]
+    assert summary_df["volume_um3"].tolist()[:2] == [62.0, 33.0]
+    assert np.isnan(summary_df["volume_um3"].iloc[2])
+    assert summary_df["volume_um3"].iloc[3] == 62.0
+    assert sorted(sum(client.l2cache.requests, [])) == [10, 11, 12, 30, 31, 32]
+
+
+def test_coords_counts_and_freshness(snapshot):
+    client = summary_client()
+
+    summary_df = utils.get_neuron_summary(
+        [1, 2, 9],
+        DATASTACK,
+        metrics=["coords", "synapse_counts", "freshness"],
+        snapshot=snapshot,
+        client=client,
+    )
+
+    # coordinates come from each root's first L2 in viewer resolution, and root 9 has none #
+    assert summary_df["x"].tolist()[:2] == [10, 20]
+    assert summary_df[["y", "z"]].iloc[0].tolist() == [2, 2]
+    assert summary_df["x"].isna().tolist() == [False, False, True]
+    # only each root's first L2 is fetched when volume isn't requested #
+    assert sorted(sum(client.l2cache.requests, [])) == [10, 20]
+
+    assert summary_df[["incoming", "outgoing", "total"]].values.tolist() == [[2, 4, 6], [4, 2, 6], [0, 0, 0]]
+
+    # root 2 is outdated and is traced to its current root through its first L2 #
+    assert summary_df["is_latest"].tolist() == [True, False, True]
+    assert summary_df["current_root_id"].tolist() == [1, 102, 9]
+
+
+def test_unknown_metric():
+    with pytest.raises(ValueError, match="mass"):
+        utils.get_neuron_summary([1], DATASTACK, metrics=["mass"], client=summary_client())
@@ -0,0 +1,39 @@
+from conftest import DATASTACK, SYNAPSES, utils
+
+
+def test_get_partners_follows_input_order(snapshot):
+    partner_df = utils.get_partners([3, 2, 1], DATASTACK, direction="outgoing", snapshot=snapshot)
+
+    assert partner_df.values.tolist() == [[3, 2, 1], [2, 1, 2], [1, 2, 3], [1, 3, 1]]
+
+
+def test_get_partners_ignores_returned_order(monkeypatch):
+    # serves synapses with the roots in the opposite order to the request #
+    reversed_df = utils.lean_synapse_df(SYNAPSES.iloc[::-1].reset_index(drop=True))
+    monkeypatch.setattr(utils, "query_synapses", lambda *args, **kwargs: reversed_df)
+
+    partner_df = utils.get_partners([1, 2, 3], DATASTACK, direction="outgoing")
+
+    assert partner_df["root_id"].tolist() == [1, 1, 2, 3]
+    assert partner_df["syn_count"].tolist() == [3, 1, 2, 1]
+
+
+def test_get_top_partners(snapshot):
+    top_df = utils.get_top_partners([2, 1], DATASTACK, k=1, snapshot=snapshot)
+
+    assert top_df[["root_id", "direction", "rank", "partner_id", "syn_count"]].astype(str).values.tolist() == [
+        ["2", "incoming", "1", "1", "3"],
+        ["2", "outgoing", "1", "1", "2"],
+        ["1", "incoming", "1", "2", "2"],
+        ["1", "outgoing", "1", "2", "3"],
+    ]
+    # root 2 gets 3 of its 4 incoming synapses from root 1 #
+    assert top_df["fraction"].round(2).tolist() == [0.75, 1.0, 1.0, 0.75]
+
+
+def test_get_top_partners_skips_roots_without_synapses(snapshot):
+    top_df = utils.get_top_partners(3, DATASTACK, k=5, snapshot=snapshot)
+
+    assert top_df["direction"].astype(str).tolist() == ["incoming", "outgoing"]
+    assert top_df["partner_id"].tolist() == [1, 2]
+    assert len(utils.get_top_partners([99], DATASTACK, snapshot=snapshot)) == 0
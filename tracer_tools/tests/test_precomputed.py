@@ -0,0 +1,133 @@
+import json
+import os
+import struct
+
+import numpy as np
+
+from conftest import DATASTACK, SYNAPSES, FakeClient, utils
+
+POINT_A = np.array([[0, 0, 0], [10, 20, 30], [90, 90, 90]])
+POINT_B = POINT_A + 1
+IDS = np.array([7, 8, 9], dtype=np.uint64)
+PRE = np.array([100, 100, 200], dtype=np.uint64)
+POST = np.array([300, 400, 300], dtype=np.uint64)
+SCORES = np.array([50.5, 60.0, 70.25])
+
+# two points of three float32 and a float32 cleft score #
+RECORD = struct.Struct("<6ff")
+
+
+def write_lines(path, chunk_limit=1000):
+    utils._write_precomputed_annotations(
+        path,
+        POINT_A,
+        POINT_B,
+        IDS,
+        [4, 4, 40],
+        relationships={"pre_segment": PRE, "post_segment": POST},
+        scores=SCORES,
+        chunk_limit=chunk_limit,
+    )
+
+
+def read_multiple(file_path):
+    # a count, then every record, then every ID #
+    with open(file_path, "rb") as f:
+        data = f.read()
+    (count,) = struct.unpack_from("<Q", data, 0)
+    records = [RECORD.unpack_from(data, 8 + i * RECORD.size) for i in range(count)]
+    ids = struct.unpack_from(f"<{count}Q", data, 8 + count * RECORD.size)
+    assert len(data) == 8 + count * (RECORD.size + 8)
+    return records, list(ids)
+
+
+def test_by_id_encoding(tmp_path):
+    write_lines(str(tmp_path))
+
+    with open(tmp_path / "by_id" / "8", "rb") as f:
+        data = f.read()
+
+    # the record, then a count and ID for each relationship #
+    assert len(data) == RECORD.size + 2 * (4 + 8)
+    assert RECORD.unpack_from(data, 0) == (10, 20, 30, 11, 21, 31, 60.0)
+    assert struct.unpack_from("<IQIQ", data, RECORD.size) == (1, 100, 1, 400)
+
+
+def test_relationship_encoding(tmp_path):
+    write_lines(str(tmp_path))
+
+    assert sorted(os.listdir(tmp_path / "rel_pre_segment")) == ["100", "200"]
+    records, ids = read_multiple(tmp_path / "rel_pre_segment" / "100")
+    assert ids == [7, 8]
+    assert records[1] == (10, 20, 30, 11, 21, 31, 60.0)
+
+    records, ids = read_multiple(tmp_path / "rel_post_segment" / "300")
+    assert ids == [7, 9]
+    assert records[1][-1] == 70.25
+
+
+def test_spatial_levels(tmp_path):
+    write_lines(str(tmp_path), chunk_limit=2)
+
+    with open(tmp_path / "info") as f:
+        info = json.load(f)
+    assert info["annotation_type"] == "LINE"
+    assert info["lower_bound"] == [0, 0, 0]
+    assert info["upper_bound"] == [92, 92, 92]
+    assert info["properties"] == [{"id": "cleft_score", "type": "float32"}]
+    assert [level["grid_shape"] for level in info["spatial"]] == [[1, 1, 1], [2, 2, 2]]
+
+    # the coarse level keeps two annotations and the finer level holds the third #
+    _, coarse_ids = read_multiple(tmp_path / "spatial0" / "0_0_0")
+    fine_ids = []
+    for file_name in os.listdir(tmp_path / "spatial1"):
+        fine_ids += read_multiple(tmp_path / "spatial1" / file_name)[1]
+    assert len(coarse_ids) == 2
+    assert sorted(coarse_ids + fine_ids) == [7, 8, 9]
+
+
+def test_boxes_without_relationships(tmp_path):
+    utils._write_precomputed_annotations(
+        str(tmp_path), POINT_A, POINT_B, IDS, [4, 4, 40], annotation_type="AXIS_ALIGNED_BOUNDING_BOX"
+    )
+
+    with open(tmp_path / "info") as f:
+        info = json.load(f)
+    assert info["annotation_type"] == "AXIS_ALIGNED_BOUNDING_BOX"
+    assert info["relationships"] == []
+    assert info["properties"] == []
+    assert not any(name.startswith("rel_") for name in os.listdir(tmp_path))
+
+    # with no relationships or score, each record is just the two corners #
+    with open(tmp_path / "by_id" / "9", "rb") as f:
+        assert struct.unpack("<6f", f.read()) == (90, 90, 90, 91, 91, 91)
+
+
+def test_export_synapse_annotations(snapshot, tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "CAVEclient", lambda *args, **kwargs: FakeClient(SYNAPSES))
+
+    paths = utils.export_synapse_annotations(
+        [2], DATASTACK, str(tmp_path), incoming=False, snapshot=snapshot
+    )
+
+    assert list(paths) == ["outgoing"]
+    assert sorted(os.listdir(tmp_path / "outgoing" / "by_id")) == ["5", "6"]
+
+    # synapse 5 runs from (50, 50, 5) to (54, 54, 5) nm, written in 4 x 4 x 40 nm viewer units #
+    with open(tmp_path / "outgoing" / "by_id" / "5", "rb") as f:
+        data = f.read()
+    assert RECORD.unpack_from(data, 0) == (12.5, 12.5, 0.125, 13.5, 13.5, 0.125, 5.0)
+    assert struct.unpack_from("<IQIQ", data, RECORD.size) == (1, 2, 1, 1)
+
+
+def test_export_synapse_annotations_without_synapses(snapshot, tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "CAVEclient", lambda *args, **kwargs: FakeClient(SYNAPSES))
+
+    paths = utils.export_synapse_annotations([99], DATASTACK, str(tmp_path), snapshot=snapshot)
+
+    # a root with no synapses still gets a readable, empty source for each direction #
+    for direction in ["incoming", "outgoing"]:
+        with open(os.path.join(paths[direction], "info")) as f:
+            info = json.load(f)
+        assert info["annotation_type"] == "LINE"
+        assert os.listdir(os.path.join(paths[direction], "by_id")) == []
@@ -0,0 +1,33 @@
+from conftest import DATASTACK, SYNAPSES, FakeClient, utils
+
+
+def test_live_query_uses_cache(tmp_path):
+    client = FakeClient(SYNAPSES)
+
+    first_df = utils.query_synapses([2, 3], DATASTACK, client=client, cache_dir=str(tmp_path))
+    n_queries = len(client.materialize.queries)
+    second_df = utils.query_synapses([2, 3], DATASTACK, client=client, cache_dir=str(tmp_path))
+
+    # rows come back grouped by root in input order, and the second call is served from disk #
+    assert first_df["post_pt_root_id"].tolist() == [2, 2, 2, 2, 3]
+    assert len(client.materialize.queries) == n_queries
+    assert second_df.equals(first_df)
+
+
+def test_empty_root_ids_keep_columns(snapshot, tmp_path):
+    client = FakeClient(SYNAPSES)
+    full_df = utils.query_synapses([2], DATASTACK, client=client, use_cache=False)
+
+    live_df = utils.query_synapses([], DATASTACK, client=client, use_cache=False)
+    snapshot_df = utils.query_synapses([], DATASTACK, snapshot=snapshot)
+
+    for empty_df in [live_df, snapshot_df]:
+        assert len(empty_df) == 0
+        assert empty_df.dtypes.to_dict() == full_df.dtypes.to_dict()
+
+
+def test_empty_root_ids_downstream(snapshot):
+    partner_df = utils.get_partners([], DATASTACK, snapshot=snapshot)
+
+    assert len(partner_df) == 0
+    assert partner_df.columns.tolist() == ["root_id", "partner_id", "syn_count"]
@@ -0,0 +1,83 @@
+import pandas as pd
+
+from conftest import SYNAPSES, utils
+
+
+def test_cluster_release_sites():
+    # adds a synapse from another neuron right next to synapse 1, which must not join its site #
+    extra = pd.DataFrame(
+        {
+            "id": [8],
+            "pre_pt_root_id": [3],
+            "post_pt_root_id": [1],
+            "cleft_score": [90],
+            "pre_pt_position_x": [101],
+            "pre_pt_position_y": [100],
+            "pre_pt_position_z": [10],
+            "post_pt_position_x": [105],
+            "post_pt_position_y": [104],
+            "post_pt_position_z": [10],
+        }
+    )
+    syn_df = utils.lean_synapse_df(pd.concat([SYNAPSES, extra], ignore_index=True))
+
+    site_df, site_syn_df = utils.cluster_release_sites(syn_df, radius=100)
+
+    # synapses 1 and 2 and synapses 5 and 6 are a few nm apart, everything else is far or from another neuron #
+    groups = site_syn_df.groupby("site_id")["id"].apply(lambda ids: sorted(ids.tolist()))
+    assert sorted(groups.tolist()) == [[1, 2], [3], [4], [5, 6], [7], [8]]
+
+    site = site_df.set_index("site_id").loc[site_syn_df.loc[site_syn_df["id"] == 1, "site_id"].iloc[0]]
+    assert site["pre_root_id"] == 1
+    assert site["n_synapses"] == 2
+    assert site["fan_out"] == 1
+    assert site[["x", "y", "z"]].tolist() == [101.0, 100.5, 10.0]
+
+
+def test_cluster_release_sites_fan_out():
+    # synapse 4 sits next to synapse 3 and goes to a different partner #
+    syn_df = SYNAPSES.copy()
+    syn_df.loc[syn_df["id"] == 4, ["pre_pt_position_x", "pre_pt_position_y", "pre_pt_position_z"]] = [405, 400, 40]
+
+    site_df, site_syn_df = utils.cluster_release_sites(utils.lean_synapse_df(syn_df), radius=100)
+
+    site_id = site_syn_df.loc[site_syn_df["id"] == 3, "site_id"].iloc[0]
+    assert site_syn_df.loc[site_syn_df["id"] == 4, "site_id"].iloc[0] == site_id
+    assert site_df.loc[site_df["site_id"] == site_id, "fan_out"].iloc[0] == 2
+
+
+def test_cluster_release_sites_voxel_positions():
+    # synapses 1 and 2 are 2.2 voxels apart, which is 9 nm at 4 x 4 x 40 nm voxels #
+    syn_df = utils.lean_synapse_df(SYNAPSES)
+
+    _, nm_df = utils.cluster_release_sites(syn_df, radius=5)
+    _, voxel_df = utils.cluster_release_sites(syn_df, [4, 4, 40], radius=5)
+    _, wide_df = utils.cluster_release_sites(syn_df, [4, 4, 40], radius=10)
+
+    def same_site(site_syn_df):
+        site_ids = site_syn_df.set_index("id")["site_id"]
+        return site_ids[1] == site_ids[2]
+
+    assert same_site(nm_df)
+    assert not same_site(voxel_df)
+    assert same_site(wide_df)
+
+
+def test_cluster_release_sites_chains_and_empty():
+    # synapses 2 and 3 sit between 1 and 4, so all four chain into one site although 1 and 4 are far apart #
+    syn_df = SYNAPSES.copy()
+    syn_df.loc[syn_df["id"] == 3, ["pre_pt_position_x", "pre_pt_position_y", "pre_pt_position_z"]] = [180, 100, 10]
+    syn_df.loc[syn_df["id"] == 4, ["pre_pt_position_x", "pre_pt_position_y", "pre_pt_position_z"]] = [260, 100, 10]
+    syn_df = utils.lean_synapse_df(syn_df)
+
+    site_df, site_syn_df = utils.cluster_release_sites(syn_df, radius=100)
+
+    site_ids = site_syn_df.set_index("id")["site_id"]
+    assert site_ids[[1, 2, 3, 4]].nunique() == 1
+    assert site_df.loc[site_df["site_id"] == site_ids[1], ["n_synapses", "fan_out"]].values.tolist() == [[4, 2]]
+
+    # no synapses give no sites, with the usual columns #
+    site_df, site_syn_df = utils.cluster_release_sites(syn_df.iloc[0:0], radius=100)
+    assert len(site_df) == 0 and len(site_syn_df) == 0
+    assert site_df.columns.tolist() == ["site_id", "pre_root_id", "n_synapses", "fan_out", "x", "y", "z"]
+    assert "site_id" in site_syn_df.columns
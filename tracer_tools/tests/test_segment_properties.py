@@ -0,0 +1,80 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+from conftest import DATASTACK, utils
+
+
+def fake_summary(summary_df):
+    """Stands in for get_neuron_summary, returning the given rows for whichever root IDs are asked for."""
+
+    def get_neuron_summary(root_ids, datastack, **kwargs):
+        return summary_df.set_index("root_id").loc[root_ids].reset_index()
+
+    return get_neuron_summary
+
+
+SUMMARY = pd.DataFrame(
+    {
+        "root_id": [1, 2, 3],
+        "incoming": [4.0, np.nan, 0.0],
+        "outgoing": [2.0, 3.0, np.nan],
+        "total": [6.0, np.nan, np.nan],
+        "nt": ["gaba", None, "ach"],
+        "is_latest": [True, False, True],
+    }
+)
+
+
+def read_properties(info_path):
+    with open(info_path) as f:
+        info = json.load(f)
+    return info["inline"]["ids"], {prop["id"]: prop for prop in info["inline"]["properties"]}
+
+
+def test_writes_counts_labels_and_tags(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "get_neuron_summary", fake_summary(SUMMARY))
+
+    info_path = utils.export_segment_properties(
+        [3, 1, 2, 1], DATASTACK, str(tmp_path), labels=["c", "a", "b", "ignored"]
+    )
+    ids, properties = read_properties(info_path)
+
+    assert ids == ["3", "1", "2"]
+    assert properties["label"]["values"] == ["c", "a", "b"]
+    # missing counts are written as zero instead of failing the uint32 cast #
+    assert properties["incoming_synapses"]["values"] == [0, 4, 0]
+    assert properties["outgoing_synapses"]["values"] == [0, 2, 3]
+    tags = properties["tags"]["tags"]
+    assert tags == ["ach", "gaba", "outdated"]
+    assert [[tags[code] for code in row] for row in properties["tags"]["values"]] == [
+        ["ach"],
+        ["gaba"],
+        ["outdated"],
+    ]
+
+
+def test_missing_labels_are_empty(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "get_neuron_summary", fake_summary(SUMMARY))
+
+    info_path = utils.export_segment_properties([1, 2, 3], DATASTACK, str(tmp_path), labels=["a"])
+    _, properties = read_properties(info_path)
+
+    assert properties["label"]["values"] == ["a", "", ""]
+
+
+def test_no_tags(tmp_path, monkeypatch):
+    untagged = SUMMARY.assign(nt=None, is_latest=True)
+    monkeypatch.setattr(utils, "get_neuron_summary", fake_summary(untagged))
+
+    info_path = utils.export_segment_properties([1, 2], DATASTACK, str(tmp_path))
+    _, properties = read_properties(info_path)
+
+    assert properties["tags"]["tags"] == []
+    assert properties["tags"]["values"] == [[], []]
+
+
+def test_empty_root_ids(tmp_path):
+    with pytest.raises(ValueError, match="root_ids"):
+        utils.export_segment_properties([], DATASTACK, str(tmp_path))
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+from conftest import DATASTACK, utils
+
+
+def top_match(similar_df, root_id):
+    row = similar_df[(similar_df["root_id"] == root_id) & (similar_df["rank"] == 1)].iloc[0]
+    return int(row["similar_id"]), float(row["similarity"])
+
+
+def test_cosine_outgoing(snapshot):
+    similar_df = utils.connectivity_similarity([1, 2, 3], DATASTACK, k=5, direction="outgoing", snapshot=snapshot)
+
+    # k is capped at the other two roots, and 1 (3 to root 2, 1 to root 3) and 3 (1 to root 2) share root 2 #
+    assert similar_df.groupby("root_id", sort=False).size().to_dict() == {1: 2, 2: 2, 3: 2}
+    assert top_match(similar_df, 1) == (3, pytest.approx(3 / np.sqrt(10)))
+    assert top_match(similar_df, 3) == (1, pytest.approx(3 / np.sqrt(10)))
+
+
+def test_jaccard_outgoing(snapshot):
+    similar_df = utils.connectivity_similarity([1, 2, 3], DATASTACK, k=1, metric="jaccard", direction="outgoing", snapshot=snapshot)
+
+    assert top_match(similar_df, 1) == (3, 0.5)
+    assert top_match(similar_df, 2)[1] == 0.0
+
+
+def test_both_directions_match_any_block_size(snapshot):
+    first_df = utils.connectivity_similarity([1, 2, 3], DATASTACK, k=1, snapshot=snapshot)
+    blocked_df = utils.connectivity_similarity([1, 2, 3], DATASTACK, k=1, snapshot=snapshot, block_size=1)
+
+    # upstream and downstream partners are separate entries, so 1 and 2 only overlap with 3 #
+    assert top_match(first_df, 1) == (3, pytest.approx(3 / np.sqrt(28)))
+    assert top_match(first_df, 2) == (3, pytest.approx(3 / np.sqrt(28)))
+    assert first_df.equals(blocked_df)
+
+
+def test_single_root_and_bad_arguments(snapshot):
+    similar_df = utils.connectivity_similarity([1, 1], DATASTACK, snapshot=snapshot)
+    assert len(similar_df) == 0
+    assert similar_df.columns.tolist() == ["root_id", "rank", "similar_id", "similarity"]
+
+    with pytest.raises(ValueError, match="metric"):
+        utils.connectivity_similarity([1, 2], DATASTACK, metric="dice", snapshot=snapshot)
+    with pytest.raises(ValueError, match="direction"):
+        utils.connectivity_similarity([1, 2], DATASTACK, direction="sideways", snapshot=snapshot)
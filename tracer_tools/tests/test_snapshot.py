@@ -0,0 +1,52 @@
+from conftest import DATASTACK, SYNAPSES, build_snapshot, utils
+
+
+def test_query_synapses_incoming(snapshot):
+    syn_df = utils.query_synapses([2], DATASTACK, direction="incoming", snapshot=snapshot)
+
+    assert sorted(syn_df["id"].tolist()) == [1, 2, 3, 7]
+    assert set(syn_df["post_pt_root_id"].tolist()) == {2}
+
+
+def test_query_synapses_outgoing_keeps_input_roots(snapshot_dir):
+    syn_df = utils.query_synapses([3, 1, 99], DATASTACK, direction="outgoing", snapshot=snapshot_dir)
+
+    assert sorted(syn_df["id"].tolist()) == [1, 2, 3, 4, 7]
+
+
+def test_query_synapses_cleft_thresh(snapshot):
+    syn_df = utils.query_synapses([2], DATASTACK, cleft_thresh=100, snapshot=snapshot)
+
+    assert sorted(syn_df["id"].tolist()) == [3, 7]
+
+
+def test_get_synapse_counts(snapshot):
+    counts = utils.get_synapse_counts([1, 2, 3, 4], DATASTACK, snapshot=snapshot)
+
+    assert counts == {
+        "1": {"incoming": 2, "outgoing": 4, "total": 6},
+        "2": {"incoming": 4, "outgoing": 2, "total": 6},
+        "3": {"incoming": 1, "outgoing": 1, "total": 2},
+        "4": {"incoming": 0, "outgoing": 0, "total": 0},
+    }
+
+
+def test_get_partners(snapshot):
+    partner_df = utils.get_partners([1, 2], DATASTACK, direction="outgoing", snapshot=snapshot)
+
+    assert partner_df.values.tolist() == [[1, 2, 3], [1, 3, 1], [2, 1, 2]]
+
+
+def test_get_partners_incoming(snapshot):
+    partner_df = utils.get_partners([2], DATASTACK, direction="incoming", snapshot=snapshot)
+
+    assert partner_df.values.tolist() == [[2, 1, 3], [2, 3, 1]]
+
+
+def test_empty_snapshot(tmp_path, monkeypatch):
+    empty = utils.load_synapse_snapshot(build_snapshot(SYNAPSES.iloc[0:0], str(tmp_path / "empty"), monkeypatch))
+
+    syn_df = utils.query_synapses([1, 2], DATASTACK, snapshot=empty)
+
+    assert len(syn_df) == 0
+    assert "pre_pt_root_id" in syn_df.columns
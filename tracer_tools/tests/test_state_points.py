@@ -0,0 +1,92 @@
+import pandas as pd
+from conftest import DATASTACK, SYNAPSES, FakeClient, utils
+
+# the same point in two coordinate systems, (40, 80, 120) nm, and a point in each state over background #
+STATE_A = {
+    "dimensions": {"x": [4e-9, "m"], "y": [4e-9, "m"], "z": [4e-8, "m"]},
+    "layers": [
+        {
+            "name": "points",
+            "type": "annotation",
+            "annotations": [
+                {"type": "point", "point": [10, 20, 3, 0.5], "description": "soma", "segments": ["555"]},
+                {"type": "line", "pointA": [10, 20, 3], "pointB": [11, 20, 3]},
+            ],
+        },
+        {"name": "other", "type": "annotation", "annotations": [{"type": "point", "point": [0, 0, 0]}]},
+    ],
+}
+STATE_B = {
+    "navigation": {"pose": {"position": {"voxelSize": [8, 8, 40]}}},
+    "layers": {
+        "points": {
+            "annotations": [
+                {"type": "point", "point": [5, 10, 3], "segments": [["777"]]},
+                {"type": "point", "point": [100, 100, 1]},
+            ]
+        }
+    },
+}
+
+
+class FakeCloudVolume:
+    """Reads supervoxel 9001 at segmentation voxel (2, 5, 3) and background everywhere else."""
+
+    lookups = []
+
+    def __init__(self, cloudpath, **kwargs):
+        self.meta = type("Meta", (), {"resolution": staticmethod(lambda mip: [16, 16, 40])})()
+
+    def scattered_points(self, points, mip=0):
+        FakeCloudVolume.lookups.append(list(points))
+        return {point: 9001 for point in points if point == (2, 5, 3)}
+
+
+class FakeChunkedgraph:
+    def get_roots(self, sv_ids, timestamp=None):
+        return sv_ids + 1
+
+
+def patch_services(monkeypatch, state_jsons):
+    client = FakeClient(SYNAPSES)
+    client.chunkedgraph = FakeChunkedgraph()
+    get_datastack_info = client.info.get_datastack_info
+    client.info.get_datastack_info = lambda: dict(
+        get_datastack_info(), segmentation_source="graphene://https://example.org/segmentation"
+    )
+    monkeypatch.setattr(utils, "CAVEclient", lambda *args, **kwargs: client)
+    monkeypatch.setattr(utils, "get_state_jsons_from_urls", lambda share_urls, datastack: state_jsons)
+    monkeypatch.setattr(utils.cloudvolume, "CloudVolume", FakeCloudVolume)
+    FakeCloudVolume.lookups = []
+
+
+def test_resolve_state_points(monkeypatch):
+    patch_services(monkeypatch, [STATE_A, None, STATE_B])
+
+    point_df = utils.resolve_state_points(["a", "", "b"], DATASTACK)
+
+    assert point_df["share_url"].tolist() == ["a", "a", "b", "b"]
+    assert point_df["layer"].tolist() == ["points", "other", "points", "points"]
+    assert point_df[["x", "y", "z"]].values.tolist() == [[10, 20, 3], [0, 0, 0], [10, 20, 3], [200, 200, 1]]
+    assert point_df["description"].tolist() == ["soma", None, None, None]
+    assert point_df["linked_root_id"].tolist() == [555, pd.NA, 777, pd.NA]
+    assert point_df["root_id"].tolist() == [9002, 0, 9002, 0]
+
+    # the shared point is read once, with every distinct voxel in a single request #
+    assert len(FakeCloudVolume.lookups) == 1
+    assert sorted(FakeCloudVolume.lookups[0]) == [(0, 0, 0), (2, 5, 3), (50, 50, 1)]
+
+
+def test_resolve_state_points_layer_names_and_empty(monkeypatch):
+    patch_services(monkeypatch, [STATE_A, STATE_B])
+
+    point_df = utils.resolve_state_points(["a", "b"], DATASTACK, layer_names=["other"])
+    assert point_df["root_id"].tolist() == [0]
+
+    patch_services(monkeypatch, [None])
+    empty_df = utils.resolve_state_points([""], DATASTACK)
+    assert len(empty_df) == 0
+    assert empty_df.columns.tolist() == [
+        "share_url", "layer", "x", "y", "z", "description", "linked_root_id", "root_id"
+    ]
+    assert FakeCloudVolume.lookups == []
@@ -0,0 +1,85 @@
+import json
+import urllib.parse
+
+import pytest
+
+from conftest import utils
+
+
+def test_parse_embedded_state():
+    state = {"layers": [], "position": [1, 2, 3]}
+    share_url = "https://ngl.flywire.ai/#!" + urllib.parse.quote(json.dumps(state))
+
+    assert utils._parse_share_url(share_url) == (state, None)
+
+
+def test_parse_state_server_links():
+    spelunker_url = "https://spelunker.cave-explorer.org/#!middleauth+https://global.daf-apis.com/nglstate/api/v1/5678"
+    json_url = "https://ngl.flywire.ai/?json_url=https://global.daf-apis.com/nglstate/api/v1/1234"
+
+    assert utils._parse_share_url(spelunker_url) == (None, 5678)
+    assert utils._parse_share_url(json_url) == (None, 1234)
+
+
+def test_bad_links_become_none(tmp_path):
+    share_urls = ["", None, "https://ngl.flywire.ai/#!%7Bnot json", "https://ngl.flywire.ai/#!%7B%7D"]
+
+    state_jsons = utils.get_state_jsons_from_urls(share_urls, "ds", cache_dir=str(tmp_path))
+
+    assert state_jsons == [None, None, None, {}]
+
+
+def test_single_link_raises():
+    with pytest.raises(ValueError):
+        utils.get_state_json_from_url("https://ngl.flywire.ai/#!%7Bnot json", "ds")
+    with pytest.raises(ValueError):
+        utils.get_state_json_from_url("https://ngl.flywire.ai/no-state-here", "ds")
+
+
+class FakeState:
+    def __init__(self):
+        self.uploads = []
+
+    def upload_state_json(self, state_json):
+        self.uploads.append(state_json)
+        return 42
+
+    def build_neuroglancer_url(self, state_id, ngl_url):
+        return f"{ngl_url}/?json_url=https://global.daf-apis.com/nglstate/api/v1/{state_id}"
+
+
+class FakeStateClient:
+    def __init__(self):
+        self.state = FakeState()
+
+
+def test_small_states_are_embedded():
+    client = FakeStateClient()
+    state = {"layers": [{"name": "a b", "segments": ["1", "2"]}], "position": [1.5, 2, 3]}
+
+    share_url = utils._ng_state_url(client, state, "https://ngl.flywire.ai/")
+
+    # the state is minimized and percent-encoded, and reads back as the same state without an upload #
+    assert share_url.startswith("https://ngl.flywire.ai/#!%7B%22layers%22:[")
+    assert " " not in share_url and ", " not in urllib.parse.unquote(share_url)
+    assert utils._parse_share_url(share_url) == (state, None)
+    assert client.state.uploads == []
+
+
+def test_large_states_are_uploaded():
+    client = FakeStateClient()
+    state = {"layers": [{"segments": [str(i) for i in range(1000)]}]}
+
+    auto_url = utils._ng_state_url(client, state, "https://ngl.flywire.ai", max_raw_url_length=100)
+    forced_url = utils._ng_state_url(client, {"layers": []}, "https://ngl.flywire.ai", upload_state=True)
+    raw_url = utils._ng_state_url(client, state, "https://ngl.flywire.ai", upload_state=False)
+
+    assert utils._parse_share_url(auto_url) == (None, 42)
+    assert utils._parse_share_url(forced_url) == (None, 42)
+    assert client.state.uploads == [state, {"layers": []}]
+    # a state is only ever embedded when uploads are turned off, however long the link gets #
+    assert len(raw_url) > utils.RAW_URL_MAX_LENGTH
+    assert utils._parse_share_url(raw_url) == (state, None)
+
+    with pytest.raises(ValueError, match="upload_state"):
+        utils._ng_state_url(client, state, "https://ngl.flywire.ai", upload_state="sometimes")
@@ -0,0 +1,73 @@
+import json
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from conftest import FakeClient, utils
+
+
+def test_query_table_arrow():
+    client = FakeClient(pd.DataFrame({"id": [1, 2, 3], "cell_type": ["a", None, "c"], "size": [1.5, None, 2.0]}))
+
+    table_df = utils._query_table(client, "cells", arrow=True, select_columns=["id"])
+
+    assert [str(dtype) for dtype in table_df.dtypes] == ["int64[pyarrow]", "string[pyarrow]", "double[pyarrow]"]
+    assert table_df["cell_type"].isna().tolist() == [False, True, False]
+    # keywords the Arrow conversion doesn't use are still passed to the query #
+    assert client.materialize.queries[-1]["select_columns"] == ["id"]
+
+
+def test_query_table_default_dtypes():
+    client = FakeClient(pd.DataFrame({"id": [1, 2, 3]}))
+
+    table_df = utils._query_table(client, "cells")
+
+    assert table_df["id"].dtype == "int64"
+
+
+def stream(client, output_dir, chunk_size=10, max_workers=2):
+    return utils._stream_table_to_parquet(
+        client,
+        "cells",
+        str(output_dir),
+        None,
+        chunk_size,
+        max_workers,
+        split_positions=False,
+    )
+
+
+def test_stream_table_with_all_null_window(tmp_path):
+    # the first window has no tags and the last one no sizes #
+    table_df = pd.DataFrame(
+        {
+            "id": range(100, 130),
+            "tag": [None] * 10 + ["a", None] * 10,
+            "size": [1.0] * 20 + [None] * 10,
+        }
+    )
+
+    stream(FakeClient(table_df), tmp_path)
+
+    back_df = pd.read_parquet(tmp_path).sort_values("id", ignore_index=True)
+    assert back_df["tag"].tolist() == table_df["tag"].tolist()
+    assert back_df["size"].isna().tolist() == table_df["size"].isna().tolist()
+    assert len({str(pq.read_schema(path).remove_metadata()) for path in tmp_path.glob("part-*.parquet")}) == 1
+
+
+def test_stream_table_covers_id_range_and_resumes(tmp_path):
+    table_df = pd.DataFrame({"id": [5000, 5003, 5021, 5040, 5041]})
+    client = FakeClient(table_df, version=7)
+
+    stream(client, tmp_path)
+    with open(tmp_path / "_manifest.json") as f:
+        manifest = json.load(f)
+    assert manifest["id_range"] == [5000, 5041]
+    assert manifest["complete"]
+    assert sorted(pd.read_parquet(tmp_path)["id"].tolist()) == table_df["id"].tolist()
+
+    # a rerun at a newer latest version reuses the export's version and fetches nothing #
+    client.materialize.version = 8
+    query_count = len(client.materialize.queries)
+    stream(client, tmp_path)
+    assert len(client.materialize.queries) == query_count
@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+import pytest
+from conftest import utils
+
+RESOLUTION = [4, 4, 40]
+
+
+def random_lines(n_synapses, seed=0):
+    rng = np.random.default_rng(seed)
+    pre_coords = rng.uniform(0, 10000, size=(n_synapses, 3)).round()
+    post_coords = pre_coords + rng.uniform(-5, 5, size=(n_synapses, 3)).round()
+    return pre_coords, post_coords
+
+
+@pytest.mark.parametrize("max_annotations", [1, 7, 50, 299])
+def test_sample_keeps_budget(max_annotations):
+    pre_coords, post_coords = random_lines(300)
+
+    kept_pre, kept_post, descriptions = utils._thin_synapse_lines(
+        pre_coords, post_coords, RESOLUTION, max_annotations, method="sample"
+    )
+
+    # sampled lines are a subset of the originals, kept in their original order #
+    assert len(kept_pre) == max_annotations
+    assert descriptions == [None] * max_annotations
+    rows = [np.flatnonzero((pre_coords == point).all(axis=1))[0] for point in kept_pre]
+    assert rows == sorted(rows)
+    assert np.array_equal(post_coords[rows], kept_post)
+
+
+@pytest.mark.parametrize("max_annotations", [1, 7, 50, 299])
+def test_cluster_keeps_budget_and_counts(max_annotations):
+    pre_coords, post_coords = random_lines(300)
+
+    cell_pre, cell_post, descriptions = utils._thin_synapse_lines(
+        pre_coords, post_coords, RESOLUTION, max_annotations, method="cluster"
+    )
+
+    # every synapse is counted in exactly one merged line #
+    assert 0 < len(cell_pre) <= max_annotations
+    assert len(cell_post) == len(descriptions) == len(cell_pre)
+    assert sum(int(description.split()[0]) for description in descriptions) == 300
+
+    # merged lines stay within the bounds of the synapses they stand for #
+    assert (cell_pre >= pre_coords.min(axis=0)).all() and (cell_pre <= pre_coords.max(axis=0)).all()
+
+
+@pytest.mark.parametrize("method", ["sample", "cluster"])
+def test_thinning_is_deterministic(method):
+    pre_coords, post_coords = random_lines(500, seed=3)
+
+    first = utils._thin_synapse_lines(pre_coords, post_coords, RESOLUTION, 40, method=method)
+    second = utils._thin_synapse_lines(pre_coords, post_coords, RESOLUTION, 40, method=method)
+
+    assert np.array_equal(first[0], second[0])
+    assert np.array_equal(first[1], second[1])
+    assert first[2] == second[2]
+
+
+def test_unknown_method():
+    pre_coords, post_coords = random_lines(10)
+
+    with pytest.raises(ValueError, match="thin_method"):
+        utils._thin_synapse_lines(pre_coords, post_coords, RESOLUTION, 5, method="random")
+
+
+def test_description_column_only_for_cluster():
+    pre_coords, post_coords = random_lines(20)
+    syn_df = pd.DataFrame(
+        {
+            "pre_pt_position": list(pre_coords.astype(int) * RESOLUTION),
+            "post_pt_position": list(post_coords.astype(int) * RESOLUTION),
+        }
+    )
+
+    assert utils._ng_syn_coords(syn_df, RESOLUTION).columns.tolist() == ["pre", "post"]
+    sampled_df = utils._ng_syn_coords(syn_df, RESOLUTION, max_annotations=5)
+    assert sampled_df.columns.tolist() == ["pre", "post"]
+    assert len(sampled_df) == 5
+
+    clustered_df = utils._ng_syn_coords(syn_df, RESOLUTION, max_annotations=5, thin_method="cluster")
+    assert clustered_df.columns.tolist() == ["pre", "post", "description"]
+    assert clustered_df["description"].str.endswith("synapses").all()
+
+    # under budget nothing is merged, but the column the line mapper reads is still there #
+    unmerged_df = utils._ng_syn_coords(syn_df, RESOLUTION, max_annotations=50, thin_method="cluster")
+    assert unmerged_df.columns.tolist() == ["pre", "post", "description"]
+    assert len(unmerged_df) == 20